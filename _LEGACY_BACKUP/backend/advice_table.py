@@ -0,0 +1,249 @@
+"""
+MEDGUARD — Precomputed Advice Table
+Every get_ai_advice() response for the finite context space, built ahead
+of time and looked up by index.
+
+    python advice_table.py --build [--out advice_table.json]
+
+The space is the product of the DOMAINS below (mode, risk level, subset
+of risk types, occupation, diet, missed doses, Metformin or not). The
+build runs whatever backend get_ai_advice() is configured with (rules,
+or the local model for nightly builds), de-duplicates the responses and
+stores them with a compact mixed-radix index. The table version (and so
+every ETag) is a hash of the responses: a rule-text edit changes it, an
+unchanged rebuild keeps it. Like the rules, the table
+only sees these features: other medications, age or symptoms don't
+change the answer. A context outside the space (an occupation onboarding
+doesn't offer, 10+ missed doses ...) is not covered and takes the live
+path.
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+from array import array
+from itertools import product
+
+DEFAULT_PATH = os.environ.get(
+    "MEDGUARD_ADVICE_TABLE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "advice_table.json"),
+)
+
+TABLE_FORMAT = 1
+
+# (source key, table) of the last load_advice_table(), reused while the
+# file or the rules are unchanged
+_LOADED = (None, None)
+
+# Ordered feature domains. Onboarding offers these occupations and diets;
+# "Unknown" is what /ai/advice sends when the profile lacks them.
+DOMAINS = (
+    ("user_mode", ("adult", "senior")),
+    ("current_risk_level", ("green", "yellow", "red")),
+    ("risk_types", ("ADR", "AMR", "Behavior", "Interaction")),  # subsets
+    ("occupation", ("Desk Job", "Manual Labor", "Student", "Retired", "Home Maker", "Medical", "Unknown")),
+    ("diet", ("Veg", "Non-Veg", "Vegan", "Unknown")),
+    ("missed_doses", tuple(range(10))),
+    ("metformin", (False, True)),
+)
+
+_DOMAIN = dict(DOMAINS)
+_RISK_TYPE_BITS = {t: 1 << i for i, t in enumerate(_DOMAIN["risk_types"])}
+
+
+def _radix(values):
+    return {v: i for i, v in enumerate(values)}
+
+
+_MODE = _radix(_DOMAIN["user_mode"])
+_LEVEL = _radix(_DOMAIN["current_risk_level"])
+_OCCUPATION = _radix(_DOMAIN["occupation"])
+_DIET = _radix(_DOMAIN["diet"])
+_SIZES = (2, 3, 1 << len(_RISK_TYPE_BITS), len(_OCCUPATION), len(_DIET), len(_DOMAIN["missed_doses"]), 2)
+TABLE_SIZE = 1
+for _n in _SIZES:
+    TABLE_SIZE *= _n
+
+
+def _lookup(radix, value):
+    try:
+        return radix.get(value)
+    except TypeError:  # unhashable
+        return None
+
+
+def table_index(context):
+    """Position of a context in the table, or None if it's outside the space."""
+    mode = _lookup(_MODE, context.get("user_mode", "adult"))
+    level = _lookup(_LEVEL, context.get("current_risk_level", "green"))
+    if mode is None or level is None:
+        return None
+
+    mask = 0
+    for risk_type in context.get("risk_types", []):
+        bit = _lookup(_RISK_TYPE_BITS, risk_type)
+        if bit is None:
+            return None
+        mask |= bit
+
+    profile = context.get("user_profile", {})
+    occupation = _lookup(_OCCUPATION, profile.get("occupation", "Unknown"))
+    diet = _lookup(_DIET, profile.get("diet", "Unknown"))
+    missed = context.get("adherence_summary", {}).get("missed_doses_last_3_days", 0)
+    if occupation is None or diet is None or type(missed) is not int or not 0 <= missed <= 9:
+        return None
+
+    metformin = 1 if "Metformin" in context.get("medications", []) else 0
+
+    index = mode
+    for digit, size in zip((level, mask, occupation, diet, missed, metformin), _SIZES[1:]):
+        index = index * size + digit
+    return index
+
+
+def _context_at(mode, level, risk_types, occupation, diet, missed, metformin):
+    return {
+        "user_mode": mode,
+        "current_risk_level": level,
+        "risk_types": list(risk_types),
+        "medications": ["Metformin"] if metformin else [],
+        "adherence_summary": {"missed_doses_last_3_days": missed},
+        "user_profile": {"occupation": occupation, "diet": diet},
+    }
+
+
+def enumerate_contexts():
+    """Every context in the space, in table_index() order."""
+    subsets = []
+    for mask in range(1 << len(_RISK_TYPE_BITS)):
+        subsets.append([t for t, bit in _RISK_TYPE_BITS.items() if mask & bit])
+    for combo in product(_DOMAIN["user_mode"], _DOMAIN["current_risk_level"], subsets,
+                         _DOMAIN["occupation"], _DOMAIN["diet"], _DOMAIN["missed_doses"], (False, True)):
+        yield _context_at(*combo)
+
+
+class AdviceTable:
+    """De-duplicated responses plus one response id per context."""
+
+    def __init__(self, responses, index, version=""):
+        self.responses = responses    # list of advice dicts
+        self.index = index            # array: table position -> response id
+        self.version = version
+
+    def lookup(self, context):
+        """(response id, fresh advice dict) for a covered context, else None."""
+        position = table_index(context)
+        if position is None:
+            return None
+        response_id = self.index[position]
+        advice = self.responses[response_id]
+        return response_id, {k: list(v) if isinstance(v, list) else (dict(v) if isinstance(v, dict) else v)
+                             for k, v in advice.items()}
+
+    def etag(self, response_id):
+        return f"{self.version}-{response_id}"
+
+    # ── persistence ──
+
+    def save(self, path=DEFAULT_PATH):
+        data = {
+            "format": TABLE_FORMAT,
+            "version": self.version,
+            "size": TABLE_SIZE,
+            "typecode": self.index.typecode,
+            "index": base64.b64encode(self.index.tobytes()).decode(),
+            "responses": self.responses,
+        }
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("format") != TABLE_FORMAT or data.get("size") != TABLE_SIZE:
+            raise ValueError("advice table was built for a different context space")
+        index = array(data["typecode"])
+        index.frombytes(base64.b64decode(data["index"]))
+        return cls(data["responses"], index, data.get("version", ""))
+
+
+def build_advice_table(advise_many, version=""):
+    """Run `advise_many` over the whole space and de-duplicate the answers."""
+    contexts = list(enumerate_contexts())
+    ids = {}
+    responses = []
+    positions = []
+    for advice in advise_many(contexts):
+        encoded = json.dumps(advice, sort_keys=True)
+        response_id = ids.get(encoded)
+        if response_id is None:
+            response_id = ids[encoded] = len(responses)
+            responses.append(advice)
+        positions.append(response_id)
+    index = array("H" if len(responses) < 1 << 16 else "I", positions)
+    return AdviceTable(responses, index, version or responses_version(responses))
+
+
+def responses_version(responses):
+    """Content hash of the distinct responses, used as the ETag prefix."""
+    encoded = json.dumps(responses, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def _rules_key(ai_advisor):
+    # Everything the rule answers are made of besides code
+    rules = [ai_advisor.SCENARIOS, ai_advisor.EXTRAS,
+             ai_advisor.DISCLAIMER_TEXT, ai_advisor.SENIOR_SUPPORT_MESSAGE]
+    return ("rules", hashlib.sha256(json.dumps(rules, sort_keys=True).encode()).hexdigest())
+
+
+def load_advice_table(path=DEFAULT_PATH):
+    """
+    The table to serve from: the prebuilt file if present, otherwise one
+    built in memory from the rules (only when no model backend is set,
+    so a model is never shadowed by rule answers). Reloads (SIGHUP) keep
+    the current table unless the file or the rules changed.
+    """
+    global _LOADED
+    import ai_advisor
+    if os.path.exists(path):
+        stat = os.stat(path)
+        key = ("file", path, stat.st_mtime_ns, stat.st_size)
+        build = lambda: AdviceTable.load(path)
+    elif ai_advisor.advice_metrics()["backend"] == "rules":
+        key = _rules_key(ai_advisor)
+        build = lambda: build_advice_table(ai_advisor.get_ai_advice_bulk)
+    else:
+        key, build = None, lambda: None
+
+    loaded_key, table = _LOADED
+    if key is None or key != loaded_key:
+        table = build()
+        _LOADED = (key, table)
+    ai_advisor.set_advice_table(table)
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MEDGUARD advice table builder")
+    parser.add_argument("--build", action="store_true", help="precompute every advice response")
+    parser.add_argument("--out", default=DEFAULT_PATH)
+    args = parser.parse_args()
+
+    if args.build:
+        import time
+        import ai_advisor
+        ai_advisor.set_advice_table(None)  # always ask the live backend
+        started = time.time()
+        table = build_advice_table(ai_advisor.get_ai_advice_bulk)
+        table.save(args.out)
+        backend = ai_advisor.advice_metrics()["backend"]
+        print(f"[MEDGUARD] {TABLE_SIZE} contexts -> {len(table.responses)} distinct responses "
+              f"({backend}, version {table.version}) in {time.time() - started:.1f}s, saved to {args.out}")
+    else:
+        parser.print_help()
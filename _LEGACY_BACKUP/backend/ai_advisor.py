@@ -1,16 +1,246 @@
-import random
+import threading
+from itertools import product
+
+from llm_backend import client_from_env
 
 # ─────────────────────────────────────────────────────────────────────────────
 # MED GUARD "AI" ADVISOR (Rule-Based Simulation)
 # ─────────────────────────────────────────────────────────────────────────────
 # This module simulates the output of the "MED GUARD AI" System Prompt.
 # It takes structured data and generates a compliant, formatted JSON response.
+# When a local model is configured (llm_backend.py) its wording is layered
+# on top of these rules, which remain the fallback.
+#
+# The advice logic is a declarative rule table (below). At import time it
+# is compiled into a decision index: every combination of the context
+# features the rules look at maps straight to its finished message, "why"
+# and "what to do" lists, with senior-mode wording already chosen.
 # ─────────────────────────────────────────────────────────────────────────────
 
-def get_ai_advice(context):
+DISCLAIMER_TEXT = "This information is for safety awareness and does not replace medical advice."
+
+SENIOR_SUPPORT_MESSAGE = "Remember, we are here to support your health journey safely."
+
+# ─────────────────────────────────────────────────────────────────────────────
+# RULE TABLE
+# ─────────────────────────────────────────────────────────────────────────────
+# Conditions ("when") test context features:
+#   risk_level   current_risk_level equals the value
+#   risk_type    value is one of risk_types
+#   missed_doses adherence_summary.missed_doses_last_3_days equals the value
+#   occupation   user_profile.occupation is one of the values
+#   diet         user_profile.diet equals the value
+#   medication   value is one of medications
+#   mode         user_mode equals the value
+#
+# SCENARIOS are exclusive: the highest-priority match sets the main message
+# and its why/action fragments (priority: RED > YELLOW > BEHAVIOR > GREEN).
+# EXTRAS are additive: every match appends its fragment, in table order.
+# "senior" holds the simplified wording shown in senior mode.
+# "{missed_doses}" in a fragment is filled from the context.
+
+SCENARIOS = (
+    # --- SCENARIO A: HIGH RISK (RED) ---
+    {
+        "priority": 30,
+        "when": {"risk_level": "red", "risk_type": "Interaction"},
+        "message": "I have identified a potential interaction between your medicines that requires attention.",
+        "senior_message": "I have identified a potential mix between your medicines that requires attention.",
+        "why": ["Certain combinations can increase side effects."],
+        "actions": ["Consult your doctor before taking the next dose."],
+        "senior_actions": ["Please show this screen to your doctor or family member."],
+    },
+    {
+        "priority": 29,
+        "when": {"risk_level": "red", "risk_type": "AMR"},
+        "message": "It looks like an antibiotic course was interrupted or inconsistent.",
+        "why": ["Missing antibiotic doses can allow bacteria to become resistant."],
+        "actions": ["Try to complete the full course exactly as prescribed."],
+    },
+    {
+        "priority": 28,
+        "when": {"risk_level": "red"},
+        "message": "A safety flag has been detected regarding your current medication.",
+        "why": ["The combination or dosage might need review."],
+        "actions": ["Consult a healthcare professional."],
+    },
+    # --- SCENARIO B: WARNING (YELLOW) ---
+    {
+        "priority": 20,
+        "when": {"risk_level": "yellow", "risk_type": "Behavior"},
+        "message": "I noticed you've missed a few doses recently.",
+        "why": ["You missed {missed_doses} doses in the last 3 days."],
+        "actions": ["Setting a daily alarm might be helpful."],
+        "senior_actions": ["Setting a daily alarm might be helpful.", "Ask a family member to help remind you."],
+    },
+    {
+        "priority": 19,
+        "when": {"risk_level": "yellow"},
+        "message": "There is a mild interaction or caution to be aware of.",
+        "senior_message": "There is a mild mix or caution to be aware of.",
+        "why": ["Some medicines may cause drowsiness or stomach upset."],
+        "actions": ["Monitor how you feel after taking your medicine."],
+    },
+    # --- SCENARIO C: ALL CLEAR (GREEN) ---
+    {
+        "priority": 0,
+        "when": {},
+        "message": "Your medication routine looks safe.",
+        "why": ["No immediate interactions or risks detected."],
+        "actions": [],
+    },
+)
+
+EXTRAS = (
+    # Green scenario praise (only reached when no red/yellow rule matched)
+    {"scenario": 0, "when": {"missed_doses": 0}, "why": "You have excellent adherence!"},
+    # Lifestyle context (Diet & Occupation)
+    {"when": {"occupation": ("Desk Job", "Student")},
+     "action": "Since you have a sedentary job, remember to stand up every hour."},
+    {"when": {"occupation": ("Manual Labor",)},
+     "action": "Given your active job, stay hydrated, especially with these meds."},
+    {"when": {"diet": "Veg", "medication": "Metformin"},
+     "action": "Vegetarians on Metformin should monitor Vitamin B12 levels."},
+)
+
+# Fields tested by membership ("value is one of the context's list").
+_MEMBERSHIP_FIELDS = ("risk_type", "medication")
+_OTHER = "\0other"  # stands for any value no rule mentions
+
+_FIELDS = ("risk_level", "risk_type", "missed_doses", "occupation", "diet", "medication", "mode")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# COMPILATION
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _as_tuple(value):
+    return value if isinstance(value, tuple) else (value,)
+
+
+def _referenced_values():
+    """field -> values any rule tests for (the only ones that matter)."""
+    refs = {field: set() for field in _FIELDS}
+    refs["mode"].add("senior")  # senior wording
+    for rule in SCENARIOS + EXTRAS:
+        for field, value in rule["when"].items():
+            refs[field].update(_as_tuple(value))
+    return {field: tuple(sorted(values)) for field, values in refs.items()}
+
+
+_REFS = _referenced_values()
+
+# Equality fields map referenced values to themselves (anything else is
+# _OTHER); membership fields become a bitmask over referenced values.
+_EQ = {f: {v: v for v in _REFS[f]} for f in _FIELDS if f not in _MEMBERSHIP_FIELDS}
+_BITS = {f: {v: 1 << i for i, v in enumerate(_REFS[f])} for f in _MEMBERSHIP_FIELDS}
+
+
+def _feature_domain(field):
+    if field in _MEMBERSHIP_FIELDS:
+        return range(1 << len(_REFS[field]))
+    return list(_REFS[field]) + [_OTHER]
+
+
+def _eq(lookup, value):
+    try:
+        return lookup.get(value, _OTHER)
+    except TypeError:  # unhashable, so equal to no rule value
+        return _OTHER
+
+
+def _mask(bits, values):
+    mask = 0
+    for value, bit in bits:
+        if value in values:
+            mask |= bit
+    return mask
+
+
+_RISK_LEVELS = _EQ["risk_level"]
+_RISK_TYPE_BITS = tuple(_BITS["risk_type"].items())
+_MISSED = _EQ["missed_doses"]
+_OCCUPATIONS = _EQ["occupation"]
+_DIETS = _EQ["diet"]
+_MEDICATION_BITS = tuple(_BITS["medication"].items())
+_MODES = _EQ["mode"]
+
+
+def decision_key(context):
+    """Reduce a context to the tuple of features the rule table can see (_FIELDS order)."""
+    get = context.get
+    user_profile = get("user_profile", {})
+    return (
+        _eq(_RISK_LEVELS, get("current_risk_level", "green")),
+        _mask(_RISK_TYPE_BITS, get("risk_types", [])),
+        _eq(_MISSED, get("adherence_summary", {}).get("missed_doses_last_3_days", 0)),
+        _eq(_OCCUPATIONS, user_profile.get("occupation", "Unknown")),
+        _eq(_DIETS, user_profile.get("diet", "Unknown")),
+        _mask(_MEDICATION_BITS, get("medications", [])),
+        _eq(_MODES, get("user_mode", "adult")),
+    )
+
+
+def _matches(when, features):
+    for field, wanted in when.items():
+        have = features[field]
+        if field in _MEMBERSHIP_FIELDS:
+            if not have & _BITS[field][wanted]:
+                return False
+        elif have not in _as_tuple(wanted):
+            return False
+    return True
+
+
+def _compile_entry(key):
+    features = dict(zip(_FIELDS, key))
+    is_senior = features["mode"] == "senior"
+
+    scenario = max((s for s in SCENARIOS if _matches(s["when"], features)), key=lambda s: s["priority"])
+    if is_senior:
+        message = scenario.get("senior_message", scenario["message"])
+        actions = list(scenario.get("senior_actions", scenario["actions"]))
+    else:
+        message = scenario["message"]
+        actions = list(scenario["actions"])
+    why = list(scenario["why"])
+
+    for extra in EXTRAS:
+        if "scenario" in extra and extra["scenario"] != scenario["priority"]:
+            continue
+        if _matches(extra["when"], features):
+            if "why" in extra:
+                why.append(extra["why"])
+            if "action" in extra:
+                actions.append(extra["action"])
+
+    return (
+        message,
+        tuple(why),
+        # formatting is the only per-call string work, and only when needed
+        any("{missed_doses}" in w for w in why),
+        tuple(actions),
+        is_senior,
+        message.split('.')[0],
+    )
+
+
+def _compile_index():
+    return {key: _compile_entry(key) for key in product(*(_feature_domain(f) for f in _FIELDS))}
+
+
+# Decision index: feature tuple -> compiled advice
+_INDEX = _compile_index()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# ADVICE
+# ─────────────────────────────────────────────────────────────────────────────
+
+def rule_based_advice(context):
     """
     Simulates the AI Model's reasoning steps to produce a structured response.
-    
+
     Args:
         context (dict): Strict input format defined by User.
                         {
@@ -21,97 +251,98 @@ def get_ai_advice(context):
                             "adherence_summary": {...},
                             "symptom_summary": [...]
                         }
-    
+
     Returns:
         dict: Strict output JSON format.
     """
-    # 1. CONTEXT UNDERSTANDING
-    mode = context.get("user_mode", "adult")
+    message, why, needs_format, actions, is_senior, headline = _INDEX[decision_key(context)]
     risk_level = context.get("current_risk_level", "green")
-    risk_types = context.get("risk_types", [])
-    adherence = context.get("adherence_summary", {})
-    missed_doses = adherence.get("missed_doses_last_3_days", 0)
-    
-    # 2. PATTERN ANALYSIS & TONE SELECTION
-    is_senior = (mode == "senior")
-    
-    # 3. MESSAGE GENERATION
-    # We build the message dynamically based on priority: RED > YELLOW > BEHAVIOR > GREEN
-    
-    main_message = ""
-    why_list = []
-    action_list = []
-    
-    # --- SCENARIO A: HIGH RISK (RED) ---
-    if risk_level == "red":
-        if "Interaction" in risk_types:
-            main_message = "I have identified a potential interaction between your medicines that requires attention."
-            why_list.append("Certain combinations can increase side effects.")
-            if is_senior:
-                action_list.append("Please show this screen to your doctor or family member.")
-            else:
-                action_list.append("Consult your doctor before taking the next dose.")
-        elif "AMR" in risk_types:
-            main_message = "It looks like an antibiotic course was interrupted or inconsistent."
-            why_list.append("Missing antibiotic doses can allow bacteria to become resistant.")
-            action_list.append("Try to complete the full course exactly as prescribed.")
-        else:
-             main_message = "A safety flag has been detected regarding your current medication."
-             why_list.append("The combination or dosage might need review.")
-             action_list.append("Consult a healthcare professional.")
-
-    # --- SCENARIO B: WARNING (YELLOW) ---
-    elif risk_level == "yellow":
-        if "Behavior" in risk_types: 
-             # Adherence issues
-             main_message = "I noticed you've missed a few doses recently."
-             why_list.append(f"You missed {missed_doses} doses in the last 3 days.")
-             action_list.append("Setting a daily alarm might be helpful.")
-             if is_senior:
-                 action_list.append("Ask a family member to help remind you.")
-        else:
-            main_message = "There is a mild interaction or caution to be aware of."
-            why_list.append("Some medicines may cause drowsiness or stomach upset.")
-            action_list.append("Monitor how you feel after taking your medicine.")
 
-    # --- SCENARIO C: ALL CLEAR (GREEN) ---
+    if needs_format:
+        missed_doses = context.get("adherence_summary", {}).get("missed_doses_last_3_days", 0)
+        why_list = [w.format(missed_doses=missed_doses) for w in why]
     else:
-        main_message = "Your medication routine looks safe."
-        why_list.append("No immediate interactions or risks detected.")
-        if missed_doses == 0:
-            why_list.append("You have excellent adherence!")
-    
-    # 3b. LIFESTYLE CONTEXT (Diet & Occupation)
-    user_profile = context.get("user_profile", {})
-    occupation = user_profile.get("occupation", "Unknown")
-    diet = user_profile.get("diet", "Unknown")
-
-    if occupation in ["Desk Job", "Student"]:
-        action_list.append("Since you have a sedentary job, remember to stand up every hour.")
-    elif occupation == "Manual Labor":
-        action_list.append("Given your active job, stay hydrated, especially with these meds.")
-
-    if diet == "Veg" and "Metformin" in context.get("medications", []):
-         action_list.append("Vegetarians on Metformin should monitor Vitamin B12 levels.")
-
-    # 4. SENIOR ADAPTATIONS
+        why_list = list(why)
+
     if is_senior:
-        # Simplify language further
-        main_message = main_message.replace("interaction", "mix").replace("adherence", "routine")
-        senior_support = {
-            "enabled": True,
-            "message": "Remember, we are here to support your health journey safely."
-        }
+        senior_support = {"enabled": True, "message": SENIOR_SUPPORT_MESSAGE}
     else:
         senior_support = {"enabled": False, "message": ""}
 
-    # 5. FINAL JSON CONSTRUCTION
     return {
-        "assistant_message": main_message,
+        "assistant_message": message,
         "why_this_happened": why_list,
-        "what_to_do_now": action_list,
+        "what_to_do_now": list(actions),
         "confidence_level": "high",  # We are confident in our DB rules
         "senior_support": senior_support,
-        "one_line_dashboard_summary": f"Status: {risk_level.upper()} - {main_message.split('.')[0]}.",
-        "disclaimer": "This information is for safety awareness and does not replace medical advice."
+        "one_line_dashboard_summary": f"Status: {risk_level.upper()} - {headline}.",
+        "disclaimer": DISCLAIMER_TEXT
     }
+
+
+# Model-backed client (None: rules only), configured from MEDGUARD_LLM_*
+_CLIENT = client_from_env(rule_based_advice)
+
+
+def set_advice_client(client):
+    """Swap the model client at runtime (None reverts to rules only)."""
+    global _CLIENT
+    _CLIENT = client
+
+
+def advice_metrics():
+    """Latency / cache / fallback counters of the model client."""
+    if _CLIENT is None:
+        return {"backend": "rules"}
+    return {"backend": _CLIENT.backend.name, **_CLIENT.metrics.snapshot()}
+
+
+# Precomputed responses (advice_table.py). Loaded on the first lookup
+# unless set before (serve.py does it in the master, ahead of fork), so
+# importing the app doesn't build the table.
+_TABLE = None
+_TABLE_SET = False
+_TABLE_LOCK = threading.Lock()
+
+
+def set_advice_table(table):
+    global _TABLE, _TABLE_SET
+    _TABLE = table
+    _TABLE_SET = True
+
+
+def _advice_table():
+    if not _TABLE_SET:
+        with _TABLE_LOCK:
+            if not _TABLE_SET:
+                from advice_table import load_advice_table
+                load_advice_table()  # calls set_advice_table()
+    return _TABLE
+
+
+def get_ai_advice_tagged(context):
+    """
+    (advice, etag). Contexts covered by the precomputed table are a single
+    lookup and carry a stable ETag; others are generated live (etag None).
+    """
+    table = _advice_table()
+    if table is not None:
+        hit = table.lookup(context)
+        if hit is not None:
+            response_id, advice = hit
+            return advice, table.etag(response_id)
+    if _CLIENT is None:
+        return rule_based_advice(context), None
+    return _CLIENT.advise(context), None
+
+
+def get_ai_advice(context):
+    """Advice for one context (same contract as rule_based_advice)."""
+    return get_ai_advice_tagged(context)[0]
+
+
+def get_ai_advice_bulk(contexts):
+    """Advice for many contexts (e.g. nightly pre-generation for every user)."""
+    if _CLIENT is None:
+        return [rule_based_advice(context) for context in contexts]
+    return _CLIENT.advise_many(contexts)
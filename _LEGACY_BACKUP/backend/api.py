@@ -17,12 +17,28 @@ from flask_cors import CORS
 # Ensure backend directory is on path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from db import init_db, query, execute, table_stats, DB_PATH
-from risk_engine import check_risk, check_interactions, amr_monitor, explain_risk, analyze_user_behavior, DISCLAIMER
-from ai_advisor import get_ai_advice
-from ocr_pipeline import process_prescription_image, store_confirmed_medicine
+from db import init_db, iter_pages, table_stats, DB_PATH, STREAM_PAGE_ROWS
+from risk_engine import check_risk, check_interactions, amr_monitor, explain_risk, analyze_population_behavior, DISCLAIMER
+from ai_advisor import get_ai_advice_tagged, advice_metrics
+from ocr_pipeline import run_prescription_ocr, store_confirmed_medicine
+from ocr_corrections import record_correction
+from drug_search import search_drug_names
+from text_search import search_knowledge
+from json_provider import FastJSONProvider, stream_json
+from queries import run, run_one, run_write, query_stats
+from timeline import (
+    RECENT_DAYS, SYNC_PAGE_SIZE, CHANGE_TRACKING_DDL,
+    active_params, recent_params, active_drug_ids, list_courses, iter_courses, changes_since,
+)
+from risk_state import get_user_risk_state, on_medicine_added, on_doses_changed, on_course_updated
+from risk_worker import notify, notify_timeline, get_stored_state
+from dashboard import get_dashboard, load_profile, build_advice_context
+from drug_stats import install_drug_stats, record_symptoms, get_drug_stats
+from symptom_matcher import match_symptoms, flag_likely_adrs
+from export import DOSE_EVENTS_DDL
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)  # orjson when available, compact output
 CORS(app)  # Enable CORS for all routes
 
 # Helper: Initialize DB if missing
@@ -39,6 +55,14 @@ else:
 # Schema Migration (Auto-Update)
 # ──────────────────────────────────────────────
 
+def _schema_columns(table):
+    return [r["name"] for r in run("schema.columns", (table,), DB_PATH)]
+
+
+def _schema_has(kind, name):
+    return run_one("schema.object", (kind, name), DB_PATH) is not None
+
+
 def update_schema_on_startup():
     """Ensure new columns exist in the database."""
     try:
@@ -46,8 +70,7 @@ def update_schema_on_startup():
         cursor = conn.cursor()
         
         # Check user_medicine_timeline columns
-        cursor.execute("PRAGMA table_info(user_medicine_timeline)")
-        columns = [info[1] for info in cursor.fetchall()]
+        columns = _schema_columns("user_medicine_timeline")
         
         updates = []
         if 'symptoms' not in columns:
@@ -59,10 +82,12 @@ def update_schema_on_startup():
         if 'taken_doses' not in columns:
             cursor.execute("ALTER TABLE user_medicine_timeline ADD COLUMN taken_doses INTEGER DEFAULT 0")
             updates.append("taken_doses")
+        if 'change_seq' not in columns:
+            cursor.execute("ALTER TABLE user_medicine_timeline ADD COLUMN change_seq INTEGER DEFAULT 0")
+            updates.append("change_seq")
 
         # Check if user_profile table exists, if not create it (Safety Net)
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='user_profile'")
-        if not cursor.fetchone():
+        if not _schema_has("table", "user_profile"):
             cursor.execute("""
                 CREATE TABLE user_profile (
                     user_id TEXT PRIMARY KEY,
@@ -79,6 +104,87 @@ def update_schema_on_startup():
                 )
             """)
             updates.append("CREATED_TABLE_user_profile")
+
+        # Precomputed risk written by the background worker
+        if not _schema_has("table", "user_risk_state"):
+            cursor.execute("""
+                CREATE TABLE user_risk_state (
+                    user_id TEXT PRIMARY KEY,
+                    risk_level TEXT,
+                    risk_json TEXT,
+                    insights_json TEXT,
+                    updated_at TEXT
+                )
+            """)
+            updates.append("CREATED_TABLE_user_risk_state")
+
+        # User-confirmed OCR names (learned corrections)
+        if not _schema_has("table", "ocr_corrections"):
+            cursor.execute("""
+                CREATE TABLE ocr_corrections (
+                    normalized TEXT,
+                    drug_id TEXT,
+                    confirmations INTEGER NOT NULL DEFAULT 0,
+                    last_confirmed TEXT,
+                    PRIMARY KEY (normalized, drug_id)
+                )
+            """)
+            updates.append("CREATED_TABLE_ocr_corrections")
+        if not _schema_has("table", "ocr_correction_users"):
+            cursor.execute("""
+                CREATE TABLE ocr_correction_users (
+                    normalized TEXT,
+                    drug_id TEXT,
+                    user_id TEXT,
+                    PRIMARY KEY (normalized, drug_id, user_id)
+                )
+            """)
+            # Earlier counts were per submission, not per user: relearn
+            cursor.execute("UPDATE ocr_corrections SET confirmations = MIN(confirmations, 1)")
+            updates.append("CREATED_TABLE_ocr_correction_users")
+
+        # Active-course lookups + cold history for archived courses
+        if not _schema_has("table", "user_medicine_history"):
+            cursor.execute("""
+                CREATE TABLE user_medicine_history (
+                    id INTEGER PRIMARY KEY,
+                    user_id TEXT,
+                    drug_id TEXT,
+                    start_date TEXT,
+                    end_date TEXT,
+                    missed_doses INTEGER DEFAULT 0,
+                    taken_doses INTEGER DEFAULT 0,
+                    symptoms TEXT,
+                    confirmed INTEGER DEFAULT 0,
+                    archived_at TEXT
+                )
+            """)
+            cursor.execute("CREATE INDEX idx_history_user_end ON user_medicine_history (user_id, end_date)")
+            updates.append("CREATED_TABLE_user_medicine_history")
+        if not _schema_has("index", "idx_timeline_user_end_start"):
+            cursor.execute("""
+                CREATE INDEX idx_timeline_user_end_start
+                ON user_medicine_timeline (user_id, end_date, start_date)
+            """)
+            updates.append("idx_timeline_user_end_start")
+
+        # Tombstones gained deleted_at (compaction): recreate the delete trigger
+        tombstone_columns = _schema_columns("user_timeline_tombstones")
+        if tombstone_columns and 'deleted_at' not in tombstone_columns:
+            cursor.execute("ALTER TABLE user_timeline_tombstones ADD COLUMN deleted_at TEXT")
+            cursor.execute("DROP TRIGGER IF EXISTS trg_timeline_delete_seq")
+            updates.append("tombstones.deleted_at")
+
+        # Delta-sync change tracking (idempotent: IF NOT EXISTS throughout)
+        conn.commit()
+        conn.executescript(CHANGE_TRACKING_DDL)
+
+        # Per-drug statistics: triggers + one-time backfill
+        if install_drug_stats(DB_PATH):
+            updates.append("CREATED_TABLE_drug_stats")
+
+        # Append-only dose log for analytics exports (export.py)
+        conn.executescript(DOSE_EVENTS_DDL)
             
         if updates:
             conn.commit()
@@ -142,8 +248,8 @@ def add_medicine():
     
     # Check if antibiotic (simple check)
     is_antibiotic = False
-    drug_info = query("SELECT drug_class FROM drug_master WHERE drug_id = ?", (drug_id,))
-    if drug_info and 'antibiotic' in drug_info[0]['drug_class'].lower():
+    drug_info = run_one("drug.class", (drug_id,))
+    if drug_info and 'antibiotic' in drug_info['drug_class'].lower():
         is_antibiotic = True
         
     duration = 5 if is_antibiotic else 10 # Default duration
@@ -153,15 +259,14 @@ def add_medicine():
         return jsonify({"error": "drug_id is required"}), 400
 
     # Validate drug exists
-    drug = query("SELECT * FROM drug_master WHERE drug_id = ?", (drug_id,))
+    drug = run("drug.by_id", (drug_id,))
     if not drug:
         return jsonify({"error": f"Drug {drug_id} not found in database"}), 404
 
-    row_id = execute(
-        """INSERT INTO user_medicine_timeline (user_id, drug_id, start_date, end_date, confirmed, symptoms, taken_doses, missed_doses)
-           VALUES (?, ?, ?, ?, 1, NULL, 0, 0)""",
-        (user_id, drug_id, start_date, end_date),
-    )
+    written = run_write("timeline.add", (user_id, drug_id, start_date, end_date), returning="timeline.written")
+    row_id = written["id"]
+    on_medicine_added(user_id, row_id, drug_id, written["seq"], start_date, end_date)
+    notify(user_id)
 
     return jsonify({
         "success": True,
@@ -191,9 +296,10 @@ def log_adherence():
     if not timeline_id or status not in ['taken', 'missed']:
         return jsonify({"error": "Invalid parameters"}), 400
         
-    col = "taken_doses" if status == "taken" else "missed_doses"
-    
-    execute(f"UPDATE user_medicine_timeline SET {col} = {col} + 1 WHERE id = ?", (timeline_id,))
+    written = run_write(f"timeline.dose_{status}", (timeline_id,), returning="timeline.written")
+    if written is not None:
+        on_doses_changed(written["user_id"], timeline_id, written["missed_doses"], written["seq"])
+    notify_timeline(timeline_id)
     
     return jsonify({"success": True, "message": f"Dose marked as {status}"})
 
@@ -207,6 +313,9 @@ def report_symptoms():
     """
     Save symptoms for a completed course.
     Body: { "timeline_id": 1, "symptoms": "Headache, Nausea" }
+
+    Reported symptoms are matched to known ADRs; those listed for the
+    course's drug or the user's active medicines come back as likely_adrs.
     """
     data = request.get_json(force=True)
     timeline_id = data.get("timeline_id")
@@ -215,9 +324,22 @@ def report_symptoms():
     if not timeline_id or not symptoms:
         return jsonify({"error": "Missing parameters"}), 400
         
-    execute("UPDATE user_medicine_timeline SET symptoms = ? WHERE id = ?", (symptoms, timeline_id))
-    
-    return jsonify({"success": True, "message": "Symptoms recorded"})
+    course = record_symptoms(timeline_id, symptoms)
+    if course is None:
+        return jsonify({"error": f"Timeline entry {timeline_id} not found"}), 404
+    on_course_updated(course["user_id"], course["seq"])
+    notify_timeline(timeline_id)
+
+    matches = match_symptoms(symptoms)
+    drug_ids = [course["drug_id"]] + active_drug_ids(course["user_id"])
+
+    return jsonify({
+        "success": True,
+        "message": "Symptoms recorded",
+        "symptoms": matches,
+        "likely_adrs": flag_likely_adrs(matches, drug_ids),
+        "disclaimer": DISCLAIMER,
+    })
 
 
 # ──────────────────────────────────────────────
@@ -279,12 +401,7 @@ def interactions():
     # Also check food/alcohol for each
     food_flags = []
     for drug_id in drug_ids:
-        food_rows = query("""
-            SELECT fai.*, dm.molecule
-            FROM food_alcohol_interactions fai
-            JOIN drug_master dm ON fai.drug_id = dm.drug_id
-            WHERE fai.drug_id = ?
-        """, (drug_id,))
+        food_rows = run("food.by_drug", (drug_id,))
         for row in food_rows:
             food_flags.append({
                 "type": "food_alcohol",
@@ -372,7 +489,7 @@ def ocr():
     file.save(file_path)
 
     # Process
-    result = process_prescription_image(file_path)
+    result = run_prescription_ocr(file_path)
     
     # Optional: Clean up file after processing if desired, or keep for debugging
     # os.remove(file_path) 
@@ -380,6 +497,38 @@ def ocr():
     return jsonify(result)
 
 
+# ──────────────────────────────────────────────
+# POST /ocr/batch — Multi-file / multi-page OCR
+# ──────────────────────────────────────────────
+
+@app.route("/ocr/batch", methods=["POST"])
+def ocr_batch():
+    """
+    Process several prescription files (images, PDFs, multi-page TIFFs)
+    in one go. Accepts multipart/form-data with one or more 'files' parts.
+    Medicines seen on several pages are merged; each candidate lists its
+    sources as {file: index into "files", page}.
+    """
+    files = [f for f in request.files.getlist('files') if f.filename]
+    if not files:
+        return jsonify({"error": "No files uploaded"}), 400
+
+    upload_folder = os.path.join(os.path.dirname(__file__), 'uploads')
+    if not os.path.exists(upload_folder):
+        os.makedirs(upload_folder)
+
+    # Index prefix: photo batches often share file names
+    paths = []
+    for i, file in enumerate(files):
+        path = os.path.join(upload_folder, f"{i}_{os.path.basename(file.filename)}")
+        file.save(path)
+        paths.append(path)
+
+    result = run_prescription_ocr(paths)
+    result["files"] = [f.filename for f in files]
+    return jsonify(result)
+
+
 # ──────────────────────────────────────────────
 # POST /ocr/confirm — Confirm OCR result
 # ──────────────────────────────────────────────
@@ -389,7 +538,11 @@ def ocr_confirm():
     """
     Confirm and store a medicine from OCR results.
 
-    Body: { "drug_id": "D01", "user_id": "default" }
+    Body: { "drug_id": "D01", "user_id": "default", "duration_days": 5,
+            "extracted_name": "Dol0 650" }
+
+    extracted_name (the OCR'd name the user confirmed this drug for)
+    teaches the matcher that reading — see ocr_corrections.py.
     """
     data = request.get_json(force=True)
     drug_id = data.get("drug_id")
@@ -398,7 +551,19 @@ def ocr_confirm():
     if not drug_id:
         return jsonify({"error": "drug_id is required"}), 400
 
-    result = store_confirmed_medicine(drug_id, user_id=user_id)
+    # Course length parsed from the prescription line, if any
+    duration_days = data.get("duration_days")
+    if duration_days is not None and (type(duration_days) is not int or duration_days < 1):
+        return jsonify({"error": "duration_days must be a positive integer"}), 400
+
+    result = store_confirmed_medicine(drug_id, user_id=user_id, duration_days=duration_days)
+    if result.get("stored"):
+        on_medicine_added(user_id, result["timeline_id"], drug_id, result.pop("change_seq"),
+                          result["start_date"], result["end_date"])
+        notify(user_id)
+        extracted_name = data.get("extracted_name")
+        if isinstance(extracted_name, str) and extracted_name:
+            record_correction(extracted_name, drug_id, user_id)
     return jsonify({
         **result,
         "message": "Medicine confirmed and added to timeline.",
@@ -412,14 +577,59 @@ def ocr_confirm():
 
 @app.route("/drugs", methods=["GET"])
 def list_drugs():
-    """List all drugs in the database."""
-    drugs = query("""
-        SELECT dm.*, GROUP_CONCAT(bm.brand_name, ', ') as brands
-        FROM drug_master dm
-        LEFT JOIN brand_mapping bm ON dm.drug_id = bm.drug_id
-        GROUP BY dm.drug_id
-    """)
-    return jsonify({"drugs": drugs, "count": len(drugs), "disclaimer": DISCLAIMER})
+    """List all drugs in the database (streamed, read in keyset pages)."""
+    def page(after):
+        rows = run("drug.page", (after or "", STREAM_PAGE_ROWS))
+        return rows, rows[-1]["drug_id"] if len(rows) == STREAM_PAGE_ROWS else None
+
+    drugs = iter_pages(page)
+    return stream_json(app, "drugs", drugs, lambda count: {"count": count, "disclaimer": DISCLAIMER})
+
+
+# ──────────────────────────────────────────────
+# GET /drugs/search — Typeahead drug search
+# ──────────────────────────────────────────────
+
+@app.route("/drugs/search", methods=["GET"])
+def search_drugs():
+    """
+    Autocomplete over molecule and brand names.
+    Query: ?q=dolo&limit=10
+    """
+    q = request.args.get("q", "").strip()
+    limit = request.args.get("limit", 10, type=int)
+
+    if not q:
+        return jsonify({"error": "q is required"}), 400
+
+    results = search_drug_names(q, limit=max(1, min(limit, 50)))
+    return jsonify({"query": q, "results": results, "count": len(results), "disclaimer": DISCLAIMER})
+
+
+# ──────────────────────────────────────────────
+# GET /search — Full-text knowledge search
+# ──────────────────────────────────────────────
+
+@app.route("/search", methods=["GET"])
+def search():
+    """
+    Ranked full-text search over drug, ADR and interaction text.
+    Query: ?q=jaundice&kind=adr&limit=20
+    """
+    q = request.args.get("q", "").strip()
+    kind = request.args.get("kind")
+    limit = request.args.get("limit", 20, type=int)
+
+    if not q:
+        return jsonify({"error": "q is required"}), 400
+    if kind and kind not in ("drug", "adr", "interaction"):
+        return jsonify({"error": "kind must be one of drug, adr, interaction"}), 400
+
+    result = search_knowledge(q, kind=kind, limit=max(1, min(limit, 100)))
+    if "error" in result:
+        return jsonify(result), 501
+
+    return jsonify({"query": q, **result, "disclaimer": DISCLAIMER})
 
 
 # ──────────────────────────────────────────────
@@ -431,8 +641,8 @@ def get_behavior_analysis():
     """Get longitudinal behavioral analysis for the user."""
     user_id = request.args.get('user_id', 'default')
     
-    # Analyze patterns
-    insights = analyze_user_behavior(user_id)
+    # Patterns precomputed by the risk worker
+    insights = get_stored_state(user_id)["insights"]
     
     return jsonify({
         "user_id": user_id,
@@ -441,6 +651,98 @@ def get_behavior_analysis():
     })
 
 
+# ──────────────────────────────────────────────
+# GET /analysis/population — Clinician overview
+# ──────────────────────────────────────────────
+
+@app.route("/analysis/population", methods=["GET"])
+def get_population_analysis():
+    """Behavioral insights for all users, computed in a single SQL pass."""
+    by_user = analyze_population_behavior()
+
+    counts = {}
+    for insights in by_user.values():
+        for insight in insights:
+            counts[insight["title"]] = counts.get(insight["title"], 0) + 1
+
+    return jsonify({
+        "user_count": len(by_user),
+        "insight_counts": counts,
+        "users": by_user,
+        "disclaimer": DISCLAIMER,
+    })
+
+
+# ──────────────────────────────────────────────
+# GET /stats/drugs/<drug_id> — Pharmacovigilance counters
+# ──────────────────────────────────────────────
+
+@app.route("/stats/drugs/<drug_id>", methods=["GET"])
+def get_drug_statistics(drug_id):
+    """
+    Users, courses, dose adherence and reported symptoms (mapped to
+    adr_master) for one drug, from the incrementally maintained counters.
+    """
+    drug = run("drug.summary", (drug_id,))
+    if not drug:
+        return jsonify({"error": f"Drug {drug_id} not found in database"}), 404
+
+    stats = get_drug_stats(drug_id) or {
+        "users": 0, "courses": 0, "missed_doses": 0, "taken_doses": 0,
+        "symptom_reports": 0, "adherence_rate": None, "symptoms": [],
+    }
+    stats.update(drug[0])
+    stats["disclaimer"] = DISCLAIMER
+    return jsonify(stats)
+
+
+# ──────────────────────────────────────────────
+# GET /risk/state — Precomputed user risk
+# ──────────────────────────────────────────────
+
+@app.route("/risk/state", methods=["GET"])
+def get_risk_state():
+    """
+    Latest risk assessment + behavior insights for a user, as recomputed
+    in the background after each timeline/profile change.
+    """
+    user_id = request.args.get("user_id", "default")
+    state = get_stored_state(user_id)
+
+    return jsonify({
+        "user_id": user_id,
+        "risk": state["risk"],
+        "insights": state["insights"],
+        "updated_at": state["updated_at"],
+        "disclaimer": DISCLAIMER,
+    })
+
+
+# ──────────────────────────────────────────────
+# GET /dashboard — Home screen in one request
+# ──────────────────────────────────────────────
+
+@app.route("/dashboard", methods=["GET"])
+def get_dashboard_endpoint():
+    """
+    Timeline (recent scope), behavior insights, risk result and AI advice
+    in one response, cached per user until the timeline or profile changes.
+    Query: ?user_id=default&user_age=72&mode=adult|senior
+    """
+    user_id = request.args.get("user_id", "default")
+    user_age = request.args.get("user_age", type=int)
+    mode = request.args.get("mode", "adult")
+    if mode not in ("adult", "senior"):
+        return jsonify({"error": "mode must be adult or senior"}), 400
+
+    payload, etag = get_dashboard(user_id, user_age=user_age, mode=mode)
+    if request.if_none_match.contains(etag):
+        return "", 304
+    response = jsonify(payload)
+    response.set_etag(etag)
+    return response
+
+
 # ──────────────────────────────────────────────
 # POST /ai/advice — AI Persona Response
 # ──────────────────────────────────────────────
@@ -459,56 +761,45 @@ def get_ai_advice_endpoint():
     user_age = data.get("user_age", 40)
     mode = data.get("mode", "adult")
     
-    # 1. Fetch User's Active Medicines
-    timeline_rows = query("""
-        SELECT drug_id, missed_doses FROM user_medicine_timeline 
-        WHERE user_id = ? AND confirmed = 1
-    """, (user_id,))
-    
-    drug_ids = [row["drug_id"] for row in timeline_rows]
-    missed_map = {row["drug_id"]: row["missed_doses"] for row in timeline_rows}
-    total_missed = sum(row["missed_doses"] for row in timeline_rows)
+    # 1. User's Active Medicines (incrementally maintained risk state)
+    state = get_user_risk_state(user_id)
 
-    # 2. Run Risk Engine
-    risk_result = check_risk(drug_ids, user_age=user_age, missed_doses_map=missed_map)
-    
-    # 3. Detect Risk Types
-    risk_types = set()
-    for f in risk_result["flags"]:
-        if f["level"] in ["red", "yellow"]:
-            if f["type"] == "interaction": risk_types.add("Interaction")
-            elif f["type"] == "amr": risk_types.add("AMR")
-            elif f["type"] == "alcohol": risk_types.add("ADR") # Alcohol falls under ADR/Interaction
-            elif f["type"] == "behavior": risk_types.add("Behavior")
-    
-    # 4. Build Context for AI
-    # Fetch detailed profile
-    profile_row = query("SELECT * FROM user_profile WHERE user_id = ?", (user_id,))
-    user_context = {}
-    if profile_row:
-        user_context = profile_row[0]
-
-    ai_context = {
-        "user_mode": mode,
-        "user_profile": {
-            "age": user_age,
-            "diet": user_context.get("diet", "Unknown"),
-            "occupation": user_context.get("occupation", "Unknown"),
-            "weight": user_context.get("weight_kg"),
-        },
-        "current_risk_level": risk_result["risk_level"],
-        "risk_types": list(risk_types),
-        "medications": drug_ids, # simplified
-        "adherence_summary": {
-            "missed_doses_last_3_days": total_missed
-        },
-        "symptom_summary": [] # Placeholder for now
-    }
+    # 2. Run Risk Engine (only flags affected by timeline changes are recomputed)
+    risk_result = state.result(user_age=user_age)
     
-    # 5. Get Advice
-    advice = get_ai_advice(ai_context)
+    # 3. Build Context for AI (risk types + profile)
+    ai_context = build_advice_context(load_profile(user_id), state, risk_result, user_age, mode)
     
-    return jsonify(advice)
+    # 4. Get Advice (precomputed table lookup when the context is covered)
+    advice, etag = get_ai_advice_tagged(ai_context)
+    if etag is None:
+        return jsonify(advice)
+
+    if request.if_none_match.contains(etag):
+        return "", 304
+    response = jsonify(advice)
+    response.set_etag(etag)
+    return response
+
+
+# ──────────────────────────────────────────────
+# GET /ai/metrics — Advice backend latency / cache stats
+# ──────────────────────────────────────────────
+
+@app.route("/ai/metrics", methods=["GET"])
+def get_ai_metrics():
+    """Model backend in use, cache hits, fallbacks and latency percentiles."""
+    return jsonify(advice_metrics())
+
+
+# ──────────────────────────────────────────────
+# GET /db/metrics — Named query timings
+# ──────────────────────────────────────────────
+
+@app.route("/db/metrics", methods=["GET"])
+def get_db_metrics():
+    """Calls and timings per registered query in this worker process."""
+    return jsonify({"pid": os.getpid(), "queries": query_stats()})
 
 
 # ──────────────────────────────────────────────
@@ -526,11 +817,7 @@ def update_profile():
     
     try:
         # Upsert logic (SQLite doesn't have native UPSERT in older versions, so we try insert or replace)
-        execute("""
-            INSERT OR REPLACE INTO user_profile 
-            (user_id, name, gender, age, weight_kg, height_cm, diet, occupation, existing_conditions, step_counter_enabled, last_synced_steps)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
+        run_write("profile.save", (
             user_id,
             data.get("name"),
             data.get("gender"),
@@ -543,6 +830,7 @@ def update_profile():
             data.get("step_counter_enabled", False),
             data.get("steps", 0)
         ))
+        notify(user_id)  # age may flip the 65+ elderly checks
         return jsonify({"success": True, "message": "Profile updated"})
     except Exception as e:
         print(f"[ERROR] Failed to save profile: {e}")
@@ -553,7 +841,7 @@ def update_profile():
 def get_profile():
     """Get user profile to check if onboarding is needed."""
     user_id = request.args.get("user_id", "default")
-    row = query("SELECT * FROM user_profile WHERE user_id = ?", (user_id,))
+    row = run("profile.by_user", (user_id,))
     
     if not row:
         return jsonify({"exists": False})
@@ -588,8 +876,7 @@ def device_sync():
     
     # Update profile with latest steps
     user_id = request.json.get("user_id", "default")
-    execute("UPDATE user_profile SET last_synced_steps = ?, step_counter_enabled = 1 WHERE user_id = ?", 
-            (mock_steps, user_id))
+    run_write("profile.sync_steps", (mock_steps, user_id))
     
     return jsonify({
         "success": True,
@@ -620,26 +907,66 @@ def get_drug(drug_id):
 @app.route("/timeline", methods=["GET"])
 def get_timeline():
     """
-    Get all medicines for a user.
-    Query: ?user_id=default
+    Get medicines for a user.
+    Query: ?user_id=default&scope=recent|active|all|history&days=30
+           &limit=20&cursor=<next_cursor>      (keyset pagination)
+
+      recent   active courses + those ended in the last `days` (default)
+      active   start_date <= today <= end_date
+      all      every course still in the timeline
+      history  archived courses (cold table)
+
+    Delta sync: ?since=<token> returns only rows changed after the token
+    (plus ids of deleted rows) and the new token. since=0 is a full sync.
     """
     user_id = request.args.get("user_id", "default")
+    limit = request.args.get("limit", type=int)
+    if limit is not None:
+        limit = max(1, min(limit, SYNC_PAGE_SIZE))
+
+    since = request.args.get("since")
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            return jsonify({"error": "since must be a sync token"}), 400
+        delta = changes_since(user_id, since, limit or SYNC_PAGE_SIZE)
+        delta["count"] = len(delta["timeline"])
+        delta["disclaimer"] = DISCLAIMER
+        return jsonify(delta)
+
+    scope = request.args.get("scope", "recent")
+    table = "user_medicine_history" if scope == "history" else "user_medicine_timeline"
+
+    window = None
+    if scope == "recent":
+        days = request.args.get("days", RECENT_DAYS, type=int)
+        window = recent_params(max(0, days))
+    elif scope == "active":
+        window = active_params()
+    elif scope not in ("all", "history"):
+        return jsonify({"error": "scope must be one of recent, active, all, history"}), 400
+
+    if limit is None and not request.args.get("cursor"):
+        # Unpaged: stream the rows instead of building the whole list
+        return stream_json(app, "timeline", iter_courses(user_id, window, table=table),
+                           lambda count: {"count": count, "disclaimer": DISCLAIMER})
+
+    try:
+        timeline, next_cursor = list_courses(
+            user_id, window, table=table, limit=limit, cursor=request.args.get("cursor"),
+        )
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
     
-    timeline = query("""
-        SELECT umt.*, dm.molecule, dm.drug_class, 
-               CASE WHEN lower(dm.drug_class) LIKE '%antibiotic%' THEN 1 ELSE 0 END as is_antibiotic,
-               dm.common_use
-        FROM user_medicine_timeline umt
-        JOIN drug_master dm ON umt.drug_id = dm.drug_id
-        WHERE umt.user_id = ?
-        ORDER BY umt.start_date DESC
-    """, (user_id,))
-    
-    return jsonify({
+    result = {
         "timeline": timeline,
         "count": len(timeline),
         "disclaimer": DISCLAIMER
-    })
+    }
+    if limit is not None:
+        result["next_cursor"] = next_cursor
+    return jsonify(result)
 
 
 # ──────────────────────────────────────────────
@@ -659,14 +986,23 @@ if __name__ == "__main__":
     print("[MEDGUARD] Endpoints:")
     print("  GET  /health          — Health check")
     print("  GET  /drugs           — List all drugs")
+    print("  GET  /drugs/search    — Typeahead drug search")
     print("  GET  /drugs/<id>      — Get drug details")
+    print("  GET  /search          — Full-text knowledge search")
     print("  POST /medicine        — Add medicine to timeline")
     print("  POST /risk            — Risk assessment")
+    print("  GET  /risk/state      — Precomputed user risk")
+    print("  GET  /dashboard       — Timeline + insights + risk + advice")
+    print("  GET  /analysis/population — Population behavior insights")
     print("  POST /interactions    — Check interactions")
     print("  POST /amr             — AMR monitoring")
     print("  POST /explain         — Explain risk with sources")
     print("  POST /ocr             — Process prescription image")
+    print("  POST /ocr/batch       — Multi-file / multi-page OCR")
     print("  POST /ocr/confirm     — Confirm OCR medicine")
+    print("  GET  /stats/drugs/<id> — Per-drug statistics")
+    print("  GET  /ai/metrics      — Advice backend metrics")
+    print("  GET  /db/metrics      — Named query timings")
     print(f"\n{DISCLAIMER}\n")
 
     app.run(host="0.0.0.0", port=5050, debug=True)
@@ -0,0 +1,189 @@
+"""
+MEDGUARD — ASGI Serving Mode
+Serves the existing Flask routes from an ASGI server:
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5050
+
+Connections, keep-alives, request bodies and response sending live on the
+event loop, so idle or slow clients cost no thread. Each Flask view (and
+therefore its SQLite access) runs on a bounded thread pool, and OCR is
+offloaded to a process pool. Routes and JSON shapes are the Flask ones,
+unchanged.
+
+Tuning (environment):
+    MEDGUARD_ASGI_THREADS    view/DB threads            (default 32)
+    MEDGUARD_OCR_PROCESSES   OCR worker processes       (default CPU count)
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Ensure backend directory is on path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from api import app, update_schema_on_startup
+from ocr_pipeline import set_ocr_executor
+
+VIEW_THREADS = int(os.environ.get("MEDGUARD_ASGI_THREADS", "32"))
+OCR_PROCESSES = int(os.environ.get("MEDGUARD_OCR_PROCESSES", "0")) or os.cpu_count() or 1
+
+# Request bodies above this spill to disk instead of memory (uploads).
+MAX_MEMORY_BODY = 1024 * 1024
+
+_view_executor = None
+_ocr_executor = None
+
+
+def _startup():
+    global _view_executor, _ocr_executor
+    update_schema_on_startup()
+    _view_executor = ThreadPoolExecutor(max_workers=VIEW_THREADS, thread_name_prefix="medguard-view")
+    _ocr_executor = ProcessPoolExecutor(max_workers=OCR_PROCESSES)
+    set_ocr_executor(_ocr_executor)
+
+
+def _shutdown():
+    global _view_executor, _ocr_executor
+    set_ocr_executor(None)
+    if _view_executor:
+        _view_executor.shutdown(wait=True)
+    if _ocr_executor:
+        _ocr_executor.shutdown(wait=True)
+    _view_executor = _ocr_executor = None
+
+
+# ──────────────────────────────────────────────
+# ASGI → WSGI translation
+# ──────────────────────────────────────────────
+
+async def _read_body(receive):
+    """Drain the request body on the event loop."""
+    body = tempfile.SpooledTemporaryFile(max_size=MAX_MEMORY_BODY)
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        body.write(message.get("body", b""))
+        more_body = message.get("more_body", False)
+    size = body.tell()
+    body.seek(0)
+    return body, size
+
+
+def _build_environ(scope, body, size):
+    """PEP 3333 environ for an ASGI HTTP scope."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        # Body is fully buffered, so its length is known even for chunked uploads
+        "CONTENT_LENGTH": str(size),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin1").upper().replace("-", "_")
+        value = raw_value.decode("latin1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name in ("CONTENT_LENGTH", "TRANSFER_ENCODING"):
+            continue
+        else:
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _start_view(environ):
+    """Run the Flask app up to its first body chunk (executes in the view pool)."""
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = [
+            (name.lower().encode("latin1"), value.encode("latin1")) for name, value in headers
+        ]
+
+    result = app(environ, start_response)
+    iterator = iter(result)
+    first = next(iterator, None)
+    return started, result, iterator, first
+
+
+def _close(result):
+    close = getattr(result, "close", None)
+    if close:
+        close()
+
+
+async def _handle_http(scope, receive, send):
+    loop = asyncio.get_running_loop()
+    body, size = await _read_body(receive)
+    try:
+        environ = _build_environ(scope, body, size)
+        started, result, iterator, chunk = await loop.run_in_executor(
+            _view_executor, _start_view, environ
+        )
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": started["status"],
+                "headers": started["headers"],
+            })
+            # Streamed responses keep producing chunks on the pool, one at a time
+            while chunk is not None:
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                chunk = await loop.run_in_executor(_view_executor, next, iterator, None)
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            await loop.run_in_executor(_view_executor, _close, result)
+    finally:
+        body.close()
+
+
+async def _handle_lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                _startup()
+            except Exception as e:
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+                return
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            _shutdown()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    """ASGI entry point."""
+    if scope["type"] == "lifespan":
+        await _handle_lifespan(receive, send)
+    elif scope["type"] == "http":
+        if _view_executor is None:
+            # Server without lifespan support: start lazily on first request
+            _startup()
+        await _handle_http(scope, receive, send)
+    elif scope["type"] == "websocket":
+        # No websocket routes: closing before accept rejects the handshake (403)
+        await receive()
+        await send({"type": "websocket.close", "code": 1008})
@@ -0,0 +1,130 @@
+"""
+MEDGUARD — Dashboard
+Everything the home screen shows (timeline, behavior insights, risk,
+AI advice) from one shared load of the user's context.
+
+The frontend used to fetch /timeline, /analysis/behavior and /ai/advice
+separately, each re-reading the same rows. get_dashboard() reads the
+profile and the recent timeline once, derives the rest from them and
+caches the result per user. The cache is keyed on the timeline change
+sequence, the profile fields the dashboard uses and the day, so any
+mutation (from any process) invalidates it on the next read.
+"""
+
+import hashlib
+import threading
+
+import db
+from queries import run_one
+from ai_advisor import get_ai_advice_tagged
+from knowledge import snapshot_version
+from risk_engine import behavior_insights_for_courses, DISCLAIMER
+from risk_state import get_user_risk_state
+from timeline import RECENT_DAYS, current_seq, list_courses, recent_params, today_iso
+
+# /ai/advice default when neither the request nor the profile has an age
+DEFAULT_AGE = 40
+
+# (db path, user_id) -> (fingerprint, payload)
+_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+
+# ──────────────────────────────────────────────
+# User Context
+# ──────────────────────────────────────────────
+
+def load_profile(user_id):
+    """The user's profile row as a dict ({} before onboarding)."""
+    return run_one("profile.by_user", (user_id,)) or {}
+
+
+def risk_types_of(risk_result):
+    """Advice risk categories present among red/yellow flags."""
+    risk_types = set()
+    for f in risk_result["flags"]:
+        if f["level"] in ["red", "yellow"]:
+            if f["type"] == "interaction": risk_types.add("Interaction")
+            elif f["type"] == "amr": risk_types.add("AMR")
+            elif f["type"] == "alcohol": risk_types.add("ADR")  # Alcohol falls under ADR/Interaction
+            elif f["type"] == "behavior": risk_types.add("Behavior")
+    return risk_types
+
+
+def build_advice_context(profile, state, risk_result, user_age, mode):
+    """Context JSON for ai_advisor from the loaded profile and risk state."""
+    return {
+        "user_mode": mode,
+        "user_profile": {
+            "age": user_age,
+            "diet": profile.get("diet", "Unknown"),
+            "occupation": profile.get("occupation", "Unknown"),
+            "weight": profile.get("weight_kg"),
+        },
+        "current_risk_level": risk_result["risk_level"],
+        "risk_types": list(risk_types_of(risk_result)),
+        "medications": state.drug_ids(),  # simplified
+        "adherence_summary": {
+            "missed_doses_last_3_days": state.total_missed()
+        },
+        "symptom_summary": []  # Placeholder for now
+    }
+
+
+# ──────────────────────────────────────────────
+# Dashboard
+# ──────────────────────────────────────────────
+
+def _fingerprint(user_id, profile, user_age, mode):
+    return (
+        today_iso(),
+        current_seq(user_id),
+        tuple(profile.get(k) for k in ("age", "diet", "occupation", "weight_kg")),
+        user_age,
+        mode,
+        snapshot_version(),
+    )
+
+
+def _build(user_id, profile, user_age, mode, seq):
+    timeline, _ = list_courses(user_id, recent_params(RECENT_DAYS))
+
+    state = get_user_risk_state(user_id)
+    # The home screen has always shown alcohol warnings (POST /risk with
+    # report_alcohol); advice uses /ai/advice's assessment so both agree.
+    risk = state.result(user_age=user_age, report_alcohol=True)
+    advice_risk = state.result(user_age=user_age)
+    advice, _ = get_ai_advice_tagged(build_advice_context(profile, state, advice_risk, user_age, mode))
+
+    return {
+        "user_id": user_id,
+        "timeline": timeline,
+        "count": len(timeline),
+        "insights": behavior_insights_for_courses(timeline),
+        "risk": risk,
+        "advice": advice,
+        "token": seq,
+        "disclaimer": DISCLAIMER,
+    }
+
+
+def get_dashboard(user_id, user_age=None, mode="adult"):
+    """
+    (payload, etag) for the home screen. user_age defaults to the profile's.
+    `token` in the payload is the timeline sync token the data reflects.
+    """
+    profile = load_profile(user_id)
+    if user_age is None:
+        user_age = profile.get("age") or DEFAULT_AGE
+
+    key = (db.DB_PATH, user_id)
+    fingerprint = _fingerprint(user_id, profile, user_age, mode)
+    with _CACHE_LOCK:
+        cached = _CACHE.get(key)
+    if cached is None or cached[0] != fingerprint:
+        cached = (fingerprint, _build(user_id, profile, user_age, mode, fingerprint[1]))
+        with _CACHE_LOCK:
+            _CACHE[key] = cached
+
+    etag = hashlib.sha1(repr((user_id,) + fingerprint).encode()).hexdigest()[:16]
+    return cached[1], etag
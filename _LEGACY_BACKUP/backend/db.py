@@ -21,6 +21,9 @@ DB_PATH = os.path.join(BASE_DIR, "medguard_new.db")
 SCHEMA_PATH = os.path.join(BASE_DIR, "new_schema.sql")
 DATA_PATH = os.path.join(BASE_DIR, "comprehensive_data.sql")
 
+# Rows per statement when a response streams a listing (iter_pages)
+STREAM_PAGE_ROWS = int(os.environ.get("MEDGUARD_STREAM_PAGE_ROWS", "500"))
+
 
 
 def get_connection(db_path=None):
@@ -35,19 +38,29 @@ def init_db(db_path=None):
     """Initialize database from NEW schema file (includes data)."""
     conn = get_connection(db_path)
     try:
-        with open(SCHEMA_PATH, "r") as f:
-            conn.executescript(f.read())
-        
-        # Load comprehensive data on top
-        if os.path.exists(DATA_PATH):
-            with open(DATA_PATH, "r") as f:
+        try:
+            with open(SCHEMA_PATH, "r") as f:
                 conn.executescript(f.read())
-            print("[MEDGUARD] Comprehensive Data loaded.")
-            
-        conn.commit()
-        print("[MEDGUARD] Database initialized successfully.")
-    except sqlite3.IntegrityError as e:
-        print(f"[MEDGUARD] Seed data may already exist: {e}")
+
+            # Load comprehensive data on top
+            if os.path.exists(DATA_PATH):
+                with open(DATA_PATH, "r") as f:
+                    conn.executescript(f.read())
+                print("[MEDGUARD] Comprehensive Data loaded.")
+
+            conn.commit()
+            print("[MEDGUARD] Database initialized successfully.")
+        except sqlite3.IntegrityError as e:
+            print(f"[MEDGUARD] Seed data may already exist: {e}")
+
+        # Delta-sync change tracking (defined once, shared with the startup migration)
+        from timeline import CHANGE_TRACKING_DDL
+        conn.executescript(CHANGE_TRACKING_DDL)
+
+        # Derived full-text index over whatever knowledge data loaded
+        from text_search import rebuild_text_index
+        if not rebuild_text_index(conn):
+            print("[MEDGUARD] SQLite FTS5 not available — full-text search disabled.")
     finally:
         conn.close()
 
@@ -62,6 +75,51 @@ def query(sql, params=(), db_path=None):
         conn.close()
 
 
+def iter_query(sql, params=(), db_path=None, batch_size=500, tuples=False):
+    """
+    Execute a read query and yield rows as they are fetched, `batch_size`
+    at a time, as dicts (or plain tuples with tuples=True). Memory stays
+    bounded by one batch; the connection closes when the generator is
+    exhausted or closed.
+
+    The read stays open until then, and an open read blocks writers, so
+    only use this where rows are consumed right away; responses that
+    stream to a client use iter_pages().
+    """
+    conn = get_connection(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(sql, params)
+        names = [d[0] for d in cursor.description]
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            if tuples:
+                yield from rows
+            else:
+                for row in rows:
+                    yield dict(zip(names, row))
+    finally:
+        conn.close()
+
+
+def iter_pages(fetch_page):
+    """
+    Yield every row of a keyset listing, one page at a time.
+    fetch_page(cursor) runs one short statement and returns (rows,
+    next_cursor), next_cursor None on the last page (first call: None).
+    No statement is open between pages, however slowly they're consumed.
+    """
+    cursor = None
+    while True:
+        rows, cursor = fetch_page(cursor)
+        yield from rows
+        if cursor is None:
+            return
+
+
 def execute(sql, params=(), db_path=None):
     """Execute a write query and return lastrowid."""
     conn = get_connection(db_path)
@@ -0,0 +1,151 @@
+"""
+MEDGUARD — Drug Name Search (Typeahead)
+In-memory prefix trie + trigram index over molecule and brand names.
+
+Built from the same normalized name table the OCR matcher uses, so a
+name that autocompletes here is the name OCR would resolve to.
+"""
+
+from collections import defaultdict
+
+import db
+from ocr_pipeline import load_name_table, normalize_name
+
+# Score bands: exact > whole-name prefix > word prefix > trigram (typo) match
+SCORE_EXACT = 100.0
+SCORE_NAME_PREFIX = 90.0
+SCORE_WORD_PREFIX = 80.0
+SCORE_TRIGRAM_MAX = 70.0
+
+MIN_TRIGRAM_SIMILARITY = 0.3
+
+# Cached per database path, mirroring the OCR name table cache.
+_INDEXES = {}
+
+
+def _trigrams(normalized):
+    """Character trigrams of a padded normalized string."""
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class DrugSearchIndex:
+    """
+    Prefix trie + trigram inverted index over a name table.
+
+    Each trie node stores the entry ids reachable through it, so a prefix
+    lookup is one walk down the trie with no subtree traversal.
+    """
+
+    def __init__(self, entries):
+        self.entries = entries
+        self._trie = {}
+        self._grams = []
+        self._gram_index = defaultdict(set)
+
+        for idx, entry in enumerate(entries):
+            normalized = entry["normalized"]
+            words = normalized.split(" ")
+            # Insert the full name and every word-start suffix ("dolo 650" -> "650")
+            offset = 0
+            for word in words:
+                self._insert(normalized[offset:], idx, is_full=(offset == 0))
+                offset += len(word) + 1
+
+            grams = _trigrams(normalized)
+            self._grams.append(grams)
+            for g in grams:
+                self._gram_index[g].add(idx)
+
+    def _insert(self, key, idx, is_full):
+        node = self._trie
+        for ch in key:
+            node = node.setdefault(ch, {})
+            ids = node.setdefault("$ids", {})
+            # A full-name hit outranks a word-start hit for the same entry
+            ids[idx] = ids.get(idx, False) or is_full
+
+    def _prefix(self, normalized):
+        node = self._trie
+        for ch in normalized:
+            node = node.get(ch)
+            if node is None:
+                return {}
+        return node.get("$ids", {})
+
+    def search(self, text, limit=10):
+        """
+        Rank names matching `text`.
+
+        Returns list of dicts: {name, drug_id, molecule, kind, score, match_type}
+        """
+        normalized = normalize_name(text)
+        if not normalized:
+            return []
+
+        scored = {}
+
+        for idx, is_full in self._prefix(normalized).items():
+            name = self.entries[idx]["normalized"]
+            if name == normalized:
+                score, match_type = SCORE_EXACT, "exact"
+            elif is_full:
+                score, match_type = SCORE_NAME_PREFIX, "prefix"
+            else:
+                score, match_type = SCORE_WORD_PREFIX, "prefix"
+            # Prefer shorter completions within a band
+            score -= min(len(name) - len(normalized), 9) * 0.1
+            scored[idx] = (score, match_type)
+
+        # Typo tolerance: only worth it once the query has a few characters
+        if len(normalized) >= 3:
+            q_grams = _trigrams(normalized)
+            shared = defaultdict(int)
+            for g in q_grams:
+                for idx in self._gram_index.get(g, ()):
+                    shared[idx] += 1
+            for idx, count in shared.items():
+                if idx in scored:
+                    continue
+                similarity = count / (len(q_grams) + len(self._grams[idx]) - count)
+                if similarity >= MIN_TRIGRAM_SIMILARITY:
+                    scored[idx] = (SCORE_TRIGRAM_MAX * similarity, "fuzzy")
+
+        ranked = sorted(scored.items(), key=lambda kv: (-kv[1][0], self.entries[kv[0]]["name"]))
+
+        results = []
+        seen = set()
+        for idx, (score, match_type) in ranked:
+            entry = self.entries[idx]
+            if entry["name"] in seen:
+                continue
+            seen.add(entry["name"])
+            results.append({
+                "name": entry["name"],
+                "drug_id": entry["drug_id"],
+                "molecule": entry["molecule"],
+                "kind": entry["kind"],
+                "score": round(score, 1),
+                "match_type": match_type,
+            })
+            if len(results) >= limit:
+                break
+        return results
+
+
+def get_search_index(refresh=False):
+    """Return the cached search index for the current database."""
+    key = db.DB_PATH
+    if refresh or key not in _INDEXES:
+        _INDEXES[key] = DrugSearchIndex(load_name_table(refresh=refresh))
+    return _INDEXES[key]
+
+
+def invalidate_search_index():
+    """Drop cached indexes (call after editing drug_master / brand_mapping)."""
+    _INDEXES.clear()
+
+
+def search_drug_names(text, limit=10):
+    """Typeahead search over molecules and brand names."""
+    return get_search_index().search(text, limit=limit)
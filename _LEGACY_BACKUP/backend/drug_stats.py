@@ -0,0 +1,209 @@
+"""
+MEDGUARD — Per-Drug Statistics
+Pharmacovigilance counters per drug, maintained as events arrive.
+
+drug_stats holds users, courses, missed/taken doses and courses with
+symptom reports for every drug; drug_symptom_stats counts reported
+symptom tokens per drug, with the adr_master entry symptom_matcher.py
+finds by exact name (fuzzy guesses are not stored). Course and dose
+counters are kept by triggers on user_medicine_timeline (so every
+writer updates them); symptom reports go through record_symptoms(),
+which diffs the old and new text. A report is one primary-key read
+instead of a timeline scan.
+
+Counters cover every course ever recorded: archiving a course to
+user_medicine_history doesn't remove it from the statistics. The
+startup migration installs the triggers and backfills once; to
+recompute from scratch:
+
+    python drug_stats.py --rebuild
+"""
+
+import argparse
+
+import db
+from db import get_connection
+from queries import iter_run, register, run, run_many, run_one, run_write, transaction
+from symptom_matcher import symptom_tokens, match_symptom
+
+# Applied by the startup migration, after user_medicine_timeline has the
+# taken_doses / symptoms columns (new_schema.sql's timeline lacks them).
+DRUG_STATS_DDL = """
+CREATE TABLE IF NOT EXISTS drug_stats (
+    drug_id TEXT PRIMARY KEY,
+    users INTEGER NOT NULL DEFAULT 0,
+    courses INTEGER NOT NULL DEFAULT 0,
+    missed_doses INTEGER NOT NULL DEFAULT 0,
+    taken_doses INTEGER NOT NULL DEFAULT 0,
+    symptom_reports INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS drug_user_stats (
+    drug_id TEXT,
+    user_id TEXT,
+    courses INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (drug_id, user_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS drug_symptom_stats (
+    drug_id TEXT,
+    symptom TEXT,
+    adr_id TEXT,
+    reports INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (drug_id, symptom)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_timeline_insert_stats
+AFTER INSERT ON user_medicine_timeline
+BEGIN
+    INSERT INTO drug_stats (drug_id, users, courses, missed_doses, taken_doses)
+        VALUES (
+            NEW.drug_id,
+            NOT EXISTS (SELECT 1 FROM drug_user_stats WHERE drug_id = NEW.drug_id AND user_id = NEW.user_id),
+            1, COALESCE(NEW.missed_doses, 0), COALESCE(NEW.taken_doses, 0)
+        )
+        ON CONFLICT (drug_id) DO UPDATE SET
+            users = users + excluded.users,
+            courses = courses + 1,
+            missed_doses = missed_doses + excluded.missed_doses,
+            taken_doses = taken_doses + excluded.taken_doses;
+    INSERT INTO drug_user_stats (drug_id, user_id, courses) VALUES (NEW.drug_id, NEW.user_id, 1)
+        ON CONFLICT (drug_id, user_id) DO UPDATE SET courses = courses + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_timeline_doses_stats
+AFTER UPDATE OF missed_doses, taken_doses ON user_medicine_timeline
+WHEN NEW.missed_doses IS NOT OLD.missed_doses OR NEW.taken_doses IS NOT OLD.taken_doses
+BEGIN
+    UPDATE drug_stats SET
+        missed_doses = missed_doses + COALESCE(NEW.missed_doses, 0) - COALESCE(OLD.missed_doses, 0),
+        taken_doses = taken_doses + COALESCE(NEW.taken_doses, 0) - COALESCE(OLD.taken_doses, 0)
+    WHERE drug_id = NEW.drug_id;
+END;
+"""
+
+
+# ──────────────────────────────────────────────
+# Symptom Reports
+# ──────────────────────────────────────────────
+
+def _apply_symptoms(drug_id, old_text, new_text, db_path=None):
+    """
+    Move drug_id's symptom counters from one report text to another
+    (within the caller's transaction()).
+    """
+    old, new = symptom_tokens(old_text), symptom_tokens(new_text)
+
+    added = [(drug_id, t, match_symptom(t)) for t in new if t not in old]
+    removed = [(drug_id, t) for t in old if t not in new]
+    run_many("drug_stats.symptom_added", added, db_path)
+    run_many("drug_stats.symptom_removed", removed, db_path)
+    delta = bool(new) - bool(old)
+    if delta:
+        run_write("drug_stats.symptom_reports", (delta, drug_id), db_path)
+
+
+def record_symptoms(timeline_id, symptoms):
+    """
+    Save a course's symptom report and update its drug's symptom counters.
+    Returns the course's {user_id, drug_id, seq} (seq: the user's change
+    sequence as of this write), or None if it doesn't exist.
+    """
+    with transaction(immediate=True):  # read-modify-write of the old report
+        row = run_one("timeline.symptoms", (timeline_id,))
+        if row is None:
+            return None
+        run_write("timeline.set_symptoms", (symptoms, timeline_id))
+        _apply_symptoms(row["drug_id"], row["symptoms"], symptoms)
+        seq = run_one("timeline.seq", (row["user_id"],))
+    return {"user_id": row["user_id"], "drug_id": row["drug_id"], "seq": seq["seq"]}
+
+
+# ──────────────────────────────────────────────
+# Reports
+# ──────────────────────────────────────────────
+
+def get_drug_stats(drug_id):
+    """Counters and reported symptoms for one drug (None if it has no courses)."""
+    stats = run_one("drug_stats.by_drug", (drug_id,))
+    if stats is None:
+        return None
+    doses = stats["missed_doses"] + stats["taken_doses"]
+    stats["adherence_rate"] = round(stats["taken_doses"] / doses, 3) if doses else None
+
+    stats["symptoms"] = run("drug_stats.symptoms", (drug_id,))
+    return stats
+
+
+# ──────────────────────────────────────────────
+# Install / Rebuild
+# ──────────────────────────────────────────────
+
+_COURSES = """
+    SELECT drug_id, user_id, missed_doses, taken_doses, symptoms FROM user_medicine_timeline
+    UNION ALL
+    SELECT drug_id, user_id, missed_doses, taken_doses, symptoms FROM user_medicine_history
+"""
+
+
+_BACKFILL_USERS = register("drug_stats.backfill_users", f"""
+    INSERT INTO drug_user_stats (drug_id, user_id, courses)
+    SELECT drug_id, user_id, COUNT(*) FROM ({_COURSES}) GROUP BY drug_id, user_id
+""")
+_BACKFILL_DRUGS = register("drug_stats.backfill_drugs", f"""
+    INSERT INTO drug_stats (drug_id, users, courses, missed_doses, taken_doses, symptom_reports)
+    SELECT drug_id, COUNT(DISTINCT user_id), COUNT(*),
+           IFNULL(SUM(missed_doses), 0), IFNULL(SUM(taken_doses), 0), 0
+    FROM ({_COURSES}) GROUP BY drug_id
+""")
+_REPORTS = register(
+    "drug_stats.reports", f"SELECT drug_id, symptoms FROM ({_COURSES}) WHERE symptoms IS NOT NULL"
+)
+
+
+def rebuild_drug_stats(db_path=None):
+    """Recompute every counter from the timeline and history tables."""
+    with transaction(db_path, immediate=True):
+        run_write("drug_stats.clear", db_path=db_path)
+        run_write("drug_stats.clear_users", db_path=db_path)
+        run_write("drug_stats.clear_symptoms", db_path=db_path)
+        run_write(_BACKFILL_USERS, db_path=db_path)
+        run_write(_BACKFILL_DRUGS, db_path=db_path)
+        # symptom_reports and drug_symptom_stats: as if every report just arrived
+        for row in iter_run(_REPORTS, db_path=db_path, batch_size=1000):
+            _apply_symptoms(row["drug_id"], None, row["symptoms"], db_path)
+
+
+def install_drug_stats(db_path=None):
+    """
+    Create the statistics tables and triggers if missing, backfilling them
+    from existing courses. Returns True if they were created.
+    """
+    exists = run_one("schema.object", ("table", "drug_stats"), db_path)
+    conn = get_connection(db_path)
+    try:
+        conn.executescript(DRUG_STATS_DDL)
+    finally:
+        conn.close()
+    if exists:
+        return False
+    rebuild_drug_stats(db_path)
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MEDGUARD per-drug statistics")
+    parser.add_argument("--rebuild", action="store_true", help="recompute every counter from scratch")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        conn = get_connection()
+        try:
+            conn.executescript(DRUG_STATS_DDL)
+        finally:
+            conn.close()
+        rebuild_drug_stats()
+        n = run_one("drug_stats.count")["n"]
+        print(f"[MEDGUARD] Rebuilt statistics for {n} drugs ({db.DB_PATH}).")
+    else:
+        parser.print_help()
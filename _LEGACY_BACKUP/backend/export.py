@@ -0,0 +1,305 @@
+"""
+MEDGUARD — Analytics Export
+Streams timelines, dose events, profiles and computed risk flags out of
+the production database into columnar files for offline analysis.
+
+    python export.py --out exports/ [--format auto|parquet|csv] [--full]
+                     [--datasets timeline,dose_events,symptom_events]
+                     [--chunk-rows 50000]
+
+Each dataset is read in keyset chunks (rowid > last ORDER BY rowid
+LIMIT n), each its own short read, so writers are never held up by an
+export and memory is bounded by the chunk size. Chunks go to one
+Parquet file per run (one row group per chunk) when pyarrow is
+installed, otherwise to CSV. Runs are incremental: the last exported
+rowid per dataset is kept in <out>/export_state.json and the next run
+starts after it (--full starts over).
+
+Rows are exported as appended:
+  timeline        new courses (later changes: dose_events, symptom_events)
+  dose_events     every taken/missed dose logged, from a timeline trigger
+  symptom_events  every symptom report (the course's full symptom text
+                  after the change), from a timeline trigger
+  profiles        profile saves (a re-save is a new row: latest wins)
+  risk_flags      one row per flag of each stored risk result
+"""
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import time
+
+import db
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+DEFAULT_OUT = os.environ.get(
+    "MEDGUARD_EXPORT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "exports"),
+)
+
+CHUNK_ROWS = 50000
+
+STATE_FILE = "export_state.json"
+
+# Applied by the startup migration, after user_medicine_timeline has the
+# taken_doses / symptoms columns. Turns dose counter and symptom updates
+# into append-only logs.
+DOSE_EVENTS_DDL = """
+CREATE TABLE IF NOT EXISTS dose_events (
+    id INTEGER PRIMARY KEY,
+    timeline_id INTEGER,
+    user_id TEXT,
+    drug_id TEXT,
+    status TEXT,
+    doses INTEGER,
+    logged_at TEXT
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_timeline_dose_events
+AFTER UPDATE OF missed_doses, taken_doses ON user_medicine_timeline
+WHEN NEW.missed_doses IS NOT OLD.missed_doses OR NEW.taken_doses IS NOT OLD.taken_doses
+BEGIN
+    INSERT INTO dose_events (timeline_id, user_id, drug_id, status, doses, logged_at)
+        SELECT NEW.id, NEW.user_id, NEW.drug_id, 'taken',
+               COALESCE(NEW.taken_doses, 0) - COALESCE(OLD.taken_doses, 0),
+               strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime')
+        WHERE NEW.taken_doses IS NOT OLD.taken_doses;
+    INSERT INTO dose_events (timeline_id, user_id, drug_id, status, doses, logged_at)
+        SELECT NEW.id, NEW.user_id, NEW.drug_id, 'missed',
+               COALESCE(NEW.missed_doses, 0) - COALESCE(OLD.missed_doses, 0),
+               strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime')
+        WHERE NEW.missed_doses IS NOT OLD.missed_doses;
+END;
+
+CREATE TABLE IF NOT EXISTS symptom_events (
+    id INTEGER PRIMARY KEY,
+    timeline_id INTEGER,
+    user_id TEXT,
+    drug_id TEXT,
+    symptoms TEXT,
+    logged_at TEXT
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_timeline_symptom_events
+AFTER UPDATE OF symptoms ON user_medicine_timeline
+WHEN NEW.symptoms IS NOT OLD.symptoms
+BEGIN
+    INSERT INTO symptom_events (timeline_id, user_id, drug_id, symptoms, logged_at)
+        VALUES (NEW.id, NEW.user_id, NEW.drug_id, NEW.symptoms,
+                strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime'));
+END;
+"""
+
+RISK_FLAG_COLUMNS = (
+    "user_id", "updated_at", "risk_level", "flag_type", "flag_level",
+    "drug", "drug_b", "symptom", "severity", "message",
+)
+
+
+# ──────────────────────────────────────────────
+# Datasets
+# ──────────────────────────────────────────────
+
+def _risk_flag_rows(row):
+    """One stored user_risk_state row → one row per flag (or one blank)."""
+    user_id, risk_level, risk_json, updated_at = row
+    flags = json.loads(risk_json or "{}").get("flags") or [{}]
+    return [
+        (user_id, updated_at, risk_level, f.get("type"), f.get("level"),
+         f.get("drug") or f.get("drug_a"), f.get("drug_b"), f.get("symptom"),
+         f.get("severity"), f.get("message"))
+        for f in flags
+    ]
+
+
+# name → (table, columns read (None: all), row expander, expanded columns)
+DATASETS = {
+    "timeline": ("user_medicine_timeline", None, None, None),
+    "dose_events": ("dose_events", None, None, None),
+    "symptom_events": ("symptom_events", None, None, None),
+    "profiles": ("user_profile", None, None, None),
+    "risk_flags": ("user_risk_state", "user_id, risk_level, risk_json, updated_at",
+                   _risk_flag_rows, RISK_FLAG_COLUMNS),
+}
+
+
+def iter_chunks(conn, table, columns=None, after=0, chunk_rows=CHUNK_ROWS):
+    """
+    (column names, rows, last rowid) per chunk of `table` with rowid >
+    `after`, in rowid order. Each chunk is a separate statement.
+    """
+    sql = f"SELECT rowid, {columns or '*'} FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?"
+    while True:
+        cursor = conn.execute(sql, (after, chunk_rows))
+        names = [d[0] for d in cursor.description[1:]]
+        rows = []
+        for row in cursor:
+            after = row[0]
+            rows.append(row[1:])
+        if not rows:
+            return
+        yield names, rows, after
+        if len(rows) < chunk_rows:
+            return
+
+
+# ──────────────────────────────────────────────
+# Writers
+# ──────────────────────────────────────────────
+
+class _CSVWriter:
+    extension = "csv"
+
+    def __init__(self, path):
+        self.file = open(path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.header = False
+
+    def write(self, names, rows):
+        if not self.header:
+            self.writer.writerow(names)
+            self.header = True
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class _ParquetWriter:
+    extension = "parquet"
+
+    def __init__(self, path):
+        self.path = path
+        self.writer = None
+
+    def write(self, names, rows):
+        columns = list(zip(*rows))
+        if self.writer is None:
+            arrays = [pyarrow.array(c) for c in columns]
+            # all-NULL in the first chunk: keep the column, as text
+            schema = pyarrow.schema([
+                (n, pyarrow.string() if pyarrow.types.is_null(a.type) else a.type)
+                for n, a in zip(names, arrays)
+            ])
+            self.writer = pyarrow.parquet.ParquetWriter(self.path, schema)
+        schema = self.writer.schema
+        table = pyarrow.Table.from_arrays(
+            [pyarrow.array(c, type=field.type) for c, field in zip(columns, schema)], schema=schema
+        )
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def _writer_class(fmt):
+    if fmt == "parquet" and pyarrow is None:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    if fmt == "parquet" or (fmt == "auto" and pyarrow is not None):
+        return _ParquetWriter
+    return _CSVWriter
+
+
+# ──────────────────────────────────────────────
+# Export
+# ──────────────────────────────────────────────
+
+def _load_state(out_dir):
+    path = os.path.join(out_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_state(out_dir, state):
+    path = os.path.join(out_dir, STATE_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def export_dataset(conn, name, out_dir, after=0, fmt="auto", chunk_rows=CHUNK_ROWS):
+    """
+    Export rows of dataset `name` after rowid `after` to one new file.
+    Returns (rows written, last rowid, path or None if nothing new).
+    """
+    table, columns, expand, expanded = DATASETS[name]
+    writer_class = _writer_class(fmt)
+    os.makedirs(os.path.join(out_dir, name), exist_ok=True)
+    tmp = os.path.join(out_dir, name, f".{name}-{after}.tmp")
+
+    writer, written, last = None, 0, after
+    try:
+        for names, rows, last in iter_chunks(conn, table, columns, after, chunk_rows):
+            if expand is not None:
+                names = list(expanded)
+                rows = [out for row in rows for out in expand(row)]
+            if writer is None:
+                writer = writer_class(tmp)
+            writer.write(names, rows)
+            written += len(rows)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if writer is None:
+        return 0, after, None
+    path = os.path.join(out_dir, name, f"{name}-{after + 1}-{last}.{writer_class.extension}")
+    os.replace(tmp, path)
+    return written, last, path
+
+
+def export_all(out_dir=DEFAULT_OUT, datasets=None, fmt="auto", full=False,
+               chunk_rows=CHUNK_ROWS, db_path=None):
+    """
+    Incremental export of `datasets` (default: all) into `out_dir`.
+    Returns {dataset: {"rows", "last_rowid", "path"}}.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    state = {} if full else _load_state(out_dir)
+
+    # Read-only: an export can never write to the production database
+    conn = sqlite3.connect(f"file:{db_path or db.DB_PATH}?mode=ro", uri=True)
+    try:
+        existing = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        results = {}
+        for name in datasets or DATASETS:
+            if DATASETS[name][0] not in existing:
+                continue
+            rows, last, path = export_dataset(conn, name, out_dir, state.get(name, 0), fmt, chunk_rows)
+            state[name] = last
+            _save_state(out_dir, state)
+            results[name] = {"rows": rows, "last_rowid": last, "path": path}
+    finally:
+        conn.close()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MEDGUARD analytics export")
+    parser.add_argument("--out", default=DEFAULT_OUT)
+    parser.add_argument("--format", choices=("auto", "parquet", "csv"), default="auto")
+    parser.add_argument("--full", action="store_true", help="ignore export_state.json and export everything")
+    parser.add_argument("--datasets", default=",".join(DATASETS), help="comma-separated subset of: " + ", ".join(DATASETS))
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    names = [n.strip() for n in args.datasets.split(",") if n.strip()]
+    unknown = [n for n in names if n not in DATASETS]
+    if unknown:
+        parser.error(f"unknown datasets: {', '.join(unknown)}")
+
+    started = time.time()
+    for name, r in export_all(args.out, names, args.format, args.full, max(1, args.chunk_rows)).items():
+        print(f"[MEDGUARD] {name}: {r['rows']} rows up to rowid {r['last_rowid']}"
+              + (f" -> {r['path']}" if r["path"] else " (nothing new)"))
+    print(f"[MEDGUARD] Export finished in {time.time() - started:.1f}s ({db.DB_PATH}).")
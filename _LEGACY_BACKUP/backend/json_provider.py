@@ -0,0 +1,98 @@
+"""
+MEDGUARD — JSON Serialization
+Flask JSON provider that uses orjson when installed, stdlib json otherwise.
+
+Besides plain dicts/lists it serializes, through the default hook (each
+converted to a plain dict first):
+  - sqlite3.Row (as a column → value object)
+  - dataclasses
+  - records exposing to_dict() (e.g. risk flags)
+
+Output is always compact; keys stay sorted so responses are byte-for-byte
+stable across both backends apart from non-ASCII escaping.
+
+stream_json() sends a large list (e.g. a db.iter_pages() generator) as it
+is produced instead of building the whole document first.
+"""
+
+import sqlite3
+from itertools import islice
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback
+    orjson = None
+
+
+def _to_builtin(o):
+    """Convert MEDGUARD row/record types to plain dicts, or None if unknown."""
+    if isinstance(o, sqlite3.Row):
+        return dict(o)
+    to_dict = getattr(o, "to_dict", None)
+    if to_dict is not None:
+        return to_dict()
+    return None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Drop-in replacement for Flask's provider with an orjson fast path."""
+
+    # Never take the pretty-print path, even under debug=True.
+    compact = True
+
+    @classmethod
+    def _fallback_default(cls, o):
+        converted = _to_builtin(o)
+        if converted is not None:
+            return converted
+        # dates, decimals, dataclasses, UUIDs … exactly as Flask does
+        return DefaultJSONProvider.default(o)
+
+    def _orjson_options(self):
+        # Datetimes go through Flask's default so they keep the HTTP-date format
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            kwargs.setdefault("default", self._fallback_default)
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self._fallback_default, option=self._orjson_options()).decode()
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if orjson is None:
+            body = self.dumps(obj, separators=(",", ":")) + "\n"
+        else:
+            body = orjson.dumps(obj, default=self._fallback_default, option=self._orjson_options()) + b"\n"
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def stream_json(app, key, items, tail=None, batch_size=200):
+    """
+    Streamed response for {key: [*items], **tail(count)}. Items are
+    serialized `batch_size` at a time as they arrive; tail (called with
+    the item count once the list is done) supplies the remaining fields,
+    so "count"-style fields come after the list.
+    """
+    def dumps(obj):
+        return app.json.dumps(obj, separators=(",", ":"))
+
+    def generate():
+        yield "{" + dumps(key) + ":["
+        items_iter = iter(items)
+        count = 0
+        while True:
+            batch = list(islice(items_iter, batch_size))
+            if not batch:
+                break
+            yield ("," if count else "") + dumps(batch)[1:-1]
+            count += len(batch)
+        fields = dumps(tail(count))[1:-1] if tail is not None else ""
+        yield "]" + ("," + fields if fields else "") + "}\n"
+
+    return app.response_class(generate(), mimetype=app.json.mimetype)
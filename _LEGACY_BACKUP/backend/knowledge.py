@@ -0,0 +1,36 @@
+"""
+MEDGUARD — Knowledge Snapshot
+Process-wide, read-only caches derived from the knowledge tables.
+
+load_snapshot() warms every cache in one go. The production launcher
+calls it in the master process before forking so workers share the
+pages copy-on-write, and again on SIGHUP to pick up knowledge edits.
+"""
+
+from advice_table import load_advice_table
+from drug_search import get_search_index
+from ocr_corrections import load_corrections
+from ocr_pipeline import load_name_table
+from symptom_matcher import load_symptom_index
+from text_search import refresh_text_index
+
+# Bumped on every (re)load so dependent caches can detect stale entries.
+_VERSION = 0
+
+
+def load_snapshot():
+    """(Re)load all knowledge-derived caches. Returns the new version."""
+    global _VERSION
+    load_name_table(refresh=True)
+    get_search_index(refresh=True)
+    load_advice_table()
+    load_corrections()
+    load_symptom_index(refresh=True)
+    refresh_text_index()
+    _VERSION += 1
+    return _VERSION
+
+
+def snapshot_version():
+    """Current knowledge snapshot version (0 until first load)."""
+    return _VERSION
@@ -0,0 +1,359 @@
+"""
+MEDGUARD — Local LLM Advice Backend
+Plugs a real (local) language model in behind ai_advisor.get_ai_advice().
+
+    MEDGUARD_LLM_BACKEND=openai            enable (default: rules only)
+    MEDGUARD_LLM_URL=http://127.0.0.1:8080  OpenAI-compatible server
+    MEDGUARD_LLM_MODEL=local-model
+    MEDGUARD_LLM_TIMEOUT=2.0               seconds before falling back
+
+Requests are normalized (risk level, sorted risk types, mode, profile
+buckets ...) and cached on that normalized form, so identical contexts
+never re-infer. Cache misses are micro-batched: concurrent requests are
+collected for a few milliseconds and sent to the model as one batch.
+If the model is slow, down or returns unusable output, the rule-based
+advice is returned instead. Latency and hit/fallback counters are kept
+for GET /ai/metrics.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+import urllib.request
+from collections import OrderedDict, deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+# Advice fields the model writes; everything else comes from the rules.
+MODEL_FIELDS = ("assistant_message", "why_this_happened", "what_to_do_now")
+
+SYSTEM_PROMPT = (
+    "You are MED GUARD, a medication-safety assistant. You never diagnose, "
+    "prescribe or change doses. Given the user context as JSON, reply with "
+    "ONLY a JSON object with keys: assistant_message (one or two calm, plain "
+    "sentences), why_this_happened (list of short strings), what_to_do_now "
+    "(list of short strings). Use very simple words when user_mode is senior."
+)
+
+
+# ──────────────────────────────────────────────
+# Context Normalization
+# ──────────────────────────────────────────────
+
+def _age_bucket(age):
+    if not isinstance(age, (int, float)):
+        return "unknown"
+    if age >= 65:
+        return "senior"
+    return "adult" if age >= 18 else "minor"
+
+
+def normalize_context(context):
+    """
+    The part of an advice context the model is allowed to see. It is also
+    the cache key, so two contexts that normalize equal share one answer.
+    """
+    profile = context.get("user_profile") or {}
+    adherence = context.get("adherence_summary") or {}
+    return {
+        "user_mode": context.get("user_mode", "adult"),
+        "current_risk_level": context.get("current_risk_level", "green"),
+        "risk_types": sorted(set(context.get("risk_types") or [])),
+        "medications": sorted(set(context.get("medications") or [])),
+        "missed_doses_last_3_days": adherence.get("missed_doses_last_3_days", 0),
+        "age_group": _age_bucket(profile.get("age")),
+        "occupation": profile.get("occupation", "Unknown"),
+        "diet": profile.get("diet", "Unknown"),
+    }
+
+
+def context_key(context):
+    return json.dumps(normalize_context(context), sort_keys=True)
+
+
+# ──────────────────────────────────────────────
+# Backends
+# ──────────────────────────────────────────────
+
+class AdviceBackend:
+    """A model that turns normalized contexts into advice fields."""
+
+    name = "base"
+
+    def generate_batch(self, contexts):
+        """
+        contexts: list of normalized context dicts.
+        Returns one dict per context with MODEL_FIELDS (or None if unusable).
+        """
+        raise NotImplementedError
+
+
+def parse_model_output(text):
+    """Extract MODEL_FIELDS from model text; None if it isn't valid advice."""
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        return None
+    try:
+        data = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("assistant_message"), str):
+        return None
+    result = {"assistant_message": data["assistant_message"].strip()}
+    for field in ("why_this_happened", "what_to_do_now"):
+        items = data.get(field) or []
+        if isinstance(items, str):
+            items = [items]
+        result[field] = [str(item) for item in items]
+    return result if result["assistant_message"] else None
+
+
+class OpenAICompatibleBackend(AdviceBackend):
+    """
+    Any server speaking the OpenAI /v1/completions API (llama.cpp server,
+    vLLM, Ollama's compatibility layer ...). A batch is a single request
+    with a list of prompts.
+    """
+
+    name = "openai"
+
+    def __init__(self, base_url, model, timeout=10.0, max_tokens=256):
+        self.url = base_url.rstrip("/") + "/v1/completions"
+        self.model = model
+        self.timeout = timeout
+        self.max_tokens = max_tokens
+
+    @staticmethod
+    def build_prompt(context):
+        return f"{SYSTEM_PROMPT}\n\nContext:\n{json.dumps(context, sort_keys=True)}\n\nJSON:\n"
+
+    def generate_batch(self, contexts):
+        payload = json.dumps({
+            "model": self.model,
+            "prompt": [self.build_prompt(c) for c in contexts],
+            "max_tokens": self.max_tokens,
+            "temperature": 0,
+        }).encode()
+        req = urllib.request.Request(self.url, data=payload, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            body = json.loads(resp.read())
+
+        results = [None] * len(contexts)
+        for choice in body.get("choices", []):
+            index = choice.get("index", 0)
+            if 0 <= index < len(results):
+                results[index] = parse_model_output(choice.get("text", ""))
+        return results
+
+
+# ──────────────────────────────────────────────
+# Metrics
+# ──────────────────────────────────────────────
+
+class AdviceMetrics:
+    """Counters plus recent latency samples (milliseconds)."""
+
+    def __init__(self, samples=1024):
+        self.lock = threading.Lock()
+        self.counters = {
+            "requests": 0, "cache_hits": 0, "model_answers": 0,
+            "timeouts": 0, "errors": 0, "invalid_outputs": 0, "batches": 0,
+        }
+        self.request_ms = deque(maxlen=samples)
+        self.batch_ms = deque(maxlen=samples)
+        self.batch_sizes = deque(maxlen=samples)
+
+    def incr(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+
+    def observe_request(self, ms):
+        with self.lock:
+            self.request_ms.append(ms)
+
+    def observe_batch(self, ms, size):
+        with self.lock:
+            self.counters["batches"] += 1
+            self.batch_ms.append(ms)
+            self.batch_sizes.append(size)
+
+    @staticmethod
+    def _percentiles(samples):
+        if not samples:
+            return {"p50": None, "p95": None, "max": None}
+        ordered = sorted(samples)
+        pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 2)
+        return {"p50": pick(0.50), "p95": pick(0.95), "max": round(ordered[-1], 2)}
+
+    def snapshot(self):
+        with self.lock:
+            sizes = list(self.batch_sizes)
+            return {
+                **self.counters,
+                "request_latency_ms": self._percentiles(self.request_ms),
+                "batch_latency_ms": self._percentiles(self.batch_ms),
+                "avg_batch_size": round(sum(sizes) / len(sizes), 2) if sizes else None,
+            }
+
+
+# ──────────────────────────────────────────────
+# Client: cache + micro-batching + fallback
+# ──────────────────────────────────────────────
+
+class AdviceClient:
+    """
+    get_ai_advice() front end for a model backend.
+
+    fallback(context) must return complete rule-based advice; model answers
+    are layered on top of it, so the output contract never changes.
+    """
+
+    def __init__(self, backend, fallback, timeout=2.0, cache_size=4096, max_batch=16, max_wait=0.01):
+        self.backend = backend
+        self.fallback = fallback
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.metrics = AdviceMetrics()
+        self.cache = OrderedDict()   # key -> model fields (LRU)
+        self.inflight = {}           # key -> Future shared by identical requests
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self._pid = None
+
+    # ── public ──
+
+    def advise(self, context):
+        started = time.perf_counter()
+        self.metrics.incr("requests")
+        advice = self.fallback(context)
+
+        normalized = normalize_context(context)
+        key = json.dumps(normalized, sort_keys=True)
+        fields = self._cached(key)
+        if fields is not None:
+            self.metrics.incr("cache_hits")
+        else:
+            try:
+                fields = self._submit(key, normalized).result(timeout=self.timeout)
+            except FutureTimeout:
+                self.metrics.incr("timeouts")
+            except Exception:
+                self.metrics.incr("errors")
+
+        if fields is not None:
+            advice = self._merge(advice, fields)
+        self.metrics.observe_request((time.perf_counter() - started) * 1000)
+        return advice
+
+    def advise_many(self, contexts):
+        """Bulk advice; misses are submitted together so they share batches."""
+        for context in contexts:
+            normalized = normalize_context(context)
+            key = json.dumps(normalized, sort_keys=True)
+            if self._cached(key) is None:
+                self._submit(key, normalized)
+        return [self.advise(context) for context in contexts]
+
+    # ── internals ──
+
+    @staticmethod
+    def _merge(advice, fields):
+        advice = dict(advice)
+        advice.update({k: list(v) if isinstance(v, list) else v for k, v in fields.items()})
+        level = advice["one_line_dashboard_summary"].split(" - ", 1)[0]
+        advice["one_line_dashboard_summary"] = f"{level} - {fields['assistant_message'].split('.')[0]}."
+        return advice
+
+    def _cached(self, key):
+        with self.lock:
+            fields = self.cache.get(key)
+            if fields is not None:
+                self.cache.move_to_end(key)
+            return fields
+
+    def _store(self, key, fields):
+        with self.lock:
+            self.cache[key] = fields
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def _submit(self, key, normalized):
+        with self.lock:
+            if self._pid != os.getpid():
+                # Threads don't survive fork(): start one per process
+                self._pid = os.getpid()
+                self.inflight.clear()
+                threading.Thread(target=self._run, name="advice-batcher", daemon=True).start()
+            future = self.inflight.get(key)
+            if future is None:
+                future = self.inflight[key] = Future()
+                self.queue.put((key, normalized))
+            return future
+
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            started = time.perf_counter()
+            try:
+                results = self.backend.generate_batch([normalized for _, normalized in batch])
+                if len(results) != len(batch):
+                    raise ValueError(f"backend returned {len(results)} results for {len(batch)} prompts")
+                error = None
+            except Exception as e:
+                results, error = [None] * len(batch), e
+            self.metrics.observe_batch((time.perf_counter() - started) * 1000, len(batch))
+
+            for (key, _), fields in zip(batch, results):
+                with self.lock:
+                    future = self.inflight.pop(key, None)
+                if fields is not None:
+                    self.metrics.incr("model_answers")
+                    self._store(key, fields)
+                elif error is None:
+                    self.metrics.incr("invalid_outputs")
+                if future is None:
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(fields)
+
+
+def client_from_env(fallback):
+    """AdviceClient configured from MEDGUARD_LLM_* variables, or None (rules only)."""
+    kind = os.environ.get("MEDGUARD_LLM_BACKEND", "rules").lower()
+    if kind in ("", "rules", "none"):
+        return None
+    if kind != "openai":
+        raise ValueError(f"Unknown MEDGUARD_LLM_BACKEND: {kind}")
+
+    timeout = float(os.environ.get("MEDGUARD_LLM_TIMEOUT", "2.0"))
+    backend = OpenAICompatibleBackend(
+        os.environ.get("MEDGUARD_LLM_URL", "http://127.0.0.1:8080"),
+        os.environ.get("MEDGUARD_LLM_MODEL", "local-model"),
+        # the batch may outlive one caller's wait; its answer still gets cached
+        timeout=max(timeout * 5, 10.0),
+    )
+    return AdviceClient(
+        backend, fallback, timeout=timeout,
+        cache_size=int(os.environ.get("MEDGUARD_LLM_CACHE_SIZE", "4096")),
+        max_batch=int(os.environ.get("MEDGUARD_LLM_MAX_BATCH", "16")),
+        max_wait=float(os.environ.get("MEDGUARD_LLM_BATCH_WAIT_MS", "10")) / 1000,
+    )
@@ -140,9 +140,41 @@ CREATE TABLE IF NOT EXISTS user_medicine_timeline (
     end_date TEXT,
     missed_doses INTEGER DEFAULT 0,
     confirmed INTEGER DEFAULT 0,
+    change_seq INTEGER DEFAULT 0,
     FOREIGN KEY (drug_id) REFERENCES drug_master(drug_id)
 );
 
+/* Active / windowed course lookups: user_id = ? AND end_date >= ? AND start_date <= ? */
+CREATE INDEX IF NOT EXISTS idx_timeline_user_end_start
+    ON user_medicine_timeline (user_id, end_date, start_date);
+
+
+/* Timeline change tracking (delta sync): tables and triggers are defined
+   once in timeline.CHANGE_TRACKING_DDL and applied by db.init_db(). */
+
+
+/* =======================================================================
+   APP-SPECIFIC TABLE: USER MEDICINE HISTORY (cold)
+   Completed courses past the retention window, moved out of the
+   timeline by the archival job (timeline.py).
+   ======================================================================= */
+
+CREATE TABLE IF NOT EXISTS user_medicine_history (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT,
+    drug_id TEXT,
+    start_date TEXT,
+    end_date TEXT,
+    missed_doses INTEGER DEFAULT 0,
+    taken_doses INTEGER DEFAULT 0,
+    symptoms TEXT,
+    confirmed INTEGER DEFAULT 0,
+    archived_at TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_history_user_end
+    ON user_medicine_history (user_id, end_date);
+
 
 /* =======================================================================
    APP-SPECIFIC TABLE: USER PROFILE
@@ -163,6 +195,44 @@ CREATE TABLE IF NOT EXISTS user_profile (
 );
 
 
+/* =======================================================================
+   APP-SPECIFIC TABLE: PRECOMPUTED USER RISK STATE
+   Written by the background risk worker after every timeline/profile
+   change; read endpoints fetch from here instead of recomputing.
+   ======================================================================= */
+
+CREATE TABLE IF NOT EXISTS user_risk_state (
+    user_id TEXT PRIMARY KEY,
+    risk_level TEXT,
+    risk_json TEXT,
+    insights_json TEXT,
+    updated_at TEXT
+);
+
+
+/* =======================================================================
+   APP-SPECIFIC TABLE: LEARNED OCR CORRECTIONS
+   Which drug users confirmed for a (normalized) OCR-extracted name.
+   Compiled into the matcher's correction map (ocr_corrections.py).
+   ======================================================================= */
+
+CREATE TABLE IF NOT EXISTS ocr_corrections (
+    normalized TEXT,
+    drug_id TEXT,
+    confirmations INTEGER NOT NULL DEFAULT 0,   -- distinct users
+    last_confirmed TEXT,
+    PRIMARY KEY (normalized, drug_id)
+);
+
+/* Who confirmed each (name, drug): confirmations count users, not submits */
+CREATE TABLE IF NOT EXISTS ocr_correction_users (
+    normalized TEXT,
+    drug_id TEXT,
+    user_id TEXT,
+    PRIMARY KEY (normalized, drug_id, user_id)
+);
+
+
 /* =======================================================================
    INSERT TEST DATA
    ======================================================================= */
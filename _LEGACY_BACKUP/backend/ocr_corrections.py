@@ -0,0 +1,158 @@
+"""
+MEDGUARD — Learned OCR Corrections
+Turns /ocr/confirm choices into a correction map for the OCR matcher.
+
+Every confirmation records (normalized extracted name → drug_id, user).
+Confirmations count distinct users: one user re-submitting the same
+prescription can't create a correction that then applies to everyone. A
+name becomes a correction once one drug has enough users and a clear
+majority for it, so common misreadings ("Azithral 5OO", "Dol0 650")
+resolve without fuzzy matching (the matcher still lists fuzzy
+alternatives next to a learned hit). The compiled map holds at most
+MAX_CORRECTIONS names (most confirmed first); it is reloaded with the
+knowledge snapshot (SIGHUP) and updated in-process as users confirm.
+
+The table is compacted every COMPACT_EVERY confirmations, or with:
+
+    python ocr_corrections.py --compact
+"""
+
+import argparse
+import os
+import threading
+
+import db
+from db import query, get_connection
+from ocr_pipeline import normalize_name, set_correction_map, learn_correction
+from timeline import days_ago_iso, today_iso
+
+# A drug needs this many distinct users confirming it for a name...
+MIN_CONFIRMATIONS = int(os.environ.get("MEDGUARD_OCR_MIN_CONFIRMATIONS", "2"))
+# ...and this share of all confirmations for that name.
+MIN_SHARE = 0.6
+
+# Names in the in-memory correction map.
+MAX_CORRECTIONS = int(os.environ.get("MEDGUARD_OCR_MAX_CORRECTIONS", "10000"))
+# (name, drug) rows kept by compaction (with their users).
+MAX_TRACKED = int(os.environ.get("MEDGUARD_OCR_MAX_TRACKED", "50000"))
+# Single-user confirmations older than this are dropped by compaction.
+STALE_DAYS = 180
+
+COMPACT_EVERY = 1000
+
+_recorded = 0
+_recorded_lock = threading.Lock()
+
+# Best drug per name, if it qualifies as a correction.
+_WINNERS_SQL = """
+    SELECT normalized, drug_id, confirmations FROM (
+        SELECT normalized, drug_id, confirmations,
+               SUM(confirmations) OVER (PARTITION BY normalized) AS total,
+               ROW_NUMBER() OVER (
+                   PARTITION BY normalized ORDER BY confirmations DESC, last_confirmed DESC
+               ) AS rank
+        FROM ocr_corrections
+        {where}
+    )
+    WHERE rank = 1 AND confirmations >= :min_confirmations AND confirmations >= :min_share * total
+    ORDER BY confirmations DESC
+    LIMIT :limit
+"""
+
+
+def _winners(where="", params=None, limit=MAX_CORRECTIONS):
+    params = dict(params or {}, min_confirmations=MIN_CONFIRMATIONS, min_share=MIN_SHARE, limit=limit)
+    return {r["normalized"]: r["drug_id"] for r in query(_WINNERS_SQL.format(where=where), params)}
+
+
+def compile_corrections(limit=MAX_CORRECTIONS):
+    """normalized name → drug_id for the `limit` most confirmed corrections."""
+    return _winners(limit=limit)
+
+
+def load_corrections():
+    """(Re)load the compiled map into the OCR matcher. Returns it."""
+    corrections = compile_corrections()
+    set_correction_map(corrections)
+    return corrections
+
+
+def record_correction(extracted_name, drug_id, user_id):
+    """
+    Record that `user_id` confirmed `drug_id` for an OCR-extracted name,
+    and update this process's correction map for that name. Repeat
+    confirmations by the same user only refresh last_confirmed.
+    """
+    normalized = normalize_name(extracted_name)
+    if not normalized:
+        return
+    conn = get_connection()
+    try:
+        with conn:
+            new_user = conn.execute("""
+                INSERT OR IGNORE INTO ocr_correction_users (normalized, drug_id, user_id)
+                VALUES (?, ?, ?)
+            """, (normalized, drug_id, user_id)).rowcount
+            conn.execute("""
+                INSERT INTO ocr_corrections (normalized, drug_id, confirmations, last_confirmed)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (normalized, drug_id) DO UPDATE
+                SET confirmations = confirmations + excluded.confirmations,
+                    last_confirmed = excluded.last_confirmed
+            """, (normalized, drug_id, new_user, today_iso()))
+    finally:
+        conn.close()
+
+    winner = _winners("WHERE normalized = :normalized", {"normalized": normalized}, limit=1)
+    learn_correction(normalized, winner.get(normalized), MAX_CORRECTIONS)
+
+    global _recorded
+    with _recorded_lock:
+        _recorded += 1
+        due = _recorded % COMPACT_EVERY == 0
+    if due:
+        compact_corrections()
+
+
+def compact_corrections(max_tracked=None, stale_days=STALE_DAYS, today=None, db_path=None):
+    """
+    Drop one-off confirmations older than `stale_days`, then keep only the
+    `max_tracked` most confirmed rows. Returns the number of rows removed.
+    """
+    if max_tracked is None:
+        max_tracked = MAX_TRACKED
+    conn = get_connection(db_path)
+    try:
+        with conn:
+            stale = conn.execute(
+                "DELETE FROM ocr_corrections WHERE confirmations < ? AND last_confirmed < ?",
+                (MIN_CONFIRMATIONS, days_ago_iso(stale_days, today)),
+            ).rowcount
+            excess = conn.execute("""
+                DELETE FROM ocr_corrections WHERE rowid NOT IN (
+                    SELECT rowid FROM ocr_corrections
+                    ORDER BY confirmations DESC, last_confirmed DESC
+                    LIMIT ?
+                )
+            """, (max_tracked,)).rowcount
+            conn.execute("""
+                DELETE FROM ocr_correction_users WHERE (normalized, drug_id) NOT IN (
+                    SELECT normalized, drug_id FROM ocr_corrections
+                )
+            """)
+    finally:
+        conn.close()
+    return stale + excess
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MEDGUARD OCR correction maintenance")
+    parser.add_argument("--compact", action="store_true", help="drop stale and excess confirmations")
+    args = parser.parse_args()
+
+    if args.compact:
+        n = compact_corrections()
+        print(f"[MEDGUARD] Compacted OCR corrections: {n} rows removed, "
+              f"{len(compile_corrections())} corrections active ({db.DB_PATH}).")
+    else:
+        parser.print_help()
@@ -3,28 +3,75 @@ MEDGUARD — OCR Normalization Pipeline
 
 Pipeline: image → OCR text → medicine extraction → fuzzy match → user confirmation → storage
 
+Uploads may be multi-page (PDF via pdf2image + poppler, multi-frame TIFF
+via Pillow) or a batch of files. With an OCR process pool installed
+(ASGI launcher), pages are OCR'd in parallel on the pool and merging +
+matching run there too; without one (dev server) everything runs in the
+request thread, page after page. Extracted lines are merged across pages
+and matched in one vectorized pass.
+
 SAFETY: Mandatory user confirmation before any OCR result is stored.
 """
 
 import re
+import threading
+
 from rapidfuzz import fuzz, process
-from db import query, execute
+import db
+from db import query, iter_query
+from queries import run_one, run_write
+
+try:
+    import numpy  # vectorized matching via process.cdist
+except ImportError:
+    numpy = None
 
 
 # ──────────────────────────────────────────────
 # Step 1: Extract text from image (OCR)
 # ──────────────────────────────────────────────
 
-def extract_text_from_image(image_path):
+def _is_pdf(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read(5) == b"%PDF-"
+    except OSError:
+        return False
+
+
+def count_pages(image_path):
     """
-    Extract text from a prescription/medicine image using Tesseract OCR.
+    Pages in an upload: PDF pages (via pdf2image/poppler) or image frames
+    (multi-frame TIFF via Pillow). 1 when it can't be inspected.
+    """
+    try:
+        if _is_pdf(image_path):
+            from pdf2image import pdfinfo_from_path
+            return max(1, int(pdfinfo_from_path(image_path)["Pages"]))
+        from PIL import Image
+        with Image.open(image_path) as img:
+            return max(1, getattr(img, "n_frames", 1))
+    except Exception:
+        return 1
+
+
+def extract_text_from_page(image_path, page=0):
+    """
+    Extract text from one page/frame of a prescription using Tesseract OCR.
     Returns raw OCR text string.
     """
     try:
         from PIL import Image
         import pytesseract
-        img = Image.open(image_path)
-        raw_text = pytesseract.image_to_string(img, lang="eng")
+        if _is_pdf(image_path):
+            from pdf2image import convert_from_path
+            img = convert_from_path(image_path, dpi=300, first_page=page + 1, last_page=page + 1)[0]
+        else:
+            img = Image.open(image_path)
+        with img:  # closes the file handle in long-lived pool workers
+            if page and not _is_pdf(image_path):
+                img.seek(page)
+            raw_text = pytesseract.image_to_string(img, lang="eng")
         return raw_text.strip()
     except ImportError:
         print("⚠️ Module not found. Using Mock OCR.")
@@ -34,6 +81,15 @@ def extract_text_from_image(image_path):
         return _mock_ocr(image_path)
 
 
+def extract_text_from_image(image_path):
+    """
+    Extract text from a prescription/medicine image using Tesseract OCR.
+    Multi-page files (PDF, multi-frame TIFF) return all pages in order.
+    Returns raw OCR text string.
+    """
+    return "\n".join(extract_text_from_page(image_path, page) for page in range(count_pages(image_path)))
+
+
 def _mock_ocr(image_path):
     """Fallback mock OCR for testing without Tesseract installed."""
     return (
@@ -48,66 +104,348 @@ def _mock_ocr(image_path):
 # Step 2: Extract medicine names from OCR text
 # ──────────────────────────────────────────────
 
+# Dosage forms written before the name ("Tab.", "Capsule", "Syp" ...)
+_FORM_WORDS = r"tab(?:let)?s?|cap(?:sule)?s?|syp|syrup|inj(?:ection)?|susp(?:ension)?|oint(?:ment)?"
+_FORMS = {"tab": "Tab", "cap": "Cap", "syp": "Syp", "syr": "Syp", "inj": "Inj", "sus": "Susp", "oin": "Oint"}
+
+_FREQUENCY_WORDS = "od|qd|bd|bid|tds|tid|qid|qds|hs|sos|prn|stat"
+_TIMES_WORDS = "once|twice|thrice"
+
+# One prescription line: optional form, then the name (a word, plus a
+# number when it directly follows: "Dolo 650", unless it starts a 1-0-1
+# pattern), optional unit, rest.
+_LINE_RE = re.compile(rf"""
+    ^[^\S\n]*
+    (?: (?P<form> {_FORM_WORDS} ) \b \.? [^\S\n]* )?
+    (?! (?: {_FORM_WORDS} ) \b )
+    (?P<name> [A-Za-z][A-Za-z0-9\-]+ (?: [^\S\n]+ (?P<number> \d+ ) (?! \d | [-/]\d ) )? )
+    (?: (?<= \d ) [^\S\n]* (?P<unit> mcg|mg|gm|g|ml|iu ) \b )?
+    (?P<rest> [^\n]* )
+""", re.IGNORECASE | re.MULTILINE | re.VERBOSE)
+
+# Detail tokens in the rest of a line. The lookahead lets the scan skip
+# positions that can't start a token without trying every alternative.
+_DETAIL_RE = re.compile(rf"""
+    (?= [(\d×x] | \b (?: {_FREQUENCY_WORDS}|{_TIMES_WORDS}|for ) \b )
+    (?:
+          \( (?P<molecule> [A-Za-z]+ )
+        | (?<! \d ) (?P<pattern> \d(?:/\d|½)? (?: - \d(?:/\d|½)? ){{2,3}} ) (?! \d )
+        | \b (?P<abbrev> {_FREQUENCY_WORDS} ) \b
+        | \b (?P<times> {_TIMES_WORDS} ) \b (?: [^\S\n]* (?: a[^\S\n]+ )? (?: daily|day ) )?
+        | (?: [x×]|\bfor )? [^\S\n]* (?P<duration> \d+ ) [^\S\n]*
+          (?P<period> days?|d|weeks?|wks?|w|months?|m ) \b
+        | (?P<strength> \d+(?:\.\d+)? [^\S\n]* (?: mcg|mg|gm|g|ml|iu ) ) \b
+    )
+""", re.IGNORECASE | re.VERBOSE)
+
+_DOSES_PER_DAY = {
+    "od": 1, "qd": 1, "hs": 1, "bd": 2, "bid": 2, "tds": 3, "tid": 3, "qid": 4, "qds": 4,
+    "once": 1, "twice": 2, "thrice": 3,
+}
+_PERIOD_DAYS = {"d": 1, "w": 7, "m": 30}
+_NO_SPACE = re.compile(r"\s+")
+
+_DETAIL_FIELDS = ("form", "strength", "frequency", "doses_per_day", "duration_days")
+
+
+def parse_medicine_line(match):
+    """Structured record from one _LINE_RE match."""
+    form = match.group("form")
+    number, unit = match.group("number"), match.group("unit")
+    record = {
+        "raw_text": match.group(0).strip(),
+        "extracted_name": match.group("name").strip(),
+        "extracted_molecule": None,
+        "form": _FORMS[form[:3].lower()] if form else None,
+        "strength": number + unit.lower() if unit else number,
+        "frequency": None,
+        "doses_per_day": None,
+        "duration_days": None,
+    }
+
+    for token in _DETAIL_RE.finditer(match.group("rest")):
+        kind = token.lastgroup
+        if kind == "molecule":
+            if record["extracted_molecule"] is None:
+                record["extracted_molecule"] = token.group("molecule")
+        elif kind == "period":
+            if record["duration_days"] is None:
+                days = _PERIOD_DAYS[token.group("period")[0].lower()]
+                record["duration_days"] = int(token.group("duration")) * days
+        elif kind == "strength":
+            if record["strength"] is None:
+                record["strength"] = _NO_SPACE.sub("", token.group("strength")).lower()
+        elif record["frequency"] is None:
+            if kind == "pattern":
+                pattern = token.group("pattern")
+                record["frequency"] = pattern
+                # 1-0-1 → 2: doses in the day with a non-zero amount
+                record["doses_per_day"] = sum(1 for part in pattern.split("-") if part != "0")
+            else:
+                word = token.group(kind).lower()
+                record["frequency"] = word.upper() if kind == "abbrev" else token.group(0).lower()
+                record["doses_per_day"] = _DOSES_PER_DAY.get(word)
+    return record
+
+
 def extract_medicine_names(ocr_text):
     """
     Parse OCR text to extract potential medicine names.
     Handles common Indian prescription formats.
+
+    One pass of the precompiled line grammar over the text; each medicine
+    line becomes {raw_text, extracted_name, extracted_molecule, form,
+    strength, frequency, doses_per_day, duration_days} (None if absent):
+
+        "Tab. Augmentin 625 (Amoxicillin) 1-0-1 x 5 days"
+        → form Tab, name "Augmentin 625", strength "625",
+          frequency "1-0-1" (2 doses/day), duration 5 days
     """
-    medicines = []
-    lines = ocr_text.split("\n")
+    return [parse_medicine_line(match) for match in _LINE_RE.finditer(ocr_text)]
 
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
 
-        # Remove common prefixes
-        cleaned = re.sub(
-            r'^(Tab\.?|Cap\.?|Syp\.?|Inj\.?|Susp\.?|Oint\.?)\s*',
-            '', line, flags=re.IGNORECASE
-        )
+# ──────────────────────────────────────────────
+# Shared name table (OCR matcher + drug search)
+# ──────────────────────────────────────────────
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+# Cached per database path so tests / alternate DBs never see stale names.
+_NAME_TABLES = {}
+
+
+def normalize_name(text):
+    """Lower-case a drug/brand name and collapse punctuation to single spaces."""
+    return _NON_ALNUM.sub(" ", (text or "").lower()).strip()
+
+
+def load_name_table(refresh=False):
+    """
+    Load every molecule and brand name with its normalized form.
+
+    Returns list of dicts: {name, normalized, drug_id, kind, molecule}
+    where kind is 'molecule' or 'brand'. Molecules come first so a brand
+    with the same display name overrides it, as in fuzzy matching.
+    """
+    key = db.DB_PATH
+    if not refresh and key in _NAME_TABLES:
+        return _NAME_TABLES[key]
+
+    drugs = iter_query("SELECT drug_id, molecule FROM drug_master", tuples=True)
+    brands = iter_query("""
+        SELECT bm.brand_name, bm.drug_id, dm.molecule
+        FROM brand_mapping bm
+        LEFT JOIN drug_master dm ON bm.drug_id = dm.drug_id
+    """, tuples=True)
+
+    table = [
+        {
+            "name": molecule,
+            "normalized": normalize_name(molecule),
+            "drug_id": drug_id,
+            "kind": "molecule",
+            "molecule": molecule,
+        }
+        for drug_id, molecule in drugs
+    ]
+    table.extend(
+        {
+            "name": brand_name,
+            "normalized": normalize_name(brand_name),
+            "drug_id": drug_id,
+            "kind": "brand",
+            "molecule": molecule,
+        }
+        for brand_name, drug_id, molecule in brands
+    )
 
-        # Try to extract the brand/molecule name (first meaningful word group)
-        # Match patterns like "Dolo 650" or "Azithral 500" or "Pan-D"
-        match = re.match(r'([A-Za-z][A-Za-z0-9\-]+(?:\s+\d+)?)', cleaned)
-        if match:
-            name = match.group(1).strip()
-            # Also try to extract molecule from parentheses
-            mol_match = re.search(r'\(([A-Za-z]+)', line)
-            molecule = mol_match.group(1) if mol_match else None
-            medicines.append({
-                "raw_text": line,
-                "extracted_name": name,
-                "extracted_molecule": molecule,
-            })
+    _NAME_TABLES[key] = table
+    return table
 
-    return medicines
+
+def invalidate_name_table():
+    """Drop cached name tables (call after editing drug_master / brand_mapping)."""
+    _NAME_TABLES.clear()
 
 
 # ──────────────────────────────────────────────
 # Step 3: Fuzzy match against drug_master
 # ──────────────────────────────────────────────
 
-def fuzzy_match_drugs(extracted_names, threshold=60):
+# A first-word (token) hit is trusted only this close; else fuzzy decides.
+TOKEN_MIN_SCORE = 85
+
+MATCH_TIERS = ("exact", "learned", "token", "fuzzy")
+
+# Per name table: (table, exact index, first-word index, drug → name)
+_MATCH_INDEXES = {}
+
+# Learned corrections: normalized misreading → drug_id (ocr_corrections.py)
+_CORRECTIONS = {}
+_CORRECTIONS_LOCK = threading.Lock()
+
+
+def set_correction_map(corrections):
+    """Install a compiled correction map (replaces the current one)."""
+    global _CORRECTIONS
+    _CORRECTIONS = dict(corrections)
+
+
+def learn_correction(normalized, drug_id, max_size):
+    """
+    Update one name in the correction map (drug_id None removes it). A new
+    name is only added while the map holds fewer than `max_size` names.
+    """
+    with _CORRECTIONS_LOCK:
+        if drug_id is None:
+            _CORRECTIONS.pop(normalized, None)
+        elif normalized in _CORRECTIONS or len(_CORRECTIONS) < max_size:
+            _CORRECTIONS[normalized] = drug_id
+
+
+def _match_index():
+    """
+    Hash indexes over the current name table: normalized name → names,
+    first normalized word → names (display names, table order), and
+    drug_id → the display name fuzzy_match_drugs resolves to that drug.
+    """
+    table = load_name_table()
+    cached = _MATCH_INDEXES.get(db.DB_PATH)
+    if cached is not None and cached[0] is table:
+        return cached
+
+    exact, first_word = {}, {}
+    for name in dict.fromkeys(e["name"] for e in table):
+        normalized = normalize_name(name)
+        exact.setdefault(normalized, []).append(name)
+        first_word.setdefault(normalized.split(" ")[0], []).append(name)
+    resolves = {e["name"]: e["drug_id"] for e in table}
+    by_drug = {}
+    for name, drug_id in resolves.items():
+        by_drug.setdefault(drug_id, name)
+    cached = _MATCH_INDEXES[db.DB_PATH] = (table, exact, first_word, by_drug)
+    return cached
+
+
+def _top_matches(queries, name_list, limit=3, score_cutoff=None):
+    """
+    For each query, the `limit` best (name, WRatio score) pairs, best first
+    (ties in name_list order, like process.extract). One cdist() call
+    scores every query against every name in parallel when numpy is
+    available; otherwise one extract() per query. Names scoring below
+    score_cutoff are dropped (rapidfuzz skips them early).
+    """
+    if not queries or not name_list:
+        return [[] for _ in queries]
+    if numpy is None:
+        return [
+            [(name, score) for name, score, _ in process.extract(
+                q, name_list, scorer=fuzz.WRatio, limit=limit, score_cutoff=score_cutoff)]
+            for q in queries
+        ]
+    # One thread: this runs per request (or per OCR pool process), never
+    # across every core
+    scores = process.cdist(queries, name_list, scorer=fuzz.WRatio, score_cutoff=score_cutoff,
+                           dtype=numpy.float64, workers=1)
+    best = numpy.argsort(-scores, axis=1, kind="stable")[:, :limit]
+    cutoff = score_cutoff or 0
+    return [
+        [(name_list[j], float(scores[i, j])) for j in row if scores[i, j] >= cutoff]
+        for i, row in enumerate(best)
+    ]
+
+
+def match_names(queries, name_list, threshold=60, limit=3):
+    """
+    Tiered matching: {query: (tier, [(name, score)])}.
+
+      exact  normalized query is a known name (hash lookup)
+      learned  users have confirmed a drug for this exact misreading
+             (ocr_corrections.py), e.g. "Dol0 650" → Paracetamol
+      token  names sharing the query's first word, e.g. "Paracetamol
+             500" → Paracetamol, scored individually (>= TOKEN_MIN_SCORE)
+      fuzzy  full WRatio scan, for what the first tiers miss
+
+    A learned or token hit decides the top candidates, but the remaining
+    slots are still filled from the full scan, so look-alikes
+    ("Amoxicillin 250": Amoxiclav, Mox 500) stay on the confirmation
+    screen.
+
+    tier is None when nothing reaches `threshold`.
+    """
+    _, exact, first_word, by_drug = _match_index()
+    # residue: queries scanned in full; leads: query → (tier, top candidates
+    # already decided) for scanned queries that only need their slots filled
+    matched, residue, leads = {}, [], {}
+    for query in queries:
+        normalized = normalize_name(query)
+        names = exact.get(normalized)
+        if names:
+            matched[query] = ("exact", [(name, 100.0) for name in names[:limit]])
+            continue
+
+        name = by_drug.get(_CORRECTIONS.get(normalized))
+        if name is not None:
+            # The learned drug leads; the scan still offers alternatives
+            leads[query] = ("learned", [(name, 100.0)])
+            residue.append(query)
+            continue
+
+        scored = sorted(
+            ((name, fuzz.WRatio(query, name)) for name in first_word.get(normalized.split(" ")[0], ())),
+            key=lambda pair: pair[1], reverse=True,
+        )
+        if scored and scored[0][1] >= TOKEN_MIN_SCORE:
+            lead = [pair for pair in scored[:limit] if pair[1] >= threshold]
+            if len(lead) == limit:
+                matched[query] = ("token", lead)
+                continue
+            leads[query] = ("token", lead)
+        residue.append(query)
+
+    for query, top in zip(residue, _top_matches(residue, name_list, limit, score_cutoff=threshold)):
+        if query in leads:
+            tier, lead = leads[query]
+            taken = {name for name, _ in lead}
+            matched[query] = (tier, lead + [pair for pair in top if pair[0] not in taken][:limit - len(lead)])
+        else:
+            matched[query] = ("fuzzy" if top else None, top)
+    return matched
+
+
+def tier_stats(tiers):
+    """Hit counts and rates per tier for a list of tiers (None = no match)."""
+    stats = {"queries": len(tiers)}
+    for tier in MATCH_TIERS + (None,):
+        hits = sum(1 for t in tiers if t == tier)
+        label = tier or "unmatched"
+        stats[label] = hits
+        stats[f"{label}_rate"] = round(hits / len(tiers), 3) if tiers else 0.0
+    return stats
+
+
+def fuzzy_match_drugs(extracted_names, threshold=60, stats=None):
     """
     Match extracted medicine names against drug_master and brand_mapping
-    using fuzzy string matching.
+    using exact, token and fuzzy string matching (see match_names).
 
     Returns list of candidates with confidence scores.
     NO results are stored until user confirms.
+    If `stats` (a dict) is given it receives per-tier hit counts/rates.
     """
-    # Load all known drugs and brands
-    drugs = query("SELECT drug_id, molecule FROM drug_master")
-    brands = query("SELECT brand_name, drug_id FROM brand_mapping")
+    # Load all known drugs and brands (shared with /drugs/search)
+    all_names = {e["name"]: e["drug_id"] for e in load_name_table()}
 
-    drug_names = {d["molecule"]: d["drug_id"] for d in drugs}
-    brand_names = {b["brand_name"]: b["drug_id"] for b in brands}
+    name_list = list(all_names.keys())
 
-    all_names = {}
-    all_names.update(drug_names)
-    all_names.update(brand_names)
+    # Match every distinct molecule / name once
+    queries = list(dict.fromkeys(
+        q for med in extracted_names for q in (med["extracted_molecule"], med["extracted_name"]) if q
+    ))
+    matched = match_names(queries, name_list, threshold)
+    if stats is not None:
+        stats.update(tier_stats([tier for tier, _ in matched.values()]))
 
-    name_list = list(all_names.keys())
     results = []
 
     for med in extracted_names:
@@ -115,11 +453,7 @@ def fuzzy_match_drugs(extracted_names, threshold=60):
 
         # Try molecule match first
         if med["extracted_molecule"]:
-            mol_matches = process.extract(
-                med["extracted_molecule"], name_list,
-                scorer=fuzz.WRatio, limit=3
-            )
-            for match_name, score, _ in mol_matches:
+            for match_name, score in matched[med["extracted_molecule"]][1]:
                 if score >= threshold:
                     candidates.append({
                         "matched_name": match_name,
@@ -129,11 +463,7 @@ def fuzzy_match_drugs(extracted_names, threshold=60):
                     })
 
         # Try brand name match
-        brand_matches = process.extract(
-            med["extracted_name"], name_list,
-            scorer=fuzz.WRatio, limit=3
-        )
-        for match_name, score, _ in brand_matches:
+        for match_name, score in matched[med["extracted_name"]][1]:
             if score >= threshold:
                 # Avoid duplicates
                 if not any(c["matched_name"] == match_name for c in candidates):
@@ -151,6 +481,9 @@ def fuzzy_match_drugs(extracted_names, threshold=60):
             "raw_text": med["raw_text"],
             "extracted_name": med["extracted_name"],
             "candidates": candidates,
+            "match_tier": matched[med["extracted_name"]][0],
+            # Parsed prescription details, passed back on confirmation
+            **{k: med.get(k) for k in _DETAIL_FIELDS},
             "requires_confirmation": True,  # ALWAYS
         })
 
@@ -161,36 +494,38 @@ def fuzzy_match_drugs(extracted_names, threshold=60):
 # Step 4: Store confirmed medicines
 # ──────────────────────────────────────────────
 
-def store_confirmed_medicine(drug_id, user_id="default", start_date=None):
+def store_confirmed_medicine(drug_id, user_id="default", start_date=None, duration_days=None):
     """
     Store a USER-CONFIRMED medicine in the timeline.
     This should ONLY be called after explicit user confirmation.
+
+    duration_days comes from the prescription line ("x 5 days") when the
+    parser found one; otherwise a default course length is assumed.
+    change_seq is the user's change sequence as of this insert (for the
+    risk_state hook).
     """
     from datetime import date, datetime, timedelta
     if start_date is None:
         start_date = date.today().isoformat()
 
-    # Calculate default end date (Assessment: 5 days for antibiotics, 30 for others)
     start_dt = datetime.strptime(start_date, "%Y-%m-%d")
-    
-    # Check if antibiotic (simple check from DB)
-    is_antibiotic = False
-    drug_info = query("SELECT drug_class FROM drug_master WHERE drug_id = ?", (drug_id,))
-    if drug_info and 'antibiotic' in drug_info[0]['drug_class'].lower():
-        is_antibiotic = True
-        
-    duration = 5 if is_antibiotic else 10 # Default duration
-    end_date = (start_dt + timedelta(days=duration)).strftime("%Y-%m-%d")
+
+    if duration_days is None:
+        # Default course length: 5 days for antibiotics, 10 for others
+        is_antibiotic = False
+        drug_info = run_one("drug.class", (drug_id,))
+        if drug_info and 'antibiotic' in drug_info['drug_class'].lower():
+            is_antibiotic = True
+        duration_days = 5 if is_antibiotic else 10
+
+    end_date = (start_dt + timedelta(days=duration_days)).strftime("%Y-%m-%d")
 
     print(f"[DEBUG] Attempting to store medicine: user={user_id}, drug={drug_id}, date={start_date}")
     try:
-        row_id = execute(
-            """INSERT INTO user_medicine_timeline (user_id, drug_id, start_date, end_date, confirmed, symptoms, taken_doses, missed_doses)
-               VALUES (?, ?, ?, ?, 1, NULL, 0, 0)""",
-            (user_id, drug_id, start_date, end_date),
-        )
-        print(f"[DEBUG] Successfully stored at row {row_id}")
-        return {"stored": True, "timeline_id": row_id, "drug_id": drug_id, "start_date": start_date, "end_date": end_date}
+        written = run_write("timeline.add", (user_id, drug_id, start_date, end_date), returning="timeline.written")
+        print(f"[DEBUG] Successfully stored at row {written['id']}")
+        return {"stored": True, "timeline_id": written["id"], "drug_id": drug_id, "start_date": start_date,
+                "end_date": end_date, "change_seq": written["seq"]}
     except Exception as e:
         print(f"[ERROR] Failed to store medicine: {e}")
         return {"stored": False, "error": str(e)}
@@ -200,39 +535,139 @@ def store_confirmed_medicine(drug_id, user_id="default", start_date=None):
 # Full Pipeline (returns candidates, NOT auto-stored)
 # ──────────────────────────────────────────────
 
-def process_prescription_image(image_path):
+def _ocr_unit(unit):
+    # Top-level so it pickles for the process pool
+    path, page = unit
+    return extract_text_from_page(path, page)
+
+
+def ocr_pages(image_paths, parallel=True):
     """
-    Full OCR pipeline: image → text → extract → fuzzy match → candidates.
+    OCR every page of every file. Returns [(file index, page, text)] in
+    upload order. With parallel=True and an OCR process pool installed,
+    each page is one pool task; otherwise pages are read one after
+    another in this process.
+    """
+    units = [(path, page) for path in image_paths for page in range(count_pages(path))]
+    file_index = {path: i for i, path in enumerate(image_paths)}
+
+    executor = _OCR_EXECUTOR if parallel else None
+    if executor is None:
+        texts = [_ocr_unit(unit) for unit in units]
+    else:
+        texts = list(executor.map(_ocr_unit, units))
+
+    return [(file_index[path], page, text) for (path, page), text in zip(units, texts)]
+
+
+def merge_extracted(pages):
+    """
+    Extract medicine lines from each page and merge repeats (the same
+    medicine on several pages or prescriptions) into one entry that lists
+    every page it was seen on under "sources".
+    """
+    merged = {}
+    for file_no, page, text in pages:
+        for med in extract_medicine_names(text):
+            key = (normalize_name(med["extracted_name"]), normalize_name(med["extracted_molecule"]))
+            entry = merged.get(key)
+            if entry is None:
+                entry = merged[key] = dict(med, sources=[])
+            entry["sources"].append({"file": file_no, "page": page})
+    return list(merged.values())
+
+
+def process_prescription_batch(image_paths, parallel=True):
+    """
+    OCR pipeline over many files / pages: OCR (in parallel) → extract per
+    page → merge duplicates → one fuzzy-match pass over the distinct names.
 
     ⚠️  Results are NOT stored until user confirms each medicine.
-    Returns candidate matches for user review.
+    Each candidate's "sources" lists the (file index, page) it came from.
     """
     # Step 1: OCR
-    raw_text = extract_text_from_image(image_path)
-    if raw_text.startswith("[OCR_ERROR]"):
-        return {"error": raw_text, "step": "ocr"}
+    return analyze_pages(ocr_pages(image_paths, parallel=parallel))
+
 
-    # Step 2: Extract names
-    extracted = extract_medicine_names(raw_text)
+def analyze_pages(pages):
+    """Steps 2-3 of process_prescription_batch for already OCR'd pages."""
+    pages = [p for p in pages if not p[2].startswith("[OCR_ERROR]")]
+    if not pages:
+        return {"error": "[OCR_ERROR] No page could be read", "step": "ocr"}
+    raw_text = "\n".join(text for _, _, text in pages)
+
+    # Step 2: Extract names (deduplicated across pages)
+    extracted = merge_extracted(pages)
     if not extracted:
         return {
             "raw_text": raw_text,
+            "page_count": len(pages),
             "candidates": [],
             "message": "No medicine names could be extracted from the image.",
         }
 
-    # Step 3: Fuzzy match
-    matches = fuzzy_match_drugs(extracted)
+    # Step 3: Match (exact → token → fuzzy)
+    match_stats = {}
+    matches = fuzzy_match_drugs(extracted, stats=match_stats)
+    for match, med in zip(matches, extracted):
+        match["sources"] = med["sources"]
 
     return {
         "raw_text": raw_text,
+        "page_count": len(pages),
         "extracted_count": len(extracted),
         "candidates": matches,
+        "match_stats": match_stats,
         "message": "⚠️ Please review and confirm each medicine before proceeding.",
         "requires_user_confirmation": True,
     }
 
 
+def process_prescription_image(image_path):
+    """
+    Full OCR pipeline: image → text → extract → fuzzy match → candidates.
+    Every page of a multi-page file is read, in this process.
+
+    ⚠️  Results are NOT stored until user confirms each medicine.
+    Returns candidate matches for user review.
+    """
+    return process_prescription_batch([image_path], parallel=False)
+
+
+# Optional process pool for OCR, installed by the ASGI / production launchers
+# so CPU-bound image work never runs on a request-serving thread.
+_OCR_EXECUTOR = None
+
+
+def set_ocr_executor(executor):
+    """Install (or clear, with None) the executor used by run_prescription_ocr."""
+    global _OCR_EXECUTOR
+    _OCR_EXECUTOR = executor
+
+
+def _analyze_in_pool(pages, corrections):
+    # Pool processes keep the name table they loaded, but learned
+    # corrections change at runtime: use the caller's current map
+    set_correction_map(corrections)
+    return analyze_pages(pages)
+
+
+def run_prescription_ocr(image_paths):
+    """
+    OCR pipeline for one path or a list of paths. With the OCR pool
+    installed the whole pipeline runs on it (one task per page, then one
+    for merging and matching) and the request thread only waits; without
+    it (dev server) pages are processed sequentially in this thread.
+    """
+    if isinstance(image_paths, str):
+        image_paths = [image_paths]
+    executor = _OCR_EXECUTOR
+    if executor is None:
+        return process_prescription_batch(image_paths, parallel=False)
+    pages = ocr_pages(image_paths)
+    return executor.submit(_analyze_in_pool, pages, dict(_CORRECTIONS)).result()
+
+
 # ──────────────────────────────────────────────
 # Demo
 # ──────────────────────────────────────────────
@@ -254,4 +689,7 @@ if __name__ == "__main__":
             print(f"    → {c['matched_name']} ({c['drug_id']}) "
                   f"confidence={c['confidence']}% [{c['match_type']}]")
 
+    stats = result["match_stats"]
+    print(f"\nMatch tiers: exact={stats['exact']} token={stats['token']} "
+          f"fuzzy={stats['fuzzy']} unmatched={stats['unmatched']}")
     print(f"\n⚠️  {result['message']}")
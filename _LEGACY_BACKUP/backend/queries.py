@@ -0,0 +1,399 @@
+"""
+MEDGUARD — Named Query Registry
+The hot-path SQL statements, by name, run on long-lived connections.
+
+db.query() opens a connection per call, so sqlite3's statement cache
+is thrown away every time. run() keeps one connection per thread and
+database (cached_statements raised to CACHED_STATEMENTS), so each
+registered statement is prepared once per connection and reused. Every
+call is timed per name; query_stats() (GET /db/metrics) reports calls,
+total / average / max milliseconds.
+
+Several statements that must see or write one consistent state run
+inside `with transaction():` on the same connection; run_write() then
+leaves the commit to the end of the block.
+
+Connections are never shared across os.fork(): the child drops the
+parent's (without closing them) and opens its own, and starts with
+fresh counters.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import db
+
+CACHED_STATEMENTS = int(os.environ.get("MEDGUARD_CACHED_STATEMENTS", "512"))
+
+# ──────────────────────────────────────────────
+# Registry
+# ──────────────────────────────────────────────
+
+QUERIES = {
+    # drug_master
+    "drug.by_id": "SELECT * FROM drug_master WHERE drug_id = ?",
+    "drug.molecule": "SELECT molecule FROM drug_master WHERE drug_id = ?",
+    "drug.class": "SELECT drug_class FROM drug_master WHERE drug_id = ?",
+    "drug.summary": "SELECT drug_id, molecule FROM drug_master WHERE drug_id = ?",
+    "drug.elderly": """
+        SELECT drug_id, molecule, avoid_in, source
+        FROM drug_master
+        WHERE drug_id = ?
+    """,
+
+    # knowledge lookups (risk_engine)
+    "adr.flags": """
+        SELECT dam.level, dam.advice, dam.source,
+               am.symptom_layman, am.severity,
+               dm.molecule
+        FROM drug_adr_map dam
+        JOIN adr_master am ON dam.adr_id = am.adr_id
+        JOIN drug_master dm ON dam.drug_id = dm.drug_id
+        WHERE dam.drug_id = ?
+    """,
+    "adr.explain": """
+        SELECT am.symptom_layman, am.severity, am.frequency,
+               dam.level, dam.advice, dam.source
+        FROM drug_adr_map dam
+        JOIN adr_master am ON dam.adr_id = am.adr_id
+        WHERE dam.drug_id = ?
+        ORDER BY CASE dam.level
+            WHEN 'red' THEN 1 WHEN 'yellow' THEN 2 ELSE 3
+        END
+    """,
+    "interaction.pair": """
+        SELECT * FROM drug_interaction_master
+        WHERE (drug_a = ? AND drug_b = ?)
+           OR (drug_a = ? AND drug_b = ?)
+    """,
+    "alcohol.by_molecule": """
+        SELECT risk_level, message, source, trigger
+        FROM food_alcohol_interactions
+        WHERE drug = ? AND trigger = 'Alcohol'
+    """,
+    "food.by_molecule": """
+        SELECT trigger, risk_level, message, source
+        FROM food_alcohol_interactions
+        WHERE drug = ?
+    """,
+    "amr.by_molecule": "SELECT * FROM amr_risk_master WHERE drug = ?",
+    "amr.red_rules": "SELECT * FROM antibiotic_misuse_rules WHERE level='red'",
+    "food.by_drug": """
+        SELECT fai.*, dm.molecule
+        FROM food_alcohol_interactions fai
+        JOIN drug_master dm ON fai.drug_id = dm.drug_id
+        WHERE fai.drug_id = ?
+    """,
+    # GET /drugs keyset page: drugs after ?, at most ? of them
+    "drug.page": """
+        SELECT dm.*, GROUP_CONCAT(bm.brand_name, ', ') as brands
+        FROM drug_master dm
+        LEFT JOIN brand_mapping bm ON dm.drug_id = bm.drug_id
+        WHERE dm.drug_id > ?
+        GROUP BY dm.drug_id
+        ORDER BY dm.drug_id
+        LIMIT ?
+    """,
+
+    # user data (api)
+    "profile.by_user": "SELECT * FROM user_profile WHERE user_id = ?",
+    "profile.age": "SELECT age FROM user_profile WHERE user_id = ?",
+    "profile.save": """
+        INSERT OR REPLACE INTO user_profile
+        (user_id, name, gender, age, weight_kg, height_cm, diet, occupation, existing_conditions, step_counter_enabled, last_synced_steps)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """,
+    "profile.sync_steps": "UPDATE user_profile SET last_synced_steps = ?, step_counter_enabled = 1 WHERE user_id = ?",
+    "timeline.add": """
+        INSERT INTO user_medicine_timeline (user_id, drug_id, start_date, end_date, confirmed, symptoms, taken_doses, missed_doses)
+        VALUES (?, ?, ?, ?, 1, NULL, 0, 0)
+    """,
+    "timeline.dose_taken": "UPDATE user_medicine_timeline SET taken_doses = taken_doses + 1 WHERE id = ?",
+    "timeline.dose_missed": "UPDATE user_medicine_timeline SET missed_doses = missed_doses + 1 WHERE id = ?",
+    # A written course and its user's change sequence (run_write returning=)
+    "timeline.written": """
+        SELECT umt.id, umt.user_id, umt.drug_id, umt.missed_doses, ucs.seq
+        FROM user_medicine_timeline umt
+        JOIN user_change_seq ucs ON ucs.user_id = umt.user_id
+        WHERE umt.id = ?
+    """,
+    "timeline.owner": "SELECT user_id FROM user_medicine_timeline WHERE id = ?",
+    "timeline.symptoms": "SELECT user_id, drug_id, symptoms FROM user_medicine_timeline WHERE id = ?",
+    "timeline.set_symptoms": "UPDATE user_medicine_timeline SET symptoms = ? WHERE id = ?",
+
+    # precomputed risk (risk_worker)
+    "risk_state.by_user": "SELECT * FROM user_risk_state WHERE user_id = ?",
+    "risk_state.save": """
+        INSERT OR REPLACE INTO user_risk_state
+        (user_id, risk_level, risk_json, insights_json, updated_at)
+        VALUES (:user_id, :risk_level, :risk_json, :insights_json, :updated_at)
+    """,
+
+    # change tracking and archival (timeline)
+    "timeline.seq": "SELECT seq FROM user_change_seq WHERE user_id = ?",
+    "timeline.sync_floor": "SELECT seq FROM user_sync_floor WHERE user_id = ?",
+    "timeline.deleted_since": """
+        SELECT timeline_id FROM user_timeline_tombstones
+        WHERE user_id = ? AND change_seq > ? AND change_seq <= ?
+        ORDER BY change_seq
+    """,
+    "timeline.archive_delete": "DELETE FROM user_medicine_timeline WHERE end_date < ?",
+    "tombstones.last": "SELECT IFNULL(MAX(rowid), 0) AS last FROM user_timeline_tombstones",
+    "tombstones.after": """
+        SELECT user_id, timeline_id, change_seq FROM user_timeline_tombstones
+        WHERE rowid > ? ORDER BY change_seq
+    """,
+    # Tombstones from before deleted_at was tracked count as old
+    "tombstones.expired": """
+        SELECT COUNT(*) AS n FROM user_timeline_tombstones
+        WHERE deleted_at IS NULL OR deleted_at < ?
+    """,
+    "tombstones.raise_floor": """
+        INSERT INTO user_sync_floor (user_id, seq)
+        SELECT user_id, MAX(change_seq) FROM user_timeline_tombstones
+        WHERE deleted_at IS NULL OR deleted_at < ? GROUP BY user_id
+        ON CONFLICT (user_id) DO UPDATE SET seq = MAX(seq, excluded.seq)
+    """,
+    "tombstones.compact": """
+        DELETE FROM user_timeline_tombstones
+        WHERE deleted_at IS NULL OR deleted_at < ?
+    """,
+
+    # per-drug statistics (drug_stats)
+    "drug_stats.by_drug": "SELECT * FROM drug_stats WHERE drug_id = ?",
+    "drug_stats.count": "SELECT COUNT(*) AS n FROM drug_stats",
+    "drug_stats.symptoms": """
+        SELECT ss.symptom, ss.reports, ss.adr_id, am.symptom_layman, am.severity,
+               dam.level IS NOT NULL AS known_adr, dam.level
+        FROM drug_symptom_stats ss
+        LEFT JOIN adr_master am ON am.adr_id = ss.adr_id
+        LEFT JOIN drug_adr_map dam ON dam.drug_id = ss.drug_id AND dam.adr_id = ss.adr_id
+        WHERE ss.drug_id = ? AND ss.reports > 0
+        ORDER BY ss.reports DESC, ss.symptom
+    """,
+    "drug_stats.symptom_added": """
+        INSERT INTO drug_symptom_stats (drug_id, symptom, adr_id, reports) VALUES (?, ?, ?, 1)
+        ON CONFLICT (drug_id, symptom) DO UPDATE SET reports = reports + 1
+    """,
+    "drug_stats.symptom_removed": "UPDATE drug_symptom_stats SET reports = reports - 1 WHERE drug_id = ? AND symptom = ?",
+    "drug_stats.symptom_reports": "UPDATE drug_stats SET symptom_reports = symptom_reports + ? WHERE drug_id = ?",
+    "drug_stats.clear": "DELETE FROM drug_stats",
+    "drug_stats.clear_users": "DELETE FROM drug_user_stats",
+    "drug_stats.clear_symptoms": "DELETE FROM drug_symptom_stats",
+
+    # schema lookups (startup migration, maintenance)
+    "schema.object": "SELECT name FROM sqlite_master WHERE type = ? AND name = ?",
+    "schema.columns": "SELECT name FROM pragma_table_info(?)",
+}
+
+
+def register(name, sql):
+    """Add a statement built at import time (e.g. from shared clauses)."""
+    if QUERIES.get(name, sql) != sql:
+        raise ValueError(f"query {name!r} is already registered with different SQL")
+    QUERIES[name] = sql
+    return name
+
+
+# ──────────────────────────────────────────────
+# Connections
+# ──────────────────────────────────────────────
+
+_local = threading.local()
+
+# Inherited across fork: kept referenced so they're never closed in the child.
+_ABANDONED = []
+
+# name -> [calls, total seconds, max seconds]
+_STATS = {}
+_STATS_LOCK = threading.Lock()
+
+
+def _connection(db_path=None):
+    path = db_path or db.DB_PATH
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, cached_statements=CACHED_STATEMENTS)
+        conn.execute("PRAGMA foreign_keys = ON")
+        conns[path] = conn
+    return conn
+
+
+def _in_transaction(db_path=None):
+    return (db_path or db.DB_PATH) in getattr(_local, "transactions", ())
+
+
+def close_connections():
+    """Close this thread's connections (they reopen on next use)."""
+    for conn in getattr(_local, "conns", {}).values():
+        conn.close()
+    _local.conns = {}
+
+
+@contextmanager
+def transaction(db_path=None, immediate=False):
+    """
+    Run the registered statements of the block in one transaction on this
+    thread's connection: reads share one snapshot, writes commit together
+    at the end (or roll back on an exception). `immediate` takes the write
+    lock up front, for read-modify-write blocks. Nested blocks join the
+    outer one.
+    """
+    path = db_path or db.DB_PATH
+    if _in_transaction(path):
+        yield
+        return
+    conn = _connection(path)
+    if not hasattr(_local, "transactions"):
+        _local.transactions = set()
+    conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    _local.transactions.add(path)
+    try:
+        yield
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        _local.transactions.discard(path)
+
+
+def _after_fork_in_child():
+    global _local, _STATS, _STATS_LOCK
+    _ABANDONED.append(_local)
+    _local = threading.local()
+    _STATS = {}
+    _STATS_LOCK = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+# ──────────────────────────────────────────────
+# Execution
+# ──────────────────────────────────────────────
+
+def _record(name, elapsed):
+    with _STATS_LOCK:
+        stats = _STATS.get(name)
+        if stats is None:
+            _STATS[name] = [1, elapsed, elapsed]
+        else:
+            stats[0] += 1
+            stats[1] += elapsed
+            if elapsed > stats[2]:
+                stats[2] = elapsed
+
+
+def run(name, params=(), db_path=None):
+    """Run registered read query `name`; list of dicts, like db.query()."""
+    sql = QUERIES[name]
+    started = time.perf_counter()
+    cursor = _connection(db_path).execute(sql, params)
+    names = [d[0] for d in cursor.description]
+    rows = [dict(zip(names, row)) for row in cursor.fetchall()]
+    _record(name, time.perf_counter() - started)
+    return rows
+
+
+def run_one(name, params=(), db_path=None):
+    """First row of run(), or None."""
+    rows = run(name, params, db_path)
+    return rows[0] if rows else None
+
+
+def iter_run(name, params=(), db_path=None, batch_size=500):
+    """
+    run() that yields the rows as they are fetched, `batch_size` at a time
+    (see db.iter_query()); consume it right away, the read holds the
+    connection's snapshot open until then.
+    """
+    sql = QUERIES[name]
+    started = time.perf_counter()
+    cursor = _connection(db_path).execute(sql, params)
+    try:
+        names = [d[0] for d in cursor.description]
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            for row in rows:
+                yield dict(zip(names, row))
+    finally:
+        cursor.close()
+        _record(name, time.perf_counter() - started)
+
+
+def run_write(name, params=(), db_path=None, returning=None):
+    """
+    Run registered write statement `name` and commit (at the end of the
+    enclosing transaction(), if any); returns lastrowid.
+
+    With `returning` (a registered read taking one row id), that read runs
+    in the same transaction for the written row — lastrowid for an
+    INSERT, the last parameter for an UPDATE ... WHERE id = ? — and its
+    first row (a dict, or None) is returned instead.
+    """
+    sql = QUERIES[name]
+    conn = _connection(db_path)
+    own = not _in_transaction(db_path)
+    started = time.perf_counter()
+    try:
+        cursor = conn.execute(sql, params)
+        written = None
+        if returning is not None:
+            row_id = cursor.lastrowid if sql.lstrip().upper().startswith("INSERT") else params[-1]
+            read = conn.execute(QUERIES[returning], (row_id,))
+            row = read.fetchone()
+            if row is not None:
+                written = dict(zip([d[0] for d in read.description], row))
+        if own:
+            conn.commit()
+    except Exception:
+        if own:
+            conn.rollback()
+        raise
+    finally:
+        _record(name, time.perf_counter() - started)
+    return cursor.lastrowid if returning is None else written
+
+
+def run_many(name, seq_of_params, db_path=None):
+    """run_write() of `name` for every parameter set; returns the rows changed."""
+    sql = QUERIES[name]
+    conn = _connection(db_path)
+    own = not _in_transaction(db_path)
+    started = time.perf_counter()
+    try:
+        changed = conn.executemany(sql, seq_of_params).rowcount
+        if own:
+            conn.commit()
+    except Exception:
+        if own:
+            conn.rollback()
+        raise
+    finally:
+        _record(name, time.perf_counter() - started)
+    return changed
+
+
+def query_stats():
+    """{name: {calls, total_ms, avg_ms, max_ms}} for this process."""
+    with _STATS_LOCK:
+        snapshot = {name: list(s) for name, s in _STATS.items()}
+    return {
+        name: {
+            "calls": calls,
+            "total_ms": round(total * 1000, 3),
+            "avg_ms": round(total * 1000 / calls, 3),
+            "max_ms": round(worst * 1000, 3),
+        }
+        for name, (calls, total, worst) in sorted(snapshot.items())
+    }
@@ -6,7 +6,9 @@ SAFETY: This engine provides EDUCATIONAL risk awareness only.
 It does NOT diagnose, prescribe, or modify doses.
 """
 
-from db import query
+from queries import iter_run, register, run, run_one
+from knowledge import snapshot_version
+from timeline import WINDOW_CLAUSE, RECENT_DAYS, recent_params
 
 # ──────────────────────────────────────────────
 # Constants
@@ -21,6 +23,117 @@ DISCLAIMER = (
 RISK_PRIORITY = {"red": 3, "yellow": 2, "green": 1}
 
 
+# ──────────────────────────────────────────────
+# Flag Records
+# ──────────────────────────────────────────────
+
+# Level / type codes. DB values are mapped onto these objects so every
+# flag shares one string per code instead of a fresh copy per row.
+LEVEL_RED = "red"
+LEVEL_YELLOW = "yellow"
+LEVEL_GREEN = "green"
+_LEVELS = {LEVEL_RED: LEVEL_RED, LEVEL_YELLOW: LEVEL_YELLOW, LEVEL_GREEN: LEVEL_GREEN}
+
+FLAG_ADR = "adr"
+FLAG_INTERACTION = "interaction"
+FLAG_ALCOHOL = "alcohol"
+FLAG_ELDERLY = "elderly"
+FLAG_AMR = "amr"
+FLAG_MISSED_DOSES = "missed_doses"
+
+# JSON keys per flag type, in output order ("sources" is built from .source)
+_FLAG_FIELDS = {
+    FLAG_ADR: ("type", "level", "drug", "symptom", "severity", "advice", "is_emergency", "sources"),
+    FLAG_INTERACTION: ("type", "level", "drug_a", "drug_b", "mechanism", "message", "sources"),
+    FLAG_ALCOHOL: ("type", "level", "drug", "trigger", "message", "sources"),
+    FLAG_ELDERLY: ("type", "level", "drug", "message", "sources"),
+    FLAG_AMR: ("type", "level", "drug", "message", "aware_category", "sources"),
+    FLAG_MISSED_DOSES: ("type", "level", "drug", "missed", "message", "sources"),
+}
+
+
+def _level(value):
+    """Map a DB level string onto the shared level code."""
+    return _LEVELS.get(value, value)
+
+
+class Flag:
+    """
+    A single risk finding.
+
+    Slotted record instead of a dict per flag; converted with to_dict()
+    only at the JSON boundary. Supports read-only mapping access
+    (flag["level"], flag.get("message")) limited to the keys its type
+    emits, so it behaves exactly like the dict it replaces.
+    """
+
+    __slots__ = (
+        "type", "level", "source", "drug", "drug_a", "drug_b", "symptom",
+        "severity", "advice", "is_emergency", "mechanism", "message",
+        "trigger", "aware_category", "missed",
+    )
+
+    def __init__(self, type, level, source, drug=None, drug_a=None, drug_b=None,
+                 symptom=None, severity=None, advice=None, is_emergency=None,
+                 mechanism=None, message=None, trigger=None, aware_category=None,
+                 missed=None):
+        self.type = type
+        self.level = _level(level)
+        self.source = source
+        self.drug = drug
+        self.drug_a = drug_a
+        self.drug_b = drug_b
+        self.symptom = symptom
+        self.severity = severity
+        self.advice = advice
+        self.is_emergency = is_emergency
+        self.mechanism = mechanism
+        self.message = message
+        self.trigger = trigger
+        self.aware_category = aware_category
+        self.missed = missed
+
+    @property
+    def sources(self):
+        return [self.source]
+
+    def keys(self):
+        return _FLAG_FIELDS[self.type]
+
+    def __contains__(self, key):
+        return key in _FLAG_FIELDS[self.type]
+
+    def __getitem__(self, key):
+        if key not in _FLAG_FIELDS[self.type]:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        if key not in _FLAG_FIELDS[self.type]:
+            return default
+        return getattr(self, key)
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in _FLAG_FIELDS[self.type]}
+
+    def __eq__(self, other):
+        if isinstance(other, Flag):
+            return self.to_dict() == other.to_dict()
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Flag({self.to_dict()!r})"
+
+
+def json_default(o):
+    """`default=` hook for stdlib json.dumps of results that hold Flags."""
+    if isinstance(o, Flag):
+        return o.to_dict()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
 # ──────────────────────────────────────────────
 # Core Risk Assessment
 # ──────────────────────────────────────────────
@@ -29,61 +142,101 @@ RISK_PRIORITY = {"red": 3, "yellow": 2, "green": 1}
 # Clinical Synthesis (The "Doctor-like" Logic)
 # ──────────────────────────────────────────────
 
+# Red-flag sentence templates per flag type; anything else uses _RED_DEFAULT.
+_RED_TEMPLATES = {
+    FLAG_INTERACTION: "Concurrent use of {drug_a} and {drug_b} ({note}).",
+    FLAG_ALCOHOL: "Strictly avoid alcohol with {drug} ({note}).",
+    FLAG_AMR: "Antibiotic Stewardship: {note}.",
+}
+_RED_DEFAULT = "{drug}: {note}."
+
+_SUMMARY_NONE = "No significant pharmacological risks detected based on current data matches."
+_SUMMARY_RED_HEADER = "**CRITICAL ATTENTION REQUIRED:**"
+_SUMMARY_YELLOW_HEADER = "**Clinical Management Notes:**"
+_SUMMARY_CLOSING = {
+    LEVEL_RED: "**Recommendation:** Review prescription safety immediately with the prescribing physician.",
+    LEVEL_YELLOW: "**Recommendation:** Proceed with caution and monitor for specified symptoms.",
+}
+
+# Rendered summary bullets: red flags keyed by (type, drug, partner, level,
+# note), yellow notes by (LEVEL_YELLOW, drug, notes). Flag text comes from
+# the knowledge tables, so the cache is bounded by knowledge size and
+# dropped whenever the knowledge snapshot reloads.
+_FRAGMENT_CACHE = {}
+_FRAGMENT_CACHE_MAX = 4096
+_fragment_cache_version = None
+
+
+def _flag_note(f):
+    """The human-readable detail a summary line uses for a flag."""
+    if f.type == FLAG_INTERACTION or f.type == FLAG_ALCOHOL or f.type == FLAG_AMR:
+        return f.message
+    return f.message or f.advice or f.symptom
+
+
+def _cached_fragment(key, render):
+    global _fragment_cache_version
+    version = snapshot_version()
+    if version != _fragment_cache_version or len(_FRAGMENT_CACHE) >= _FRAGMENT_CACHE_MAX:
+        _FRAGMENT_CACHE.clear()
+        _fragment_cache_version = version
+
+    fragment = _FRAGMENT_CACHE.get(key)
+    if fragment is None:
+        fragment = _FRAGMENT_CACHE[key] = render()
+    return fragment
+
+
+def _red_fragment(f, note):
+    template = _RED_TEMPLATES.get(f.type, _RED_DEFAULT)
+    return _cached_fragment(
+        (f.type, f.drug or f.drug_a, f.drug_b, f.level, note),
+        lambda: "• " + template.format(drug=f.drug, drug_a=f.drug_a, drug_b=f.drug_b, note=note),
+    )
+
+
+def _notes_fragment(drug, notes):
+    notes = tuple(notes)
+    return _cached_fragment((LEVEL_YELLOW, drug, notes), lambda: f"• {drug}: {'; '.join(notes)}.")
+
+
 def generate_clinical_summary(flags, overall_level):
     """
     Synthesizes a cohesive, professional clinical narrative from raw risk flags.
     Mimics a doctor's thought process by prioritizing and grouping issues.
+
+    One pass over the flags: red issues and each drug's grouped yellow
+    notes become cached bullets; the result is a single join.
     """
     if not flags:
-        return "No significant pharmacological risks detected based on current data matches."
+        return _SUMMARY_NONE
 
-    summary_parts = []
-    
-    # 1. CRITICIAL / RED FLAGS (Immediate Attention)
-    red_flags = [f for f in flags if f["level"] == "red"]
-    if red_flags:
-        part = "**CRITICAL ATTENTION REQUIRED:**"
-        unique_issues = set()
-        for f in red_flags:
-            if f["type"] == "interaction":
-                unique_issues.add(f"Concurrent use of {f['drug_a']} and {f['drug_b']} ({f.get('message', 'Serious Interaction')}).")
-            elif f["type"] == "alcohol":
-                unique_issues.add(f"Strictly avoid alcohol with {f['drug']} ({f.get('message')}).")
-            elif f["type"] == "amr":
-                unique_issues.add(f"Antibiotic Stewardship: {f.get('message')}.")
-            else:
-                unique_issues.add(f"{f['drug']}: {f.get('message') or f.get('advice') or f.get('symptom')}.")
-        
-        for issue in unique_issues:
-            part += f"\n• {issue}"
-        summary_parts.append(part)
-
-    # 2. WARNING / YELLOW FLAGS (Management)
-    yellow_flags = [f for f in flags if f["level"] == "yellow"]
-    if yellow_flags:
-        part = "**Clinical Management Notes:**"
-        # Group by drug to sound more natural
-        drug_notes = {}
-        for f in yellow_flags:
-            d = f.get("drug") or f.get("drug_a") # fallback for interaction
-            if d not in drug_notes: drug_notes[d] = []
-            
-            msg = f.get('message') or f.get('advice') or f.get('symptom')
-            if msg and msg not in drug_notes[d]:
-                drug_notes[d].append(msg)
-
-        for drug, notes in drug_notes.items():
-            combined = "; ".join(notes)
-            part += f"\n• {drug}: {combined}."
-        summary_parts.append(part)
-
-    # 3. CONCLUDING REMARK
-    if overall_level == "red":
-        summary_parts.append("\n**Recommendation:** Review prescription safety immediately with the prescribing physician.")
-    elif overall_level == "yellow":
-        summary_parts.append("\n**Recommendation:** Proceed with caution and monitor for specified symptoms.")
-
-    return "\n".join(summary_parts)
+    red_lines = {}    # ordered set of rendered bullets
+    drug_notes = {}   # drug -> ordered set of notes
+    for f in flags:
+        if f.level == LEVEL_RED:
+            red_lines[_red_fragment(f, _flag_note(f))] = None
+        elif f.level == LEVEL_YELLOW:
+            # Group by drug to sound more natural (drug_a for interactions)
+            notes = drug_notes.setdefault(f.drug or f.drug_a, {})
+            note = f.message or f.advice or f.symptom
+            if note:
+                notes[note] = None
+
+    lines = []
+    if red_lines:
+        lines.append(_SUMMARY_RED_HEADER)
+        lines.extend(red_lines)
+    if drug_notes:
+        lines.append(_SUMMARY_YELLOW_HEADER)
+        lines.extend(_notes_fragment(drug, notes) for drug, notes in drug_notes.items())
+
+    closing = _SUMMARY_CLOSING.get(overall_level)
+    if closing:
+        lines.append("")
+        lines.append(closing)
+
+    return "\n".join(lines)
 
 
 def check_risk(drug_ids, user_age=None, report_alcohol=False, missed_doses_map=None):
@@ -103,42 +256,52 @@ def check_risk(drug_ids, user_age=None, report_alcohol=False, missed_doses_map=N
         missed_doses_map = {}
 
     flags = []
-    sources = set()
-    overall_level = "green"
-
-    # Resolve IDs to Molecules first (for report quality)
-    # Actually, the helpers do query internally. 
+    is_elderly = bool(user_age and user_age >= 65)
 
     for drug_id in drug_ids:
-        # ── ADR Risk ──
-        adr_flags = _check_adr_risk(drug_id)
-        flags.extend(adr_flags)
-
-        # ── Alcohol Interactions ──
-        if report_alcohol:
-            alc_flags = _check_alcohol_risk(drug_id)
-            flags.extend(alc_flags)
-
-        # ── Elderly Caution ──
-        if user_age and user_age >= 65:
-            elderly_flags = _check_elderly_caution(drug_id)
-            flags.extend(elderly_flags)
-
-        # ── AMR / Missed Doses ──
-        if drug_id in missed_doses_map:
-            amr_flags = _check_amr_risk(drug_id, missed_doses_map[drug_id])
-            flags.extend(amr_flags)
+        flags.extend(drug_risk_flags(drug_id, is_elderly, report_alcohol, missed_doses_map.get(drug_id)))
 
     # ── Drug-Drug Interactions ──
     if len(drug_ids) >= 2:
         interaction_flags = check_interactions(drug_ids)
         flags.extend(interaction_flags)
 
+    return build_risk_result(flags)
+
+
+def drug_risk_flags(drug_id, is_elderly=False, report_alcohol=False, missed_doses=None):
+    """
+    All single-drug flags for one drug (everything except interactions).
+    missed_doses=None means no adherence data, so AMR checks are skipped.
+    """
+    # ── ADR Risk ──
+    flags = _check_adr_risk(drug_id)
+
+    # ── Alcohol Interactions ──
+    if report_alcohol:
+        flags.extend(_check_alcohol_risk(drug_id))
+
+    # ── Elderly Caution ──
+    if is_elderly:
+        flags.extend(_check_elderly_caution(drug_id))
+
+    # ── AMR / Missed Doses ──
+    if missed_doses is not None:
+        flags.extend(_check_amr_risk(drug_id, missed_doses))
+
+    return flags
+
+
+def build_risk_result(flags):
+    """Overall level, sources and clinical narrative for a list of flags."""
+    overall_level = LEVEL_GREEN
+    sources = set()
+
     # ── Determine overall risk level ──
     for f in flags:
-        if RISK_PRIORITY.get(f["level"], 0) > RISK_PRIORITY.get(overall_level, 0):
-            overall_level = f["level"]
-        sources.update(f.get("sources", []))
+        if RISK_PRIORITY.get(f.level, 0) > RISK_PRIORITY.get(overall_level, 0):
+            overall_level = f.level
+        sources.add(f.source)
     
     # ── Generate Synthesis ──
     clinical_analysis = generate_clinical_summary(flags, overall_level)
@@ -162,27 +325,17 @@ def _check_adr_risk(drug_id):
     flags = []
     # New Schema: drug_adr_map (drug_id, adr_id, level, advice, source)
     # adr_master (adr_id, symptom_layman, severity, ...)
-    rows = query("""
-        SELECT dam.level, dam.advice, dam.source,
-               am.symptom_layman, am.severity,
-               dm.molecule
-        FROM drug_adr_map dam
-        JOIN adr_master am ON dam.adr_id = am.adr_id
-        JOIN drug_master dm ON dam.drug_id = dm.drug_id
-        WHERE dam.drug_id = ?
-    """, (drug_id,))
+    rows = run("adr.flags", (drug_id,))
 
     for row in rows:
-        flags.append({
-            "type": "adr",
-            "level": row["level"],
-            "drug": row["molecule"],
-            "symptom": row["symptom_layman"],
-            "severity": row["severity"],
-            "advice": row["advice"],
-            "is_emergency": (row["severity"] == 'serious'), # mapped from string
-            "sources": [row["source"]],
-        })
+        flags.append(Flag(
+            FLAG_ADR, row["level"], row["source"],
+            drug=row["molecule"],
+            symptom=row["symptom_layman"],
+            severity=row["severity"],
+            advice=row["advice"],
+            is_emergency=(row["severity"] == 'serious'), # mapped from string
+        ))
     return flags
 
 
@@ -202,44 +355,46 @@ def check_interactions(drug_ids):
                 continue
             checked.add(pair)
 
-            # New schema has interaction_id, drug_a, drug_b, mechanism, clinical_effect, severity, source
-            # Note: drug_a/drug_b in DB are NAMES (e.g. 'Ibuprofen'), not IDs?
-            # Let's check the Schema... The schema says "drug_a TEXT NOT NULL".
-            # The inserts use NAMES like 'Ibuprofen'.
-            # So we first need to get the MOLECULE names for the IDs.
-            
-            mol_a_row = query("SELECT molecule FROM drug_master WHERE drug_id = ?", (d_a,))
-            mol_b_row = query("SELECT molecule FROM drug_master WHERE drug_id = ?", (d_b,))
-            
-            if not mol_a_row or not mol_b_row:
-                continue
-                
-            mol_a = mol_a_row[0]["molecule"]
-            mol_b = mol_b_row[0]["molecule"]
-
-            rows = query("""
-                SELECT * FROM drug_interaction_master
-                WHERE (drug_a = ? AND drug_b = ?)
-                   OR (drug_a = ? AND drug_b = ?)
-            """, (mol_a, mol_b, mol_b, mol_a))
-
-            for row in rows:
-                # Map severity 'serious' -> 'red', 'moderate' -> 'yellow'
-                level = "green"
-                if row["severity"] == "serious":
-                    level = "red"
-                elif row["severity"] == "moderate":
-                    level = "yellow"
-
-                flags.append({
-                    "type": "interaction",
-                    "level": level,
-                    "drug_a": row["drug_a"],
-                    "drug_b": row["drug_b"],
-                    "mechanism": row["mechanism"],
-                    "message": row["clinical_effect"], # Use clinical_effect as message
-                    "sources": [row["source"]],
-                })
+            flags.extend(pair_interaction_flags(d_a, d_b))
+    return flags
+
+
+def pair_interaction_flags(d_a, d_b):
+    """Drug-drug interaction flags for a single pair of drug IDs."""
+    flags = []
+
+    # New schema has interaction_id, drug_a, drug_b, mechanism, clinical_effect, severity, source
+    # Note: drug_a/drug_b in DB are NAMES (e.g. 'Ibuprofen'), not IDs?
+    # Let's check the Schema... The schema says "drug_a TEXT NOT NULL".
+    # The inserts use NAMES like 'Ibuprofen'.
+    # So we first need to get the MOLECULE names for the IDs.
+    
+    mol_a_row = run_one("drug.molecule", (d_a,))
+    mol_b_row = run_one("drug.molecule", (d_b,))
+    
+    if not mol_a_row or not mol_b_row:
+        return flags
+        
+    mol_a = mol_a_row["molecule"]
+    mol_b = mol_b_row["molecule"]
+
+    rows = run("interaction.pair", (mol_a, mol_b, mol_b, mol_a))
+
+    for row in rows:
+        # Map severity 'serious' -> 'red', 'moderate' -> 'yellow'
+        level = LEVEL_GREEN
+        if row["severity"] == "serious":
+            level = LEVEL_RED
+        elif row["severity"] == "moderate":
+            level = LEVEL_YELLOW
+
+        flags.append(Flag(
+            FLAG_INTERACTION, level, row["source"],
+            drug_a=row["drug_a"],
+            drug_b=row["drug_b"],
+            mechanism=row["mechanism"],
+            message=row["clinical_effect"], # Use clinical_effect as message
+        ))
     return flags
 
 
@@ -253,26 +408,20 @@ def _check_alcohol_risk(drug_id):
     
     # Need molecule name? No, schema says 'drug TEXT NOT NULL'. 
     # Inserts use 'Metronidazole'. So yes, we need molecule name.
-    mol_row = query("SELECT molecule FROM drug_master WHERE drug_id = ?", (drug_id,))
+    mol_row = run_one("drug.molecule", (drug_id,))
     if not mol_row:
         return []
-    molecule = mol_row[0]["molecule"]
+    molecule = mol_row["molecule"]
 
-    rows = query("""
-        SELECT risk_level, message, source, trigger
-        FROM food_alcohol_interactions
-        WHERE drug = ? AND trigger = 'Alcohol'
-    """, (molecule,))
+    rows = run("alcohol.by_molecule", (molecule,))
 
     for row in rows:
-        flags.append({
-            "type": "alcohol",
-            "level": row["risk_level"],
-            "drug": molecule,
-            "trigger": row["trigger"],
-            "message": row["message"],
-            "sources": [row["source"]],
-        })
+        flags.append(Flag(
+            FLAG_ALCOHOL, row["risk_level"], row["source"],
+            drug=molecule,
+            trigger=row["trigger"],
+            message=row["message"],
+        ))
     return flags
 
 
@@ -284,23 +433,17 @@ def _check_elderly_caution(drug_id):
     """Check elderly-specific cautions using 'avoid_in' column."""
     flags = []
     # New schema: avoid_in
-    rows = query("""
-        SELECT drug_id, molecule, avoid_in, source
-        FROM drug_master
-        WHERE drug_id = ?
-    """, (drug_id,))
+    rows = run("drug.elderly", (drug_id,))
 
     for row in rows:
         avoid = row["avoid_in"]
         if avoid and ("elderly" in avoid.lower() or "avoid" in avoid.lower() or "severe" in avoid.lower()):
              # If exact 'elderly' isn't mentioned, we still flag severe warnings for seniors as caution
-            flags.append({
-                "type": "elderly",
-                "level": "yellow",
-                "drug": row["molecule"],
-                "message": f"Caution: {avoid}",
-                "sources": [row["source"]],
-            })
+            flags.append(Flag(
+                FLAG_ELDERLY, LEVEL_YELLOW, row["source"],
+                drug=row["molecule"],
+                message=f"Caution: {avoid}",
+            ))
     return flags
 
 
@@ -313,55 +456,47 @@ def _check_amr_risk(drug_id, missed_doses):
     flags = []
     
     # Get molecule name for AMR lookup
-    mol_row = query("SELECT molecule FROM drug_master WHERE drug_id = ?", (drug_id,))
+    mol_row = run_one("drug.molecule", (drug_id,))
     if not mol_row:
         return []
-    molecule = mol_row[0]["molecule"]
+    molecule = mol_row["molecule"]
 
     # Check AMR risk level (amr_risk_master uses molecule name as PK)
-    amr_rows = query("""
-        SELECT * FROM amr_risk_master WHERE drug = ?
-    """, (molecule,))
+    amr_rows = run("amr.by_molecule", (molecule,))
 
     for row in amr_rows:
         if row["amr_risk"] == "high":
-            flags.append({
-                "type": "amr",
-                "level": "red",
-                "drug": molecule,
-                "message": f"High AMR Risk ({row['who_aware_category']}): {row['common_misuse'] or 'Avoid overuse'}",
-                "aware_category": row["who_aware_category"],
-                "sources": [row["source"]],
-            })
+            flags.append(Flag(
+                FLAG_AMR, LEVEL_RED, row["source"],
+                drug=molecule,
+                message=f"High AMR Risk ({row['who_aware_category']}): {row['common_misuse'] or 'Avoid overuse'}",
+                aware_category=row["who_aware_category"],
+            ))
         elif row["amr_risk"] == "medium":
-            flags.append({
-                "type": "amr",
-                "level": "yellow",
-                "drug": molecule,
-                "message": f"AMR Risk ({row['who_aware_category']}): {row['common_misuse'] or 'Complete full course'}",
-                "aware_category": row["who_aware_category"],
-                "sources": [row["source"]],
-            })
+            flags.append(Flag(
+                FLAG_AMR, LEVEL_YELLOW, row["source"],
+                drug=molecule,
+                message=f"AMR Risk ({row['who_aware_category']}): {row['common_misuse'] or 'Complete full course'}",
+                aware_category=row["who_aware_category"],
+            ))
 
     # Check missed doses against rules
     # Note: antibiotic_misuse_rules table schema changed slightly? 
     # condition, recommendation, level, source
     if missed_doses >= 2:
         # Just hardcode the matching logic to the known rules for simplicity in prototype
-        rules = query("SELECT * FROM antibiotic_misuse_rules WHERE level='red'")
+        rules = run("amr.red_rules")
         # Try to find a generic missed dose rule or default
         msg = "Missing doses increases resistance risk. Please complete your course."
         if rules:
             msg = rules[0]["recommendation"] # simplistic pick
 
-        flags.append({
-            "type": "missed_doses",
-            "level": "red",
-            "drug": molecule,
-            "missed": missed_doses,
-            "message": msg,
-            "sources": ["ICMR"],
-        })
+        flags.append(Flag(
+            FLAG_MISSED_DOSES, LEVEL_RED, "ICMR",
+            drug=molecule,
+            missed=missed_doses,
+            message=msg,
+        ))
 
     return flags
 
@@ -374,7 +509,7 @@ def amr_monitor(drug_id, missed_doses=0):
     """
     Standalone AMR monitoring for an antibiotic.
     """
-    drug_info = query("SELECT * FROM drug_master WHERE drug_id = ?", (drug_id,))
+    drug_info = run("drug.by_id", (drug_id,))
     if not drug_info:
         return {"error": f"Drug {drug_id} not found", "disclaimer": DISCLAIMER}
 
@@ -391,10 +526,10 @@ def amr_monitor(drug_id, missed_doses=0):
         }
 
     flags = _check_amr_risk(drug_id, missed_doses)
-    overall = "green"
+    overall = LEVEL_GREEN
     for f in flags:
-        if RISK_PRIORITY.get(f["level"], 0) > RISK_PRIORITY.get(overall, 0):
-            overall = f["level"]
+        if RISK_PRIORITY.get(f.level, 0) > RISK_PRIORITY.get(overall, 0):
+            overall = f.level
 
     return {
         "drug": drug["molecule"],
@@ -415,7 +550,7 @@ def explain_risk(drug_id):
     """
     Get comprehensive explainable risk profile for a drug.
     """
-    drug_info = query("SELECT * FROM drug_master WHERE drug_id = ?", (drug_id,))
+    drug_info = run("drug.by_id", (drug_id,))
     if not drug_info:
         return {"error": f"Drug {drug_id} not found", "disclaimer": DISCLAIMER}
 
@@ -423,23 +558,10 @@ def explain_risk(drug_id):
     molecule = drug["molecule"]
 
     # Get all ADRs
-    adrs = query("""
-        SELECT am.symptom_layman, am.severity, am.frequency,
-               dam.level, dam.advice, dam.source
-        FROM drug_adr_map dam
-        JOIN adr_master am ON dam.adr_id = am.adr_id
-        WHERE dam.drug_id = ?
-        ORDER BY CASE dam.level
-            WHEN 'red' THEN 1 WHEN 'yellow' THEN 2 ELSE 3
-        END
-    """, (drug_id,))
+    adrs = run("adr.explain", (drug_id,))
 
     # Get food/alcohol interactions
-    food_interactions = query("""
-        SELECT trigger, risk_level, message, source
-        FROM food_alcohol_interactions
-        WHERE drug = ?
-    """, (molecule,))
+    food_interactions = run("food.by_molecule", (molecule,))
 
     # Get evidence citations (Legacy: evidence_map replaced by source columns in tables)
     # We can perform a dynamic collection or just output sources from queries above.
@@ -482,32 +604,44 @@ def explain_risk(drug_id):
 # Behavioral Pattern Analysis (Longitudinal)
 # ──────────────────────────────────────────────
 
-def analyze_user_behavior(user_id="default"):
-    """
-    Analyze user's medicine timeline for behavioral patterns.
-    Returns a list of behavioral insights/warnings.
-    """
-    insights = []
-    
-    # Get user's active/recent timeline
-    rows = query("""
-        SELECT t.drug_id, t.start_date, t.missed_doses, 
-               dm.molecule, dm.drug_class, dm.common_use
+# One row per user: pill burden plus the offending molecules (in timeline
+# order) for each adherence rule, aggregated in SQLite instead of Python.
+# Only courses active or ended within the analysis window are considered.
+_BEHAVIOR_SQL = """
+    SELECT user_id,
+           COUNT(*) AS med_count,
+           group_concat(CASE WHEN is_antibiotic AND missed > 0 THEN molecule END, char(31))
+               AS missed_antibiotics,
+           group_concat(CASE WHEN NOT is_antibiotic AND missed >= 3 THEN molecule END, char(31))
+               AS frequent_misses
+    FROM (
+        SELECT t.user_id, dm.molecule, t.missed_doses AS missed,
+               COALESCE(dm.drug_class, '') LIKE '%antibiotic%' AS is_antibiotic
         FROM user_medicine_timeline t
         JOIN drug_master dm ON t.drug_id = dm.drug_id
-        WHERE t.user_id = ?
-    """, (user_id,))
+        WHERE {where}
+        ORDER BY t.user_id, t.id
+    )
+    GROUP BY user_id
+"""
+
+_NO_HISTORY = [{
+    "type": "info",
+    "title": "No History",
+    "message": "Start adding medicines to track your daily health patterns.",
+    "level": "green"
+}]
+
+
+def _split_molecules(value):
+    return value.split("\x1f") if value else []
 
-    if not rows:
-        return [{
-            "type": "info",
-            "title": "No History",
-            "message": "Start adding medicines to track your daily health patterns.",
-            "level": "green"
-        }]
+
+def _behavior_insights(active_med_count, missed_antibiotics, frequent_misses):
+    """Turn one user's aggregated counts into insight cards."""
+    insights = []
 
     # 1. Polypharmacy Check
-    active_med_count = len(rows)
     if active_med_count >= 5:
         insights.append({
             "type": "behavior",
@@ -517,18 +651,6 @@ def analyze_user_behavior(user_id="default"):
         })
 
     # 2. Adherence Check
-    missed_antibiotics = []
-    frequent_misses = []
-
-    for row in rows:
-        is_antibiotic = "antibiotic" in row["drug_class"].lower()
-        missed = row["missed_doses"]
-        
-        if is_antibiotic and missed > 0:
-            missed_antibiotics.append(row["molecule"])
-        elif missed >= 3:
-            frequent_misses.append(row["molecule"])
-
     if missed_antibiotics:
         insights.append({
             "type": "critical",
@@ -557,6 +679,62 @@ def analyze_user_behavior(user_id="default"):
     return insights
 
 
+def _insights_from_row(row):
+    return _behavior_insights(
+        row["med_count"],
+        _split_molecules(row["missed_antibiotics"]),
+        _split_molecules(row["frequent_misses"]),
+    )
+
+
+_USER_BEHAVIOR = register(
+    "behavior.user", _BEHAVIOR_SQL.format(where=f"t.user_id = :user_id AND {WINDOW_CLAUSE}")
+)
+_POPULATION_BEHAVIOR = register("behavior.population", _BEHAVIOR_SQL.format(where=WINDOW_CLAUSE))
+
+
+def analyze_user_behavior(user_id="default", days=RECENT_DAYS):
+    """
+    Analyze user's medicine timeline for behavioral patterns.
+    Returns a list of behavioral insights/warnings.
+    """
+    params = recent_params(days)
+    params["user_id"] = user_id
+    rows = run(_USER_BEHAVIOR, params)
+    if not rows:
+        return [dict(card) for card in _NO_HISTORY]
+    return _insights_from_row(rows[0])
+
+
+def behavior_insights_for_courses(courses):
+    """
+    analyze_user_behavior() over timeline rows the caller already loaded
+    (list_courses() columns, same window), without another query.
+    """
+    if not courses:
+        return [dict(card) for card in _NO_HISTORY]
+    missed_antibiotics, frequent_misses = [], []
+    for course in sorted(courses, key=lambda c: c["id"]):
+        missed = course["missed_doses"] or 0
+        if course["molecule"] is None:
+            continue
+        if course["is_antibiotic"]:
+            if missed > 0:
+                missed_antibiotics.append(course["molecule"])
+        elif missed >= 3:
+            frequent_misses.append(course["molecule"])
+    return _behavior_insights(len(courses), missed_antibiotics, frequent_misses)
+
+
+def analyze_population_behavior(days=RECENT_DAYS):
+    """
+    Behavioral insights for every user with a timeline, in one pass.
+    Returns {user_id: [insights]} (clinician dashboard).
+    """
+    rows = iter_run(_POPULATION_BEHAVIOR, recent_params(days))
+    return {row["user_id"]: _insights_from_row(row) for row in rows}
+
+
 # ──────────────────────────────────────────────
 # Quick Demo
 # ──────────────────────────────────────────────
@@ -0,0 +1,249 @@
+"""
+MEDGUARD — Incremental User Risk State
+Per-user risk assessment kept up to date as the timeline changes.
+
+Only courses active today count (see timeline.py). Adding a medicine
+computes only its interactions with the drugs already present (O(n));
+removing one drops the affected flags; an adherence update invalidates
+one drug, whose flags are recomputed on the next read. Reads assemble
+the cached flags, matching check_risk() over the same regimen. States
+are kept for the MAX_STATES most recently used users.
+
+Every hook gets the user's change sequence as of its own write (read in
+the write's transaction) and applies the write only if the cache was
+current just before it; a write by another process or connection in
+between drops the state, and the next read rebuilds it.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import db
+from queries import register, run, run_one, transaction
+from risk_engine import build_risk_result, drug_risk_flags, pair_interaction_flags
+from timeline import WINDOW_CLAUSE, active_params, current_seq, is_active, today_iso
+
+# Users whose state stays cached per process (least recently used dropped)
+MAX_STATES = int(os.environ.get("MEDGUARD_RISK_STATES", "10000"))
+
+# (db path, user_id) -> UserRiskState, in LRU order
+_STATES = OrderedDict()
+_STATES_LOCK = threading.Lock()
+
+
+def _is_elderly(user_age):
+    return bool(user_age and user_age >= 65)
+
+
+class UserRiskState:
+    """
+    Cached flags for one user's active confirmed courses.
+
+    Entries mirror user_medicine_timeline rows in id order. Drug flags are
+    cached per distinct drug and variant (elderly or not, alcohol reported
+    or not), using the latest entry's missed doses as check_risk's
+    missed_doses_map does, and interaction flags per pair. Callers pass
+    different ages (request, profile, default) and only the dashboard
+    asks for alcohol flags, so every variant is cached side by side
+    rather than switched.
+    """
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.lock = threading.RLock()
+        self.entries = {}        # timeline_id -> [drug_id, missed_doses]
+        self.drug_flags = {}     # (drug_id, is_elderly, report_alcohol) -> [Flag], filled on read
+        self.pair_flags = {}     # (drug_id, drug_id) sorted -> [Flag], non-empty only
+        self.fingerprint = None
+        self._results = {}       # (is_elderly, report_alcohol) -> risk result
+
+    # ── Mutations ──
+
+    def add(self, timeline_id, drug_id, missed_doses=0):
+        """Add one course: its own flags plus pairs against existing drugs."""
+        with self.lock:
+            present = {d for d, _ in self.entries.values()}
+            self.entries[timeline_id] = [drug_id, missed_doses]
+            self._drop_drug(drug_id)
+            if drug_id not in present:
+                for other in present:
+                    flags = pair_interaction_flags(other, drug_id)
+                    if flags:
+                        self.pair_flags[tuple(sorted((other, drug_id)))] = flags
+            self._results.clear()
+
+    def remove(self, timeline_id):
+        """Drop one course; its drug's flags go when no other course uses it."""
+        with self.lock:
+            entry = self.entries.pop(timeline_id, None)
+            if entry is None:
+                return
+            drug_id = entry[0]
+            self._drop_drug(drug_id)
+            if not any(d == drug_id for d, _ in self.entries.values()):
+                for pair in [p for p in self.pair_flags if drug_id in p]:
+                    del self.pair_flags[pair]
+            self._results.clear()
+
+    def update_missed(self, timeline_id, missed_doses):
+        """Adherence changed for one course — recompute that drug only."""
+        with self.lock:
+            entry = self.entries.get(timeline_id)
+            if entry is None or entry[1] == missed_doses:
+                return
+            entry[1] = missed_doses
+            self._drop_drug(entry[0])
+            self._results.clear()
+
+    def _drop_drug(self, drug_id):
+        for key in [k for k in self.drug_flags if k[0] == drug_id]:
+            del self.drug_flags[key]
+
+    def _flags_for(self, drug_id, variant):
+        key = (drug_id,) + variant
+        flags = self.drug_flags.get(key)
+        if flags is None:
+            # Latest course wins, like /ai/advice's missed_doses_map
+            missed = {d: m for d, m in self.entries.values()}.get(drug_id)
+            flags = self.drug_flags[key] = drug_risk_flags(drug_id, *variant, missed)
+        return flags
+
+    # ── Reads ──
+
+    def drug_ids(self):
+        with self.lock:
+            return [d for d, _ in self.entries.values()]
+
+    def total_missed(self):
+        with self.lock:
+            return sum(m for _, m in self.entries.values())
+
+    def result(self, user_age=None, report_alcohol=False):
+        """Risk result for the current regimen (same shape as check_risk)."""
+        variant = (_is_elderly(user_age), bool(report_alcohol))
+        with self.lock:
+            result = self._results.get(variant)
+            if result is None:
+                drug_ids = [d for d, _ in self.entries.values()]
+                flags = []
+                for drug_id in drug_ids:
+                    flags.extend(self._flags_for(drug_id, variant))
+
+                # Interactions in check_interactions' pair order
+                first_pos = {}
+                for i, drug_id in enumerate(drug_ids):
+                    first_pos.setdefault(drug_id, i)
+                for pair in sorted(self.pair_flags, key=lambda p: sorted(first_pos[d] for d in p)):
+                    flags.extend(self.pair_flags[pair])
+
+                result = self._results[variant] = build_risk_result(flags)
+            return dict(result)
+
+
+# ──────────────────────────────────────────────
+# Registry
+# ──────────────────────────────────────────────
+
+_ACTIVE_COURSES = register("risk_state.active_courses", f"""
+    SELECT id, drug_id, missed_doses FROM user_medicine_timeline
+    WHERE user_id = :user_id AND confirmed = 1 AND {WINDOW_CLAUSE}
+    ORDER BY id
+""")
+
+
+def _active_params(user_id):
+    params = active_params()
+    params["user_id"] = user_id
+    return params
+
+
+def _timeline_fingerprint(user_id):
+    """
+    Changes whenever any process edits the user's timeline (per-user change
+    sequence), or when the day rolls over (courses start and end by date).
+    """
+    return (today_iso(), current_seq(user_id))
+
+
+def _build_state(user_id):
+    state = UserRiskState(user_id)
+    # One read transaction: the sequence matches the rows loaded
+    with transaction():
+        seq = run_one("timeline.seq", (user_id,))
+        rows = run(_ACTIVE_COURSES, _active_params(user_id))
+    for row in rows:
+        state.add(row["id"], row["drug_id"], row["missed_doses"])
+    state.fingerprint = (today_iso(), seq["seq"] if seq else 0)
+    return state
+
+
+def get_user_risk_state(user_id):
+    """Cached risk state for a user, rebuilt if the timeline changed elsewhere."""
+    key = (db.DB_PATH, user_id)
+    state = _cached_state(user_id)
+    if state is not None and state.fingerprint == _timeline_fingerprint(user_id):
+        return state
+
+    state = _build_state(user_id)
+    with _STATES_LOCK:
+        _STATES[key] = state
+        _STATES.move_to_end(key)
+        while len(_STATES) > MAX_STATES:
+            _STATES.popitem(last=False)
+    return state
+
+
+def _cached_state(user_id):
+    key = (db.DB_PATH, user_id)
+    with _STATES_LOCK:
+        state = _STATES.get(key)
+        if state is not None:
+            _STATES.move_to_end(key)
+        return state
+
+
+def _apply_write(user_id, seq, change):
+    """
+    Apply one of this process's timeline writes, which took the user's
+    change sequence to `seq`, to the cached state. Only valid when the
+    cache has seen everything before it (seq - 1); otherwise another
+    process wrote in between, so the state is dropped and rebuilt on the
+    next read.
+    """
+    key = (db.DB_PATH, user_id)
+    state = _cached_state(user_id)
+    if state is None:
+        return
+    with state.lock:
+        if state.fingerprint == (today_iso(), seq - 1):
+            if change is not None:
+                change(state)
+            state.fingerprint = (today_iso(), seq)
+            return
+    with _STATES_LOCK:
+        if _STATES.get(key) is state:
+            del _STATES[key]
+
+
+def on_medicine_added(user_id, timeline_id, drug_id, seq, start_date=None, end_date=None):
+    """Timeline hook: a confirmed course was inserted (change sequence now `seq`)."""
+    if is_active(start_date, end_date):
+        _apply_write(user_id, seq, lambda state: state.add(timeline_id, drug_id, 0))
+    else:
+        _apply_write(user_id, seq, None)
+
+
+def on_medicine_removed(user_id, timeline_id, seq):
+    """Timeline hook: a course was removed or ended."""
+    _apply_write(user_id, seq, lambda state: state.remove(timeline_id))
+
+
+def on_doses_changed(user_id, timeline_id, missed_doses, seq):
+    """Timeline hook: taken/missed counters changed for a course."""
+    _apply_write(user_id, seq, lambda state: state.update_missed(timeline_id, missed_doses))
+
+
+def on_course_updated(user_id, seq):
+    """Timeline hook: a course changed without affecting risk (e.g. symptoms)."""
+    _apply_write(user_id, seq, None)
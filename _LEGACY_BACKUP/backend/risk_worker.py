@@ -0,0 +1,136 @@
+"""
+MEDGUARD — Background Risk Worker
+Event-driven recomputation of each user's risk assessment.
+
+Write endpoints (add medicine, log adherence, symptoms, profile) call
+notify() and return immediately. A small pool of worker threads drains
+the queue, recomputes risk + behavior insights, and stores the result in
+the user_risk_state table, which read endpoints simply fetch.
+
+Bursts coalesce: while a user is already queued, further events for
+that user are dropped, and an event that arrives mid-computation
+schedules exactly one follow-up run.
+"""
+
+import json
+import os
+import queue
+import threading
+from datetime import datetime
+
+from queries import run_one, run_write
+from risk_engine import analyze_user_behavior, json_default
+from risk_state import get_user_risk_state
+from timeline import today_iso
+
+# Worker threads per process.
+WORKER_THREADS = int(os.environ.get("MEDGUARD_RISK_WORKERS", "2"))
+
+
+def recompute_user_state(user_id):
+    """Recompute and persist one user's risk state. Returns the stored row."""
+    profile = run_one("profile.age", (user_id,))
+    user_age = profile["age"] if profile else None
+
+    risk = get_user_risk_state(user_id).result(user_age=user_age)
+    insights = analyze_user_behavior(user_id)
+    row = {
+        "user_id": user_id,
+        "risk_level": risk["risk_level"],
+        "risk_json": json.dumps(risk, default=json_default),
+        "insights_json": json.dumps(insights, default=json_default),
+        "updated_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    run_write("risk_state.save", row)
+    return row
+
+
+def get_stored_state(user_id):
+    """
+    Precomputed {risk, insights, updated_at} for a user.
+    Computed inline the first time a user is seen (nothing stored yet),
+    and on the first read of a new day, since courses start and end by date.
+    """
+    row = run_one("risk_state.by_user", (user_id,))
+    if row is None or row["updated_at"][:10] != today_iso():
+        row = recompute_user_state(user_id)
+    return {
+        "risk": json.loads(row["risk_json"]),
+        "insights": json.loads(row["insights_json"]),
+        "updated_at": row["updated_at"],
+    }
+
+
+# ──────────────────────────────────────────────
+# Queue + Worker Pool
+# ──────────────────────────────────────────────
+
+class RiskWorkerPool:
+    """Coalescing per-user job queue drained by daemon threads."""
+
+    def __init__(self, threads=WORKER_THREADS):
+        self.num_threads = max(1, threads)
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.pending = set()   # users queued, not yet picked up
+        self.running = set()   # users being recomputed right now
+        self._pid = None
+
+    def _ensure_started(self):
+        # Threads don't survive fork(): each prefork worker starts its own.
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        for i in range(self.num_threads):
+            threading.Thread(target=self._run, name=f"risk-worker-{i}", daemon=True).start()
+
+    def submit(self, user_id):
+        with self.lock:
+            self._ensure_started()
+            if user_id in self.pending:
+                return  # coalesced into the queued run
+            self.pending.add(user_id)
+            if user_id in self.running:
+                return  # re-queued when the current run finishes
+            self.queue.put(user_id)
+
+    def _run(self):
+        while True:
+            user_id = self.queue.get()
+            with self.lock:
+                self.pending.discard(user_id)
+                self.running.add(user_id)
+            try:
+                recompute_user_state(user_id)
+            except Exception as e:
+                print(f"[MEDGUARD] Risk recomputation failed for {user_id}: {e}")
+            finally:
+                with self.lock:
+                    self.running.discard(user_id)
+                    if user_id in self.pending:
+                        self.queue.put(user_id)
+                self.queue.task_done()
+
+    def join(self):
+        """Block until every queued event has been processed."""
+        self.queue.join()
+
+
+_POOL = RiskWorkerPool()
+
+
+def notify(user_id):
+    """A user's timeline or profile changed — schedule recomputation."""
+    _POOL.submit(user_id)
+
+
+def notify_timeline(timeline_id):
+    """Same as notify() for endpoints that only know the timeline row."""
+    row = run_one("timeline.owner", (timeline_id,))
+    if row is not None:
+        notify(row["user_id"])
+
+
+def wait_idle():
+    """Wait for the queue to drain (tests, graceful shutdown)."""
+    _POOL.join()
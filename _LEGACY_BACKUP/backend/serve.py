@@ -0,0 +1,229 @@
+"""
+MEDGUARD — Production Launcher
+Prefork server: one master, N worker processes sharing a listening socket.
+
+    python serve.py --workers 4 --threads 8 --port 5050
+
+The master initializes the database and loads the knowledge snapshot
+(OCR name table, search index, ...) BEFORE forking, so workers share
+those pages copy-on-write. Each worker runs werkzeug's threaded server
+with at most --threads requests in flight (MEDGUARD_WORKER_THREADS), so
+a slow request (OCR, a cold advice build) holds one thread, not the
+worker; further connections wait in the listen backlog. Signals (Unix
+only):
+
+    SIGHUP           reload snapshot, start fresh workers, retire old ones
+    SIGTERM/SIGINT   graceful shutdown (in-flight requests complete)
+"""
+
+import argparse
+import gc
+import os
+import random
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+# Ensure backend directory is on path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from werkzeug.serving import ThreadedWSGIServer
+
+from api import app, update_schema_on_startup
+from knowledge import load_snapshot
+
+# Seconds a retiring worker gets to finish before it is killed.
+GRACEFUL_TIMEOUT = 30
+
+# Delay before replacing a crashed worker, so a broken build can't fork-bomb.
+RESPAWN_BACKOFF = 1.0
+
+# Requests each worker handles concurrently.
+WORKER_THREADS = int(os.environ.get("MEDGUARD_WORKER_THREADS", "8"))
+
+
+# ──────────────────────────────────────────────
+# Worker
+# ──────────────────────────────────────────────
+
+class _WorkerServer(ThreadedWSGIServer):
+    """
+    Threaded server with at most `threads` requests in flight. Request
+    threads are joined on close, so a retiring worker finishes them.
+    """
+
+    daemon_threads = False
+    block_on_close = True
+
+    def __init__(self, *args, threads=WORKER_THREADS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._slots = threading.BoundedSemaphore(threads)
+
+    def process_request(self, request, client_address):
+        self._slots.acquire()  # at the limit: stop accepting until one finishes
+        try:
+            super().process_request(request, client_address)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self._slots.release()
+
+
+def _run_worker(listen_sock, host, port, wsgi_app, threads):
+    """Serve requests on the inherited socket until SIGTERM."""
+    # Forked workers would otherwise share the master's RNG state
+    random.seed()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    server = _WorkerServer(host, port, wsgi_app, fd=listen_sock.fileno(), threads=threads)
+
+    def _graceful(signum, frame):
+        # shutdown() blocks until serve_forever returns, so call it off-thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, _graceful)
+    server.serve_forever(poll_interval=0.5)
+    server.server_close()
+    os._exit(0)
+
+
+# ──────────────────────────────────────────────
+# Master
+# ──────────────────────────────────────────────
+
+class Master:
+    """Forks, supervises and reloads worker processes."""
+
+    def __init__(self, listen_sock, host, port, workers, wsgi_app=app, threads=WORKER_THREADS):
+        self.listen_sock = listen_sock
+        self.host = host
+        self.port = port
+        self.num_workers = workers
+        self.wsgi_app = wsgi_app
+        self.threads = threads
+        self.workers = set()
+        self.retiring = {}  # pid -> deadline
+        self._reload = False
+        self._stop = False
+        self._respawn_after = 0.0
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _run_worker(self.listen_sock, self.host, self.port, self.wsgi_app, self.threads)
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                os._exit(1)
+        self.workers.add(pid)
+
+    def _preload(self):
+        version = load_snapshot()
+        # Move preloaded objects out of GC tracking so collections in
+        # workers don't write to (and un-share) their pages.
+        gc.freeze()
+        print(f"[MEDGUARD] Knowledge snapshot v{version} loaded (pid {os.getpid()}).")
+
+    def _retire(self, pids):
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT
+        for pid in pids:
+            self.workers.discard(pid)
+            self.retiring[pid] = deadline
+            self._signal(pid, signal.SIGTERM)
+
+    @staticmethod
+    def _signal(pid, sig):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def _reap(self):
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid in self.retiring:
+                del self.retiring[pid]
+            elif pid in self.workers:
+                self.workers.discard(pid)
+                self._respawn_after = time.monotonic() + RESPAWN_BACKOFF
+                print(f"[MEDGUARD] Worker {pid} exited unexpectedly.")
+
+        now = time.monotonic()
+        for pid, deadline in list(self.retiring.items()):
+            if now > deadline:
+                self._signal(pid, signal.SIGKILL)
+
+    def run(self):
+        signal.signal(signal.SIGHUP, lambda *_: setattr(self, "_reload", True))
+        signal.signal(signal.SIGTERM, lambda *_: setattr(self, "_stop", True))
+        signal.signal(signal.SIGINT, lambda *_: setattr(self, "_stop", True))
+
+        self._preload()
+        for _ in range(self.num_workers):
+            self._spawn()
+        print(f"[MEDGUARD] Master {os.getpid()} running {self.num_workers} workers.")
+
+        while not self._stop:
+            if self._reload:
+                self._reload = False
+                print("[MEDGUARD] SIGHUP — reloading knowledge snapshot...")
+                gc.unfreeze()
+                self._preload()
+                old = set(self.workers)
+                for _ in range(self.num_workers):
+                    self._spawn()
+                self._retire(old)
+
+            self._reap()
+            # Replace crashed workers
+            if time.monotonic() >= self._respawn_after:
+                while len(self.workers) < self.num_workers and not self._stop:
+                    self._spawn()
+            time.sleep(0.5)
+
+        print("[MEDGUARD] Shutting down workers...")
+        self._retire(set(self.workers))
+        while self.retiring:
+            self._reap()
+            time.sleep(0.1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MEDGUARD production server")
+    parser.add_argument("--host", default=os.environ.get("MEDGUARD_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("MEDGUARD_PORT", "5050")))
+    parser.add_argument("--workers", type=int,
+                        default=int(os.environ.get("MEDGUARD_WORKERS", "0")) or os.cpu_count() or 1)
+    parser.add_argument("--threads", type=int, default=WORKER_THREADS, help="concurrent requests per worker")
+    args = parser.parse_args()
+
+    update_schema_on_startup()
+
+    listen_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listen_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listen_sock.bind((args.host, args.port))
+    listen_sock.listen(128)
+    listen_sock.set_inheritable(True)
+
+    print(f"[MEDGUARD] Listening on http://{args.host}:{args.port}")
+    Master(listen_sock, args.host, args.port, args.workers, threads=max(1, args.threads)).run()
+    listen_sock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+MEDGUARD — Symptom Matcher
+Maps free-text symptom reports ("Headache, Nausia and dizzy") to
+adr_master entries and flags the ones known for the user's drugs.
+
+The index (normalized symptom_layman / medical_term → ADR, plus
+drug_adr_map) is built once per database and reloaded with the
+knowledge snapshot, so matching in the /medicine/symptoms write path
+never reads the knowledge tables. Each symptom is an exact hash lookup
+first; the rest fall back to one edit-distance (ratio) scan over the
+whole ADR names, and fuzzy results are memoized. Only misspellings pass
+the fallback: partial scorers such as WRatio send "back pain" to Stomach
+pain and "high blood sugar" to Low blood sugar.
+"""
+
+import re
+import threading
+
+from rapidfuzz import fuzz, process
+
+import db
+from db import query
+
+# Fuzzy fallback threshold (ratio on the whole symptom): "vomitting" →
+# Vomiting, "skin rashes" → Skin rash
+SYMPTOM_MIN_SCORE = 85
+
+# Fuzzy results remembered per index (cleared when full)
+MEMO_SIZE = 4096
+
+# "Headache, Nausea and dizziness" → headache / nausea / dizziness
+_SYMPTOM_SPLIT = re.compile(r"[,;/\n]+|\band\b|&", re.IGNORECASE)
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+# Per database path, like ocr_pipeline's name tables
+_INDEXES = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def normalize_symptom(text):
+    return _NON_ALNUM.sub(" ", (text or "").lower()).strip()
+
+
+def symptom_tokens(text):
+    """Distinct normalized symptoms in a free-text report, in order."""
+    tokens = (normalize_symptom(part) for part in _SYMPTOM_SPLIT.split(text or ""))
+    return list(dict.fromkeys(t for t in tokens if t))
+
+
+# ──────────────────────────────────────────────
+# Index
+# ──────────────────────────────────────────────
+
+class SymptomIndex:
+    """adr_master names and drug_adr_map, shaped for per-report lookups."""
+
+    def __init__(self, adrs, drug_adrs):
+        self.adrs = {a["adr_id"]: a for a in adrs}
+        self.exact = {}
+        for a in adrs:  # layman names first: they win a clash with a medical term
+            self.exact.setdefault(normalize_symptom(a["symptom_layman"]), a["adr_id"])
+        for a in adrs:
+            self.exact.setdefault(normalize_symptom(a["medical_term"]), a["adr_id"])
+        self.exact.pop("", None)
+        self.names = list(self.exact)
+        # (drug_id, adr_id) → drug_adr_map row
+        self.drug_adrs = {(m["drug_id"], m["adr_id"]): m for m in drug_adrs}
+        self._memo = {}
+
+    def match(self, symptom):
+        """(adr_id, "exact" | "fuzzy", score) for a normalized symptom, or None."""
+        adr_id = self.exact.get(symptom)
+        if adr_id is not None:
+            return adr_id, "exact", 100.0
+        try:
+            return self._memo[symptom]
+        except KeyError:
+            pass
+        best = process.extractOne(symptom, self.names, scorer=fuzz.ratio, score_cutoff=SYMPTOM_MIN_SCORE)
+        hit = (self.exact[best[0]], "fuzzy", round(best[1], 1)) if best else None
+        if len(self._memo) >= MEMO_SIZE:
+            self._memo.clear()
+        self._memo[symptom] = hit
+        return hit
+
+
+def load_symptom_index(refresh=False):
+    """The current database's SymptomIndex (built on first use)."""
+    key = db.DB_PATH
+    index = _INDEXES.get(key)
+    if index is not None and not refresh:
+        return index
+    index = SymptomIndex(
+        query("SELECT adr_id, symptom_layman, medical_term, severity FROM adr_master ORDER BY adr_id"),
+        query("SELECT drug_id, adr_id, level, advice FROM drug_adr_map"),
+    )
+    with _INDEXES_LOCK:
+        _INDEXES[key] = index
+    return index
+
+
+# ──────────────────────────────────────────────
+# Matching
+# ──────────────────────────────────────────────
+
+def match_symptom(symptom):
+    """
+    adr_id for one normalized symptom that names an ADR exactly, or None.
+    Stored counters only take exact names; fuzzy hits are shown, not kept.
+    """
+    return load_symptom_index().exact.get(symptom)
+
+
+def match_symptoms(text):
+    """
+    Every symptom in a report with its ADR match:
+    [{symptom, adr_id, symptom_layman, medical_term, severity, match, score}]
+    (adr_id / match None when nothing is close enough).
+    """
+    index = load_symptom_index()
+    matches = []
+    for symptom in symptom_tokens(text):
+        hit = index.match(symptom)
+        adr = index.adrs[hit[0]] if hit else {}
+        matches.append({
+            "symptom": symptom,
+            "adr_id": adr.get("adr_id"),
+            "symptom_layman": adr.get("symptom_layman"),
+            "medical_term": adr.get("medical_term"),
+            "severity": adr.get("severity"),
+            "match": hit[1] if hit else None,
+            "score": hit[2] if hit else None,
+        })
+    return matches
+
+
+def flag_likely_adrs(matches, drug_ids):
+    """
+    Matched symptoms that drug_adr_map lists as an ADR of one of the
+    user's drugs: [{drug_id, adr_id, symptom, symptom_layman, severity,
+    level, advice}], most severe level first.
+    """
+    index = load_symptom_index()
+    flags = []
+    for m in matches:
+        if m["adr_id"] is None:
+            continue
+        for drug_id in dict.fromkeys(drug_ids):
+            known = index.drug_adrs.get((drug_id, m["adr_id"]))
+            if known is not None:
+                flags.append({
+                    "drug_id": drug_id,
+                    "adr_id": m["adr_id"],
+                    "symptom": m["symptom"],
+                    "symptom_layman": m["symptom_layman"],
+                    "severity": m["severity"],
+                    "level": known["level"],
+                    "advice": known["advice"],
+                })
+    order = {"red": 0, "yellow": 1, "green": 2}
+    flags.sort(key=lambda f: order.get(f["level"], 3))
+    return flags
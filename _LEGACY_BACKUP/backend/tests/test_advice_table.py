@@ -0,0 +1,104 @@
+"""
+MEDGUARD — Advice Table Tests
+Tests the precomputed advice lookup against the live rules.
+"""
+
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import ai_advisor
+from advice_table import (
+    AdviceTable, TABLE_SIZE, build_advice_table, enumerate_contexts, table_index,
+)
+
+
+def _rules_many(contexts):
+    return [ai_advisor.rule_based_advice(c) for c in contexts]
+
+
+class TestAdviceTable:
+    """Every covered context answers exactly like the rules."""
+
+    def test_matches_rules_over_whole_space(self):
+        table = build_advice_table(_rules_many)
+        positions = set()
+        for context in enumerate_contexts():
+            position = table_index(context)
+            positions.add(position)
+            _, advice = table.lookup(context)
+            assert advice == ai_advisor.rule_based_advice(context)
+        assert positions == set(range(TABLE_SIZE))
+        assert len(table.responses) < 1000
+
+    def test_coverage_and_extra_features(self):
+        base = {"current_risk_level": "red", "risk_types": ["ADR"], "medications": ["D009", "Metformin"],
+                "user_profile": {"age": 72, "diet": "Veg"}}
+        assert table_index(base) == table_index(dict(base, medications=["Metformin"]))
+        assert table_index(dict(base, user_mode="robot")) is None
+        assert table_index(dict(base, adherence_summary={"missed_doses_last_3_days": 12})) is None
+        assert table_index(dict(base, user_profile={"occupation": "Pilot"})) is None
+
+    def test_tagged_lookup_and_round_trip(self, tmp_path):
+        table = build_advice_table(_rules_many, version="v1")
+        path = str(tmp_path / "advice_table.json")
+        table.save(path)
+        loaded = AdviceTable.load(path)
+        assert list(loaded.index) == list(table.index)
+
+        context = {"current_risk_level": "yellow", "risk_types": ["Behavior"],
+                   "adherence_summary": {"missed_doses_last_3_days": 3}}
+        ai_advisor.set_advice_table(loaded)
+        try:
+            advice, etag = ai_advisor.get_ai_advice_tagged(context)
+            assert advice == ai_advisor.rule_based_advice(context)
+            assert etag == f"v1-{loaded.index[table_index(context)]}"
+            advice["what_to_do_now"].append("mutated")
+            assert ai_advisor.get_ai_advice(context) == ai_advisor.rule_based_advice(context)
+            assert ai_advisor.get_ai_advice_tagged({"user_mode": "robot"})[1] is None
+        finally:
+            ai_advisor.set_advice_table(None)
+
+    def test_version_follows_response_text(self):
+        table = build_advice_table(_rules_many)
+
+        def _edited_many(contexts):
+            answers = _rules_many(contexts)
+            for advice in answers:
+                advice["assistant_message"] = advice["assistant_message"].replace("safe", "fine")
+            return answers
+
+        edited = build_advice_table(_edited_many)
+        assert len(edited.responses) == len(table.responses)
+        assert edited.version != table.version
+        assert build_advice_table(_rules_many).version == table.version
+
+    def test_reload_reuses_unchanged_rules_table(self, tmp_path):
+        from advice_table import load_advice_table
+        missing = str(tmp_path / "none.json")
+        try:
+            first = load_advice_table(missing)
+            assert first is not None and load_advice_table(missing) is first
+        finally:
+            ai_advisor.set_advice_table(None)
+
+    def test_table_loads_on_first_lookup(self, monkeypatch):
+        import advice_table
+        table = build_advice_table(_rules_many, version="v1")
+        loads = []
+
+        def fake_load():
+            loads.append(1)
+            ai_advisor.set_advice_table(table)
+
+        monkeypatch.setattr(advice_table, "load_advice_table", fake_load)
+        monkeypatch.setattr(ai_advisor, "_TABLE_SET", False)
+        try:
+            context = {"current_risk_level": "green"}
+            assert ai_advisor.get_ai_advice_tagged(context)[1].startswith("v1-")
+            ai_advisor.get_ai_advice_tagged(context)
+            assert loads == [1]
+        finally:
+            ai_advisor.set_advice_table(None)
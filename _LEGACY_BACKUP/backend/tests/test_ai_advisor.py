@@ -0,0 +1,56 @@
+"""
+MEDGUARD — AI Advisor Tests
+Tests the compiled advice rule table.
+"""
+
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from ai_advisor import get_ai_advice, get_ai_advice_bulk, decision_key, _INDEX
+
+
+class TestAdviceRules:
+    """Scenario priority, additive extras and senior variants."""
+
+    def test_red_interaction_senior(self):
+        advice = get_ai_advice({
+            "user_mode": "senior",
+            "current_risk_level": "red",
+            "risk_types": ["AMR", "Interaction"],
+            "user_profile": {"occupation": "Manual Labor"},
+        })
+        assert advice["assistant_message"] == (
+            "I have identified a potential mix between your medicines that requires attention."
+        )
+        assert advice["what_to_do_now"] == [
+            "Please show this screen to your doctor or family member.",
+            "Given your active job, stay hydrated, especially with these meds.",
+        ]
+        assert advice["one_line_dashboard_summary"] == (
+            "Status: RED - I have identified a potential mix between your medicines that requires attention."
+        )
+        assert advice["senior_support"]["enabled"] is True
+
+    def test_missed_doses_filled_in(self):
+        advice = get_ai_advice({
+            "current_risk_level": "yellow",
+            "risk_types": ["Behavior"],
+            "adherence_summary": {"missed_doses_last_3_days": 4},
+            "user_profile": {"diet": "Veg"},
+            "medications": ["Metformin"],
+        })
+        assert advice["why_this_happened"] == ["You missed 4 doses in the last 3 days."]
+        assert advice["what_to_do_now"] == [
+            "Setting a daily alarm might be helpful.",
+            "Vegetarians on Metformin should monitor Vitamin B12 levels.",
+        ]
+
+    def test_green_and_bulk(self):
+        contexts = [{"adherence_summary": {"missed_doses_last_3_days": n}} for n in (0, 2)]
+        first, second = get_ai_advice_bulk(contexts)
+        assert first["why_this_happened"][-1] == "You have excellent adherence!"
+        assert second["why_this_happened"] == ["No immediate interactions or risks detected."]
+        assert decision_key({"user_mode": "robot"}) in _INDEX
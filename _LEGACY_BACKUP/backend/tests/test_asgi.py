@@ -0,0 +1,116 @@
+"""
+MEDGUARD — ASGI Bridge Tests
+Tests the ASGI → WSGI translation with an in-process scope/receive/send client.
+"""
+
+import sys
+import os
+import asyncio
+import json
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+import db as medguard_db
+
+
+@pytest.fixture(autouse=True)
+def setup_test_db(tmp_path, monkeypatch):
+    """Create a fresh test database; the bridge starts and stops per test."""
+    test_db = str(tmp_path / "test_medguard.db")
+    medguard_db.DB_PATH = test_db
+    medguard_db.init_db(test_db)
+    import api
+    import asgi
+    monkeypatch.setattr(api, "DB_PATH", test_db)  # startup migration target
+    monkeypatch.setattr(asgi, "OCR_PROCESSES", 1)
+    yield test_db
+    asgi._shutdown()
+
+
+def _run(scope, messages):
+    """One ASGI connection: `messages` feed receive(); returns everything sent."""
+    from asgi import application
+    inbox, sent = list(messages), []
+
+    async def receive():
+        if inbox:
+            return inbox.pop(0)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    return sent
+
+
+def _http(method, path, query=b"", headers=(), chunks=(b"",)):
+    scope = {
+        "type": "http", "http_version": "1.1", "method": method, "scheme": "http",
+        "path": path, "root_path": "", "query_string": query,
+        "headers": [(k.encode(), v.encode()) for k, v in headers],
+        "server": ("testserver", 80), "client": ("127.0.0.1", 5000),
+    }
+    messages = [
+        {"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+        for i, chunk in enumerate(chunks)
+    ]
+    sent = _run(scope, messages)
+    start, body = sent[0], sent[1:]
+    assert start["type"] == "http.response.start"
+    assert body[-1] == {"type": "http.response.body", "body": b"", "more_body": False}
+    return start["status"], dict(start["headers"]), b"".join(m["body"] for m in body)
+
+
+class TestASGIBridge:
+    """Flask routes served through the ASGI entry point."""
+
+    def test_get_with_query_string_starts_lazily(self):
+        import asgi
+        assert asgi._view_executor is None  # no lifespan events
+        status, headers, body = _http("GET", "/drugs/search", query=b"q=para&limit=1")
+        assert status == 200 and headers[b"content-type"] == b"application/json"
+        result = json.loads(body)
+        assert result["query"] == "para" and result["count"] == 1
+        assert asgi._view_executor is not None
+
+    def test_chunked_post_body(self):
+        payload = json.dumps({"drug_id": "D001", "user_id": "asgi", "start_date": "2026-01-01"}).encode()
+        status, _, body = _http(
+            "POST", "/medicine",
+            headers=[("content-type", "application/json"), ("transfer-encoding", "chunked")],
+            chunks=[payload[:10], payload[10:25], payload[25:]],
+        )
+        assert status == 200 and json.loads(body)["success"]
+        rows = medguard_db.query("SELECT drug_id, start_date FROM user_medicine_timeline WHERE user_id = 'asgi'")
+        assert rows == [{"drug_id": "D001", "start_date": "2026-01-01"}]
+
+    def test_lifespan_startup_and_shutdown(self):
+        import asgi
+        import ocr_pipeline
+        sent = []
+
+        async def lifespan():
+            from asgi import application
+            inbox = asyncio.Queue()
+
+            async def send(message):
+                sent.append(message)
+                if message["type"] == "lifespan.startup.complete":
+                    # Running: the pools are up and OCR uses the process pool
+                    assert asgi._view_executor is not None
+                    assert ocr_pipeline._OCR_EXECUTOR is asgi._ocr_executor is not None
+                    await inbox.put({"type": "lifespan.shutdown"})
+
+            await inbox.put({"type": "lifespan.startup"})
+            await application({"type": "lifespan"}, inbox.get, send)
+
+        asyncio.run(lifespan())
+        assert [m["type"] for m in sent] == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+        assert asgi._view_executor is None and ocr_pipeline._OCR_EXECUTOR is None
+
+    def test_websocket_is_rejected(self):
+        sent = _run({"type": "websocket", "path": "/ws"}, [{"type": "websocket.connect"}])
+        assert sent == [{"type": "websocket.close", "code": 1008}]
@@ -0,0 +1,77 @@
+"""
+MEDGUARD — Dashboard Tests
+Tests the combined home-screen payload and its per-user cache.
+"""
+
+import sys
+import os
+from datetime import date, timedelta
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+import db as medguard_db
+
+
+@pytest.fixture(autouse=True)
+def setup_test_db(tmp_path):
+    """Create a fresh test database for each test."""
+    test_db = str(tmp_path / "test_medguard.db")
+    medguard_db.DB_PATH = test_db
+    medguard_db.init_db(test_db)
+    yield test_db
+
+
+def _day(offset):
+    return (date.today() + timedelta(days=offset)).isoformat()
+
+
+def _add(user_id, drug_id, start, end, missed=0):
+    return medguard_db.execute(
+        "INSERT INTO user_medicine_timeline (user_id, drug_id, start_date, end_date, missed_doses, confirmed) "
+        "VALUES (?, ?, ?, ?, ?, 1)",
+        (user_id, drug_id, start, end, missed),
+    )
+
+
+class TestDashboard:
+    """One load, same answers as the individual endpoints, cached until a change."""
+
+    def test_matches_individual_views(self):
+        from dashboard import get_dashboard
+        from risk_engine import analyze_user_behavior
+        from risk_state import get_user_risk_state
+        from timeline import RECENT_DAYS, list_courses, recent_params
+        _add("u1", "D004", _day(-3), _day(4), missed=2)   # antibiotic, missed
+        _add("u1", "D002", _day(-20), _day(-10), missed=4)
+        _add("u1", "D009", _day(-90), _day(-60))          # outside the window
+
+        payload, _ = get_dashboard("u1", user_age=70)
+        timeline, _ = list_courses("u1", recent_params(RECENT_DAYS))
+        assert [r["id"] for r in payload["timeline"]] == [r["id"] for r in timeline]
+        assert payload["insights"] == analyze_user_behavior("u1")
+        assert payload["risk"] == get_user_risk_state("u1").result(user_age=70, report_alcohol=True)
+        assert payload["advice"]["one_line_dashboard_summary"].startswith("Status: RED")
+
+    def test_risk_includes_alcohol_warnings(self):
+        from dashboard import get_dashboard
+        _add("u3", "D007", _day(-1), _day(5))  # Metronidazole
+        payload, _ = get_dashboard("u3", user_age=70)
+        alcohol = [f for f in payload["risk"]["flags"] if f["type"] == "alcohol"]
+        assert alcohol and alcohol[0]["drug"] == "Metronidazole"
+
+    def test_cached_until_mutation(self):
+        from dashboard import get_dashboard
+        _add("u2", "D001", _day(-1), _day(5))
+        first, etag = get_dashboard("u2")
+        again, same_etag = get_dashboard("u2")
+        assert again is first and same_etag == etag
+
+        _add("u2", "D003", _day(-1), _day(5))
+        changed, new_etag = get_dashboard("u2")
+        assert changed["count"] == 2 and new_etag != etag
+
+        medguard_db.execute("INSERT INTO user_profile (user_id, diet) VALUES ('u2', 'Veg')")
+        assert get_dashboard("u2")[1] not in (etag, new_etag)
+        assert get_dashboard("u2", mode="senior")[0]["advice"]["senior_support"]["enabled"] is True
@@ -0,0 +1,59 @@
+"""
+MEDGUARD — Drug Search Unit Tests
+Tests prefix, word-prefix and typo-tolerant typeahead ranking.
+"""
+
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+import db as medguard_db
+
+
+@pytest.fixture(autouse=True)
+def setup_test_db(tmp_path):
+    """Create a fresh test database for each test."""
+    test_db = str(tmp_path / "test_medguard.db")
+    medguard_db.DB_PATH = test_db
+    medguard_db.init_db(test_db)
+    yield test_db
+
+
+class TestDrugSearch:
+    """Typeahead search over molecules and brands."""
+
+    def test_exact_brand_ranks_first(self):
+        from drug_search import search_drug_names
+        results = search_drug_names("Dolo 650")
+        assert results[0]["name"] == "Dolo 650"
+        assert results[0]["match_type"] == "exact"
+        assert results[0]["drug_id"] == "D001"
+
+    def test_prefix_matches_molecule_and_brands(self):
+        from drug_search import search_drug_names
+        names = [r["name"] for r in search_drug_names("amo")]
+        assert "Amoxicillin" in names
+        assert "Amoxiclav" in names
+
+    def test_word_prefix(self):
+        from drug_search import search_drug_names
+        names = [r["name"] for r in search_drug_names("650")]
+        assert "Dolo 650" in names
+
+    def test_typo_tolerance(self):
+        from drug_search import search_drug_names
+        results = search_drug_names("azithromicin")
+        assert results and results[0]["name"] == "Azithromycin"
+        assert results[0]["match_type"] == "fuzzy"
+
+    def test_shares_ocr_name_table(self):
+        from drug_search import get_search_index
+        from ocr_pipeline import load_name_table
+        assert get_search_index().entries is load_name_table()
+
+    def test_empty_query(self):
+        from drug_search import search_drug_names
+        assert search_drug_names("  ") == []
@@ -0,0 +1,75 @@
+"""
+MEDGUARD — Per-Drug Statistics Tests
+Tests that trigger- and report-maintained counters match a full rebuild.
+"""
+
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+import db as medguard_db
+
+
+@pytest.fixture(autouse=True)
+def setup_test_db(tmp_path):
+    """Create a fresh test database with the statistics triggers installed."""
+    test_db = str(tmp_path / "test_medguard.db")
+    medguard_db.DB_PATH = test_db
+    medguard_db.init_db(test_db)
+    medguard_db.execute("ALTER TABLE user_medicine_timeline ADD COLUMN symptoms TEXT")
+    medguard_db.execute("ALTER TABLE user_medicine_timeline ADD COLUMN taken_doses INTEGER DEFAULT 0")
+    from drug_stats import install_drug_stats
+    install_drug_stats(test_db)
+    yield test_db
+
+
+def _add_course(user_id, drug_id):
+    return medguard_db.execute(
+        "INSERT INTO user_medicine_timeline (user_id, drug_id, start_date) VALUES (?, ?, '2025-01-01')",
+        (user_id, drug_id),
+    )
+
+
+class TestDrugStats:
+    """Counters follow courses, dose logs and symptom reports."""
+
+    def test_courses_users_and_doses(self):
+        from drug_stats import get_drug_stats
+        first = _add_course("u1", "D001")
+        _add_course("u1", "D001")
+        _add_course("u2", "D001")
+        medguard_db.execute("UPDATE user_medicine_timeline SET taken_doses = taken_doses + 3 WHERE id = ?", (first,))
+        medguard_db.execute("UPDATE user_medicine_timeline SET missed_doses = missed_doses + 1 WHERE id = ?", (first,))
+
+        stats = get_drug_stats("D001")
+        assert (stats["users"], stats["courses"]) == (2, 3)
+        assert (stats["taken_doses"], stats["missed_doses"], stats["adherence_rate"]) == (3, 1, 0.75)
+        assert get_drug_stats("D004") is None
+
+    def test_symptom_reports_are_diffed(self):
+        from drug_stats import get_drug_stats, record_symptoms
+        course = _add_course("u1", "D001")
+        assert record_symptoms(course, "Headache, Nausea")
+        assert record_symptoms(course, "Nausea, Vertigo")
+        assert not record_symptoms(9999, "Nausea")
+
+        stats = get_drug_stats("D001")
+        assert stats["symptom_reports"] == 1
+        by_symptom = {s["symptom"]: s for s in stats["symptoms"]}
+        assert set(by_symptom) == {"nausea", "vertigo"}
+        assert by_symptom["nausea"]["adr_id"] == "A001" and by_symptom["nausea"]["known_adr"] == 1
+        assert by_symptom["vertigo"]["adr_id"] == "A009" and by_symptom["vertigo"]["known_adr"] == 0
+
+    def test_rebuild_matches_incremental(self):
+        from drug_stats import get_drug_stats, record_symptoms, rebuild_drug_stats
+        for i in range(6):
+            course = _add_course(f"u{i % 4}", ("D001", "D004")[i % 2])
+            medguard_db.execute("UPDATE user_medicine_timeline SET missed_doses = ? WHERE id = ?", (i, course))
+            record_symptoms(course, "Skin rash" if i % 3 else "")
+        incremental = [get_drug_stats(d) for d in ("D001", "D004")]
+
+        rebuild_drug_stats()
+        assert [get_drug_stats(d) for d in ("D001", "D004")] == incremental
@@ -0,0 +1,93 @@
+"""
+MEDGUARD — Analytics Export Tests
+Tests chunked, incremental CSV export of timelines, dose and symptom events.
+"""
+
+import sys
+import os
+import csv
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+import db as medguard_db
+
+
+@pytest.fixture(autouse=True)
+def setup_test_db(tmp_path):
+    """Create a fresh test database with the dose event log installed."""
+    test_db = str(tmp_path / "test_medguard.db")
+    medguard_db.DB_PATH = test_db
+    medguard_db.init_db(test_db)
+    medguard_db.execute("ALTER TABLE user_medicine_timeline ADD COLUMN taken_doses INTEGER DEFAULT 0")
+    medguard_db.execute("ALTER TABLE user_medicine_timeline ADD COLUMN symptoms TEXT")
+    from export import DOSE_EVENTS_DDL
+    conn = medguard_db.get_connection(test_db)
+    conn.executescript(DOSE_EVENTS_DDL)
+    conn.close()
+    yield test_db
+
+
+def _read(path):
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+class TestExport:
+    """Exports stream in chunks and pick up where the last run stopped."""
+
+    def test_chunks_and_increments(self, tmp_path):
+        from export import export_all
+        out = str(tmp_path / "exports")
+        ids = [medguard_db.execute(
+            "INSERT INTO user_medicine_timeline (user_id, drug_id) VALUES (?, 'D001')", (f"u{i}",)
+        ) for i in range(5)]
+        medguard_db.execute("UPDATE user_medicine_timeline SET taken_doses = 2 WHERE id = ?", (ids[0],))
+
+        first = export_all(out, ["timeline", "dose_events"], fmt="csv", chunk_rows=2)
+        assert first["timeline"]["rows"] == 5 and first["timeline"]["last_rowid"] == ids[-1]
+        assert [r["user_id"] for r in _read(first["timeline"]["path"])] == [f"u{i}" for i in range(5)]
+        events = _read(first["dose_events"]["path"])
+        assert [(e["timeline_id"], e["status"], e["doses"]) for e in events] == [(str(ids[0]), "taken", "2")]
+
+        medguard_db.execute("INSERT INTO user_medicine_timeline (user_id, drug_id) VALUES ('u9', 'D004')")
+        medguard_db.execute("UPDATE user_medicine_timeline SET missed_doses = 1 WHERE id = ?", (ids[1],))
+        second = export_all(out, ["timeline", "dose_events"], fmt="csv")
+        assert [r["user_id"] for r in _read(second["timeline"]["path"])] == ["u9"]
+        assert [e["status"] for e in _read(second["dose_events"]["path"])] == ["missed"]
+
+        third = export_all(out, ["timeline"], fmt="csv")
+        assert third["timeline"] == {"rows": 0, "last_rowid": ids[-1] + 1, "path": None}
+        assert export_all(out, ["timeline"], fmt="csv", full=True)["timeline"]["rows"] == 6
+
+    def test_symptom_reports_between_runs(self, tmp_path):
+        from export import export_all
+        out = str(tmp_path / "exports")
+        course = medguard_db.execute("INSERT INTO user_medicine_timeline (user_id, drug_id) VALUES ('u1', 'D001')")
+        first = export_all(out, ["timeline", "symptom_events"], fmt="csv")
+        assert first["timeline"]["rows"] == 1 and first["symptom_events"]["rows"] == 0
+
+        medguard_db.execute("UPDATE user_medicine_timeline SET symptoms = 'Nausea' WHERE id = ?", (course,))
+        medguard_db.execute("UPDATE user_medicine_timeline SET symptoms = 'Nausea' WHERE id = ?", (course,))
+        medguard_db.execute("UPDATE user_medicine_timeline SET symptoms = 'Nausea, Skin rash' WHERE id = ?", (course,))
+        second = export_all(out, ["timeline", "symptom_events"], fmt="csv")
+        assert second["timeline"]["rows"] == 0
+        events = _read(second["symptom_events"]["path"])
+        assert [(e["timeline_id"], e["user_id"], e["symptoms"]) for e in events] == [
+            (str(course), "u1", "Nausea"), (str(course), "u1", "Nausea, Skin rash"),
+        ]
+
+    def test_risk_flags_one_row_per_flag(self, tmp_path):
+        import json
+        from export import export_all
+        risk = {"flags": [{"type": "adr", "level": "red", "drug": "Diclofenac", "symptom": "Black stool"},
+                          {"type": "interaction", "level": "yellow", "drug_a": "A", "drug_b": "B"}]}
+        medguard_db.execute("INSERT INTO user_risk_state VALUES ('u1', 'red', ?, '[]', '2025-01-01')",
+                            (json.dumps(risk),))
+        medguard_db.execute("INSERT INTO user_risk_state VALUES ('u2', 'green', '{\"flags\": []}', '[]', '2025-01-01')")
+
+        rows = _read(export_all(str(tmp_path), ["risk_flags"], fmt="csv")["risk_flags"]["path"])
+        assert [(r["user_id"], r["flag_type"], r["drug"], r["drug_b"]) for r in rows] == [
+            ("u1", "adr", "Diclofenac", ""), ("u1", "interaction", "A", "B"), ("u2", "", "", ""),
+        ]
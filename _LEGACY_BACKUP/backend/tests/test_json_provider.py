@@ -0,0 +1,79 @@
+"""
+MEDGUARD — JSON Provider Tests
+Tests orjson fast path and stdlib fallback produce the same documents.
+"""
+
+import sys
+import os
+import json
+import sqlite3
+from dataclasses import dataclass
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+from flask import Flask, jsonify
+
+import json_provider
+from json_provider import FastJSONProvider
+
+
+@dataclass
+class _Point:
+    x: int
+    y: int
+
+
+class _Record:
+    def to_dict(self):
+        return {"level": "red", "type": "adr"}
+
+
+def _row():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    row = conn.execute("SELECT 'D001' AS drug_id, 'Paracetamol' AS molecule").fetchone()
+    conn.close()
+    return row
+
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def app(request, monkeypatch):
+    if request.param == "stdlib":
+        monkeypatch.setattr(json_provider, "orjson", None)
+    elif json_provider.orjson is None:
+        pytest.skip("orjson not installed")
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.debug = True  # must still be compact
+    return app
+
+
+class TestFastJSONProvider:
+    """Serialization of rows, records and dataclasses."""
+
+    def test_rows_records_and_dataclasses(self, app):
+        with app.app_context():
+            resp = jsonify({"rows": [_row()], "flag": _Record(), "p": _Point(1, 2), "text": "⚕️"})
+        assert json.loads(resp.get_data()) == {
+            "rows": [{"drug_id": "D001", "molecule": "Paracetamol"}],
+            "flag": {"level": "red", "type": "adr"},
+            "p": {"x": 1, "y": 2},
+            "text": "⚕️",
+        }
+
+    def test_compact_and_sorted(self, app):
+        with app.app_context():
+            resp = jsonify({"b": 1, "a": [1, 2]})
+        assert resp.get_data() == b'{"a":[1,2],"b":1}\n'
+        assert resp.mimetype == "application/json"
+
+    def test_stream_json(self, app):
+        from json_provider import stream_json
+        rows = ({"id": i} for i in range(5))
+        resp = stream_json(app, "rows", rows, lambda count: {"count": count, "z": "end"}, batch_size=2)
+        body = b"".join(chunk.encode() for chunk in resp.response)
+        assert body == b'{"rows":[{"id":0},{"id":1},{"id":2},{"id":3},{"id":4}],"count":5,"z":"end"}\n'
+        empty = "".join(stream_json(app, "rows", iter(())).response)
+        assert json.loads(empty) == {"rows": []}
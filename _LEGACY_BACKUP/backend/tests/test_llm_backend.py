@@ -0,0 +1,85 @@
+"""
+MEDGUARD — LLM Advice Backend Tests
+Tests caching, micro-batching and rule-based fallback of the advice client.
+"""
+
+import sys
+import os
+import time
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from ai_advisor import rule_based_advice
+from llm_backend import AdviceBackend, AdviceClient, normalize_context, parse_model_output
+
+
+class _EchoBackend(AdviceBackend):
+    """Answers with the risk level; records every batch it receives."""
+
+    name = "echo"
+
+    def __init__(self, delay=0.0, output="ok"):
+        self.delay = delay
+        self.output = output
+        self.batches = []
+
+    def generate_batch(self, contexts):
+        self.batches.append(contexts)
+        time.sleep(self.delay)
+        if self.output != "ok":
+            return [None] * len(contexts)
+        return [{
+            "assistant_message": f"Model says {c['current_risk_level']}. Stay safe.",
+            "why_this_happened": ["model"],
+            "what_to_do_now": ["rest"],
+        } for c in contexts]
+
+
+CONTEXT = {"current_risk_level": "red", "risk_types": ["AMR", "Interaction"], "user_mode": "adult"}
+
+
+class TestAdviceClient:
+    """Model answers are cached, batched, and never break the contract."""
+
+    def test_cache_by_normalized_context(self):
+        backend = _EchoBackend()
+        client = AdviceClient(backend, rule_based_advice, timeout=2.0)
+        first = client.advise(CONTEXT)
+        again = client.advise(dict(CONTEXT, risk_types=["Interaction", "AMR", "AMR"]))
+
+        assert first == again
+        assert first["assistant_message"] == "Model says red. Stay safe."
+        assert first["one_line_dashboard_summary"] == "Status: RED - Model says red."
+        assert first["disclaimer"] == rule_based_advice(CONTEXT)["disclaimer"]
+        assert len(backend.batches) == 1
+        assert client.metrics.snapshot()["cache_hits"] == 1
+
+    def test_concurrent_misses_share_a_batch(self):
+        backend = _EchoBackend(delay=0.05)
+        client = AdviceClient(backend, rule_based_advice, timeout=2.0, max_wait=0.05)
+        contexts = [dict(CONTEXT, current_risk_level=level) for level in ("red", "yellow", "green")]
+        results = client.advise_many(contexts)
+
+        assert [r["assistant_message"] for r in results] == [
+            "Model says red. Stay safe.", "Model says yellow. Stay safe.", "Model says green. Stay safe.",
+        ]
+        assert len(backend.batches) == 1 and len(backend.batches[0]) == 3
+
+    def test_timeout_and_invalid_output_fall_back(self):
+        slow = AdviceClient(_EchoBackend(delay=0.3), rule_based_advice, timeout=0.05)
+        assert slow.advise(CONTEXT) == rule_based_advice(CONTEXT)
+        assert slow.metrics.snapshot()["timeouts"] == 1
+
+        broken = AdviceClient(_EchoBackend(output="garbage"), rule_based_advice, timeout=2.0)
+        assert broken.advise(CONTEXT) == rule_based_advice(CONTEXT)
+        assert broken.metrics.snapshot()["invalid_outputs"] == 1
+
+    def test_normalize_and_parse(self):
+        normalized = normalize_context({"user_profile": {"age": 72}, "risk_types": ["b", "a"]})
+        assert normalized["age_group"] == "senior"
+        assert normalized["risk_types"] == ["a", "b"]
+        assert parse_model_output('Sure! {"assistant_message": "Hi.", "what_to_do_now": "Rest"}') == {
+            "assistant_message": "Hi.", "why_this_happened": [], "what_to_do_now": ["Rest"],
+        }
+        assert parse_model_output("no json here") is None
@@ -0,0 +1,80 @@
+"""
+MEDGUARD — Learned OCR Correction Tests
+Tests that confirmed misreadings become a bounded correction map.
+"""
+
+import sys
+import os
+from datetime import date
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+import db as medguard_db
+
+
+@pytest.fixture(autouse=True)
+def setup_test_db(tmp_path):
+    """Create a fresh test database for each test."""
+    test_db = str(tmp_path / "test_medguard.db")
+    medguard_db.DB_PATH = test_db
+    medguard_db.init_db(test_db)
+    from ocr_pipeline import set_correction_map
+    set_correction_map({})
+    yield test_db
+
+
+def _names():
+    from ocr_pipeline import load_name_table
+    return list({e["name"]: e["drug_id"] for e in load_name_table()})
+
+
+class TestLearnedCorrections:
+    """Repeated confirmations short-circuit fuzzy matching."""
+
+    def test_learned_after_confirmations(self):
+        from ocr_corrections import record_correction, load_corrections
+        from ocr_pipeline import match_names
+
+        record_correction("Dol0 65O", "D001", "u1")
+        assert match_names(["Dol0 65O"], _names())["Dol0 65O"][0] != "learned"
+
+        record_correction("DOL0-65O", "D001", "u2")  # same normalized reading
+        tier, top = match_names(["Dol0 65O"], _names())["Dol0 65O"]
+        assert tier == "learned" and top[0] == ("Paracetamol", 100.0)
+        assert len(top) > 1  # fuzzy alternatives still listed
+        assert load_corrections() == {"dol0 65o": "D001"}
+
+    def test_one_user_cannot_teach_everyone(self):
+        from ocr_corrections import record_correction, compile_corrections
+        for _ in range(3):  # same prescription re-submitted
+            record_correction("Dol0 65O", "D001", "u1")
+        assert compile_corrections() == {}
+        rows = medguard_db.query("SELECT confirmations FROM ocr_corrections")
+        assert rows == [{"confirmations": 1}]
+
+    def test_contested_reading_not_learned(self):
+        from ocr_corrections import record_correction, compile_corrections
+        for drug_id, user_id in (("D001", "u1"), ("D004", "u2"), ("D001", "u3"), ("D004", "u4")):
+            record_correction("Amox 5OO", drug_id, user_id)
+        assert compile_corrections() == {}
+
+    def test_bounded_and_compacted(self):
+        from ocr_corrections import compile_corrections, compact_corrections
+        medguard_db.execute("""
+            INSERT INTO ocr_corrections (normalized, drug_id, confirmations, last_confirmed)
+            VALUES ('crocn', 'D001', 5, '2025-01-01'), ('amoxcilin', 'D004', 3, '2025-01-01'),
+                   ('typo', 'D001', 1, '2024-01-01'), ('fresh', 'D001', 1, '2025-01-01')
+        """)
+        medguard_db.execute("""
+            INSERT INTO ocr_correction_users (normalized, drug_id, user_id)
+            VALUES ('crocn', 'D001', 'u1'), ('typo', 'D001', 'u1')
+        """)
+        assert compile_corrections(limit=1) == {"crocn": "D001"}
+
+        assert compact_corrections(max_tracked=2, today=date(2025, 1, 2)) == 2
+        rows = medguard_db.query("SELECT normalized FROM ocr_corrections ORDER BY normalized")
+        assert [r["normalized"] for r in rows] == ["amoxcilin", "crocn"]
+        users = medguard_db.query("SELECT normalized FROM ocr_correction_users")
+        assert users == [{"normalized": "crocn"}]
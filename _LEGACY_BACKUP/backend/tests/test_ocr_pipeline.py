@@ -0,0 +1,140 @@
+"""
+MEDGUARD — OCR Pipeline Tests
+Tests multi-page / batch OCR merging and the single matching pass.
+"""
+
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+import db as medguard_db
+
+
+@pytest.fixture(autouse=True)
+def setup_test_db(tmp_path):
+    """Create a fresh test database for each test."""
+    test_db = str(tmp_path / "test_medguard.db")
+    medguard_db.DB_PATH = test_db
+    medguard_db.init_db(test_db)
+    yield test_db
+
+
+class TestBatchOCR:
+    """Pages are merged and matched once."""
+
+    def test_merge_across_pages(self):
+        from ocr_pipeline import merge_extracted
+        pages = [
+            (0, 0, "Tab. Dolo 650\nCap. Azithral 500 (Azithromycin)"),
+            (0, 1, "TAB DOLO-650"),
+            (1, 0, "Tab. Azithral 500 (Azithromycin)\nSyp. Ascoril"),
+        ]
+        merged = merge_extracted(pages)
+        assert [m["extracted_name"] for m in merged] == ["Dolo 650", "Azithral 500", "Ascoril"]
+        assert merged[0]["sources"] == [{"file": 0, "page": 0}, {"file": 0, "page": 1}]
+        assert merged[1]["sources"] == [{"file": 0, "page": 0}, {"file": 1, "page": 0}]
+
+    def test_single_pass_matches_per_line_extract(self):
+        from rapidfuzz import fuzz, process
+        from ocr_pipeline import _top_matches, load_name_table
+        names = list({e["name"]: e["drug_id"] for e in load_name_table()})
+        queries = ["Dolo 650", "Azithromycin", "Amoxclav", "zzz"]
+        expected = [
+            [(n, s) for n, s, _ in process.extract(q, names, scorer=fuzz.WRatio, limit=3)]
+            for q in queries
+        ]
+        assert _top_matches(queries, names) == expected
+
+    def test_batch_of_files(self, tmp_path):
+        from ocr_pipeline import process_prescription_batch
+        # Unreadable files fall back to the mock OCR text (four medicines)
+        paths = [str(tmp_path / "a.jpg"), str(tmp_path / "b.jpg")]
+        result = process_prescription_batch(paths, parallel=False)
+        assert result["page_count"] == 2
+        assert result["extracted_count"] == 4
+        assert all(c["sources"] == [{"file": 0, "page": 0}, {"file": 1, "page": 0}] for c in result["candidates"])
+        assert result["candidates"][0]["candidates"][0]["drug_id"] == "D001"
+
+    def test_pool_runs_whole_pipeline(self, tmp_path):
+        from concurrent.futures import ThreadPoolExecutor
+        import ocr_pipeline
+        paths = [str(tmp_path / "a.jpg"), str(tmp_path / "b.jpg")]
+        sequential = ocr_pipeline.run_prescription_ocr(paths)  # no pool: in this thread
+
+        class _Recording(ThreadPoolExecutor):
+            tasks = []
+
+            def submit(self, fn, *args, **kwargs):
+                self.tasks.append(fn.__name__)
+                return super().submit(fn, *args, **kwargs)
+
+        with _Recording(max_workers=2) as pool:
+            ocr_pipeline.set_ocr_executor(pool)
+            try:
+                pooled = ocr_pipeline.run_prescription_ocr(paths)
+            finally:
+                ocr_pipeline.set_ocr_executor(None)
+        assert pooled == sequential
+        assert _Recording.tasks.count("_ocr_unit") == 2 and _Recording.tasks[-1] == "_analyze_in_pool"
+
+
+class TestLineParser:
+    """Form, name, strength, frequency and duration in one pass."""
+
+    def test_structured_records(self):
+        from ocr_pipeline import extract_medicine_names
+        records = extract_medicine_names(
+            "Tab. Augmentin 625 (Amoxicillin) 1-0-1 x 5 days\n"
+            "\x0cSyp. Ascoril 10 ml TDS for 1 week\n"
+            "Tablet Metformin 500 mg 1-0-0-1\n"
+            "Tab 500\n"
+            "Pan-D twice daily"
+        )
+        assert [r["extracted_name"] for r in records] == ["Augmentin 625", "Ascoril 10", "Metformin 500", "Pan-D"]
+        first = records[0]
+        assert (first["form"], first["strength"], first["extracted_molecule"]) == ("Tab", "625", "Amoxicillin")
+        assert (first["frequency"], first["doses_per_day"], first["duration_days"]) == ("1-0-1", 2, 5)
+        assert (records[1]["form"], records[1]["strength"], records[1]["duration_days"]) == ("Syp", "10ml", 7)
+        assert (records[2]["frequency"], records[2]["doses_per_day"]) == ("1-0-0-1", 2)
+        assert (records[3]["frequency"], records[3]["doses_per_day"], records[3]["strength"]) == ("twice daily", 2, None)
+
+    def test_duration_sets_end_date(self):
+        from ocr_pipeline import store_confirmed_medicine
+        # Columns the API's startup migration adds
+        medguard_db.execute("ALTER TABLE user_medicine_timeline ADD COLUMN symptoms TEXT")
+        medguard_db.execute("ALTER TABLE user_medicine_timeline ADD COLUMN taken_doses INTEGER DEFAULT 0")
+        parsed = store_confirmed_medicine("D004", user_id="u1", start_date="2026-01-01", duration_days=7)
+        default = store_confirmed_medicine("D004", user_id="u1", start_date="2026-01-01")
+        assert parsed["end_date"] == "2026-01-08"
+        assert default["end_date"] == "2026-01-06"  # antibiotic default
+
+
+class TestTieredMatching:
+    """Clean names are decided before the fuzzy scan."""
+
+    def test_tiers(self):
+        from ocr_pipeline import match_names, load_name_table
+        names = list({e["name"]: e["drug_id"] for e in load_name_table()})
+        matched = match_names(["DOLO-650", "Paracetamol 500", "Azithrl", "Qwerty"], names)
+        assert matched["DOLO-650"] == ("exact", [("Dolo 650", 100.0)])
+        assert matched["Paracetamol 500"][0] == "token"
+        assert matched["Paracetamol 500"][1][0][0] == "Paracetamol"
+        assert matched["Azithrl"][0] == "fuzzy" and matched["Azithrl"][1][0][0] == "Azithral"
+        assert matched["Qwerty"] == (None, [])
+
+    def test_token_hit_keeps_look_alikes(self):
+        from ocr_pipeline import match_names, load_name_table
+        names = list({e["name"]: e["drug_id"] for e in load_name_table()})
+        tier, top = match_names(["Amoxicillin 250"], names)["Amoxicillin 250"]
+        assert tier == "token" and top[0][0] == "Amoxicillin"
+        assert [name for name, _ in top[1:]] == ["Amoxiclav", "Mox 500"]
+
+    def test_stats_in_response(self):
+        from ocr_pipeline import process_prescription_image
+        result = process_prescription_image("missing.jpg")  # mock OCR text
+        stats = result["match_stats"]
+        assert stats["queries"] == 4 and stats["token"] == 4 and stats["fuzzy"] == 0
+        assert [c["match_tier"] for c in result["candidates"]] == ["token"] * 4
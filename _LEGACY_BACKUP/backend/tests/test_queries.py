@@ -0,0 +1,97 @@
+"""
+MEDGUARD — Named Query Registry Tests
+Tests that registered statements behave like db.query() on reused connections.
+"""
+
+import sys
+import os
+import threading
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+import db as medguard_db
+
+
+@pytest.fixture(autouse=True)
+def setup_test_db(tmp_path):
+    """Create a fresh test database for each test."""
+    test_db = str(tmp_path / "test_medguard.db")
+    medguard_db.DB_PATH = test_db
+    medguard_db.init_db(test_db)
+    yield test_db
+    from queries import close_connections
+    close_connections()
+
+
+class TestRegistry:
+    """Registered reads and writes."""
+
+    def test_run_matches_db_query(self):
+        from queries import run, run_one
+        expected = medguard_db.query("SELECT * FROM drug_master WHERE drug_id = ?", ("D001",))
+        assert run("drug.by_id", ("D001",)) == expected
+        assert run_one("drug.by_id", ("D001",)) == expected[0]
+        assert run_one("drug.by_id", ("D999",)) is None
+
+    def test_run_write_returns_rowid(self):
+        from queries import run_write
+        medguard_db.execute("ALTER TABLE user_medicine_timeline ADD COLUMN symptoms TEXT")
+        medguard_db.execute("ALTER TABLE user_medicine_timeline ADD COLUMN taken_doses INTEGER DEFAULT 0")
+        row_id = run_write("timeline.add", ("u1", "D001", "2025-01-01", "2025-01-05"))
+        run_write("timeline.dose_missed", (row_id,))
+        rows = medguard_db.query("SELECT id, missed_doses FROM user_medicine_timeline")
+        assert rows == [{"id": row_id, "missed_doses": 1}]
+
+    def test_transaction_commits_or_rolls_back_together(self):
+        from queries import run_many, run_write, transaction
+        medguard_db.execute("ALTER TABLE user_medicine_timeline ADD COLUMN symptoms TEXT")
+        medguard_db.execute("ALTER TABLE user_medicine_timeline ADD COLUMN taken_doses INTEGER DEFAULT 0")
+        with pytest.raises(RuntimeError):
+            with transaction():
+                run_write("timeline.add", ("u1", "D001", None, None))
+                raise RuntimeError
+        assert medguard_db.query("SELECT id FROM user_medicine_timeline") == []
+
+        with transaction(immediate=True):
+            row_id = run_write("timeline.add", ("u1", "D001", None, None))
+            assert run_many("timeline.dose_missed", [(row_id,), (row_id,)]) == 2
+        rows = medguard_db.query("SELECT missed_doses FROM user_medicine_timeline")
+        assert rows == [{"missed_doses": 2}]
+
+    def test_iter_run_matches_run(self):
+        from queries import iter_run, run
+        expected = run("drug.page", ("", 100))
+        assert len(expected) > 3
+        assert list(iter_run("drug.page", ("", 100), batch_size=3)) == expected
+
+    def test_register_rejects_conflicting_sql(self):
+        from queries import register, QUERIES
+        assert register("drug.class", QUERIES["drug.class"]) == "drug.class"
+        with pytest.raises(ValueError):
+            register("drug.class", "SELECT 1")
+
+
+class TestConnections:
+    """One cached connection per thread and database."""
+
+    def test_connection_reused_per_thread(self):
+        from queries import _connection
+        conn = _connection()
+        assert _connection() is conn
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(_connection()))
+        thread.start()
+        thread.join()
+        assert other[0] is not conn
+
+    def test_stats_count_calls(self):
+        from queries import run, query_stats
+        before = query_stats().get("drug.molecule", {}).get("calls", 0)
+        for _ in range(3):
+            run("drug.molecule", ("D001",))
+        stats = query_stats()["drug.molecule"]
+        assert stats["calls"] == before + 3
+        assert stats["max_ms"] >= stats["avg_ms"] >= 0
@@ -180,3 +180,88 @@ class TestDisclaimer:
         from risk_engine import explain_risk
         result = explain_risk("D01")
         assert "disclaimer" in result
+
+
+class TestFlagRecord:
+    """Flags are slotted records that behave like their dict form."""
+
+    def test_mapping_access_matches_dict(self):
+        from risk_engine import check_risk, Flag
+        result = check_risk(drug_ids=["D003"])  # Diclofenac — red ADR in seed data
+        flag = result["flags"][0]
+        assert isinstance(flag, Flag)
+        as_dict = flag.to_dict()
+        assert list(as_dict) == ["type", "level", "drug", "symptom", "severity",
+                                 "advice", "is_emergency", "sources"]
+        assert flag["level"] == as_dict["level"] == "red"
+        assert flag.get("message", "fallback") == "fallback"  # not an ADR key
+        assert as_dict["sources"] == [flag.source]
+        with pytest.raises(KeyError):
+            flag["drug_a"]
+
+    def test_json_default_serializes_results(self):
+        import json
+        from risk_engine import check_risk, json_default
+        result = check_risk(drug_ids=["D003"])
+        decoded = json.loads(json.dumps(result, default=json_default))
+        assert decoded["flags"][0] == result["flags"][0].to_dict()
+        with pytest.raises(TypeError):
+            json.dumps({"x": object()}, default=json_default)
+
+    def test_levels_are_shared_codes(self):
+        from risk_engine import check_risk, LEVEL_RED
+        result = check_risk(drug_ids=["D003"])
+        assert result["flags"][0].level is LEVEL_RED
+
+
+class TestClinicalSummary:
+    """Templated, cached clinical narrative."""
+
+    def test_red_and_yellow_sections(self):
+        from risk_engine import check_risk, LEVEL_YELLOW, _FRAGMENT_CACHE
+        result = check_risk(drug_ids=["D003", "D009"])  # Diclofenac red ADR, Metformin yellow ADR
+        summary = result["clinical_analysis"]
+        assert summary.startswith("**CRITICAL ATTENTION REQUIRED:**\n• Diclofenac: Stop drug and seek urgent care.")
+        assert "**Clinical Management Notes:**\n• Metformin: Monitor blood sugar." in summary
+        assert summary.endswith("\n\n**Recommendation:** Review prescription safety immediately with the prescribing physician.")
+        assert _FRAGMENT_CACHE[(LEVEL_YELLOW, "Metformin", ("Monitor blood sugar",))] == "• Metformin: Monitor blood sugar."
+
+    def test_fragments_dropped_on_knowledge_reload(self):
+        import risk_engine
+        from knowledge import load_snapshot
+        risk_engine.check_risk(drug_ids=["D003"])  # Diclofenac red ADR
+        assert any(k[1] == "Diclofenac" for k in risk_engine._FRAGMENT_CACHE)
+        load_snapshot()
+        risk_engine.check_risk(drug_ids=["D008"])  # Ciprofloxacin red ADR
+        assert not any(k[1] == "Diclofenac" for k in risk_engine._FRAGMENT_CACHE)
+
+
+class TestBehaviorAnalysis:
+    """SQL-aggregated adherence insights."""
+
+    def _add(self, user_id, drug_id, missed):
+        medguard_db.execute(
+            "INSERT INTO user_medicine_timeline (user_id, drug_id, missed_doses, confirmed) VALUES (?, ?, ?, 1)",
+            (user_id, drug_id, missed),
+        )
+
+    def test_user_insights(self):
+        from risk_engine import analyze_user_behavior
+        assert analyze_user_behavior("nobody")[0]["title"] == "No History"
+        self._add("u1", "D004", 1)  # Amoxicillin, antibiotic
+        self._add("u1", "D009", 3)  # Metformin
+        self._add("u1", "D006", 2)  # Azithromycin, antibiotic
+        titles = [i["title"] for i in analyze_user_behavior("u1")]
+        assert titles == ["Antibiotic Resistance Risk", "Adherence Gaps"]
+        assert "Amoxicillin, Azithromycin." in analyze_user_behavior("u1")[0]["message"]
+
+    def test_population_matches_per_user(self):
+        from risk_engine import analyze_user_behavior, analyze_population_behavior
+        for drug_id in ["D001", "D002", "D003", "D009", "D010"]:
+            self._add("u1", drug_id, 0)
+        self._add("u2", "D008", 2)
+        population = analyze_population_behavior()
+        assert set(population) == {"u1", "u2"}
+        for user_id, insights in population.items():
+            assert insights == analyze_user_behavior(user_id)
+        assert [i["title"] for i in population["u1"]] == ["High Pill Burden", "Great Adherence!"]
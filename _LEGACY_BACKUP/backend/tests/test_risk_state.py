@@ -0,0 +1,162 @@
+"""
+MEDGUARD — Incremental Risk State Tests
+Tests that the per-user cached assessment tracks check_risk as the timeline changes.
+"""
+
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+import db as medguard_db
+
+
+@pytest.fixture(autouse=True)
+def setup_test_db(tmp_path):
+    """Create a fresh test database for each test."""
+    test_db = str(tmp_path / "test_medguard.db")
+    medguard_db.DB_PATH = test_db
+    medguard_db.init_db(test_db)
+    yield test_db
+
+
+def _add(user_id, drug_id, missed=0):
+    return medguard_db.execute(
+        "INSERT INTO user_medicine_timeline (user_id, drug_id, missed_doses, confirmed) VALUES (?, ?, ?, 1)",
+        (user_id, drug_id, missed),
+    )
+
+
+def _columns():
+    # Columns and statistics tables the API's startup migration adds
+    from drug_stats import install_drug_stats
+    medguard_db.execute("ALTER TABLE user_medicine_timeline ADD COLUMN symptoms TEXT")
+    medguard_db.execute("ALTER TABLE user_medicine_timeline ADD COLUMN taken_doses INTEGER DEFAULT 0")
+    install_drug_stats()
+
+
+def _normalized(result):
+    return (
+        result["risk_level"],
+        [f.to_dict() for f in result["flags"]],
+        sorted(result["sources"]),
+        sorted(result["clinical_analysis"].split("\n")),
+    )
+
+
+def _expected(user_id, user_age=None, report_alcohol=False):
+    from risk_engine import check_risk
+    rows = medguard_db.query(
+        "SELECT drug_id, missed_doses FROM user_medicine_timeline WHERE user_id = ? AND confirmed = 1 ORDER BY id",
+        (user_id,),
+    )
+    return check_risk(
+        [r["drug_id"] for r in rows],
+        user_age=user_age,
+        report_alcohol=report_alcohol,
+        missed_doses_map={r["drug_id"]: r["missed_doses"] for r in rows},
+    )
+
+
+class TestUserRiskState:
+    """Hooks update the cached result without a full rebuild."""
+
+    def test_add_remove_matches_check_risk(self):
+        from risk_state import get_user_risk_state, on_medicine_added, on_medicine_removed
+        from timeline import current_seq
+        state = get_user_risk_state("u1")
+        assert state.result()["risk_level"] == "green"
+
+        ids = {}
+        for drug_id in ["D002", "D003", "D006", "D008"]:
+            ids[drug_id] = _add("u1", drug_id)
+            on_medicine_added("u1", ids[drug_id], drug_id, current_seq("u1"))
+            assert _normalized(state.result()) == _normalized(_expected("u1"))
+
+        medguard_db.execute("DELETE FROM user_medicine_timeline WHERE id = ?", (ids["D003"],))
+        on_medicine_removed("u1", ids["D003"], current_seq("u1"))
+        assert get_user_risk_state("u1") is state  # hooks kept it current
+        assert _normalized(state.result()) == _normalized(_expected("u1"))
+
+    def test_missed_doses_and_age(self):
+        from risk_state import get_user_risk_state, on_doses_changed
+        from timeline import current_seq
+        tid = _add("u2", "D004")
+        _add("u2", "D009")
+        state = get_user_risk_state("u2")
+
+        medguard_db.execute("UPDATE user_medicine_timeline SET missed_doses = 3 WHERE id = ?", (tid,))
+        on_doses_changed("u2", tid, 3, current_seq("u2"))
+        assert state.total_missed() == 3
+        assert _normalized(state.result()) == _normalized(_expected("u2"))
+        assert _normalized(state.result(user_age=70)) == _normalized(_expected("u2", user_age=70))
+
+    def test_ages_do_not_share_results(self):
+        from risk_state import get_user_risk_state
+        _add("u4", "D001")  # "Severe liver disease": elderly caution
+        state = get_user_risk_state("u4")
+        elderly, adult = _expected("u4", user_age=70), _expected("u4", user_age=40)
+        assert _normalized(elderly) != _normalized(adult)
+        for _ in range(2):  # alternating callers read cached variants
+            assert _normalized(state.result(user_age=70)) == _normalized(elderly)
+            assert _normalized(state.result(user_age=40)) == _normalized(adult)
+        assert set(state._results) == {(True, False), (False, False)}
+
+    def test_alcohol_variant(self):
+        from risk_state import get_user_risk_state
+        _add("u5", "D007")  # Metronidazole: alcohol interaction
+        _add("u5", "D001")
+        state = get_user_risk_state("u5")
+        with_alcohol = state.result(user_age=70, report_alcohol=True)
+        assert _normalized(with_alcohol) == _normalized(_expected("u5", 70, report_alcohol=True))
+        assert any(f.type == "alcohol" for f in with_alcohol["flags"])
+        assert not any(f.type == "alcohol" for f in state.result(user_age=70)["flags"])
+
+    def test_states_are_bounded(self, monkeypatch):
+        import risk_state
+        monkeypatch.setattr(risk_state, "MAX_STATES", 2)
+        first = risk_state.get_user_risk_state("a")
+        risk_state.get_user_risk_state("b")
+        assert risk_state.get_user_risk_state("a") is first  # now most recent
+        risk_state.get_user_risk_state("c")
+        assert risk_state._cached_state("b") is None
+        assert risk_state._cached_state("a") is first
+
+    def test_external_change_triggers_rebuild(self):
+        from risk_state import get_user_risk_state
+        state = get_user_risk_state("u3")
+        _add("u3", "D002")  # no hook, e.g. written by another worker
+        rebuilt = get_user_risk_state("u3")
+        assert rebuilt is not state
+        assert rebuilt.drug_ids() == ["D002"]
+
+    def test_write_between_hooks_is_not_skipped(self):
+        from queries import run_write
+        from risk_state import get_user_risk_state, on_medicine_added
+        _columns()
+        _add("u6", "D001")
+        state = get_user_risk_state("u6")
+
+        _add("u6", "D003")  # another connection (e.g. a prefork worker): no hook here
+        written = run_write("timeline.add", ("u6", "D009", None, None), returning="timeline.written")
+        on_medicine_added("u6", written["id"], "D009", written["seq"])
+        rebuilt = get_user_risk_state("u6")
+        assert rebuilt is not state
+        assert rebuilt.drug_ids() == ["D001", "D003", "D009"]
+        assert _normalized(rebuilt.result()) == _normalized(_expected("u6"))
+
+    def test_doses_taken_and_symptoms_keep_state(self):
+        from queries import run_write
+        from drug_stats import record_symptoms
+        from risk_state import get_user_risk_state, on_doses_changed, on_course_updated
+        _columns()
+        tid = _add("u7", "D004")
+        state = get_user_risk_state("u7")
+
+        written = run_write("timeline.dose_taken", (tid,), returning="timeline.written")
+        on_doses_changed("u7", tid, written["missed_doses"], written["seq"])
+        course = record_symptoms(tid, "Nausea")
+        on_course_updated("u7", course["seq"])
+        assert get_user_risk_state("u7") is state
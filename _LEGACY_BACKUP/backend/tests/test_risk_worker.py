@@ -0,0 +1,68 @@
+"""
+MEDGUARD — Background Risk Worker Tests
+Tests queued recomputation into user_risk_state.
+"""
+
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+import db as medguard_db
+
+
+@pytest.fixture(autouse=True)
+def setup_test_db(tmp_path):
+    """Create a fresh test database for each test."""
+    test_db = str(tmp_path / "test_medguard.db")
+    medguard_db.DB_PATH = test_db
+    medguard_db.init_db(test_db)
+    yield test_db
+
+
+def _add(user_id, drug_id, missed=0):
+    return medguard_db.execute(
+        "INSERT INTO user_medicine_timeline (user_id, drug_id, missed_doses, confirmed) VALUES (?, ?, ?, 1)",
+        (user_id, drug_id, missed),
+    )
+
+
+class TestRiskWorker:
+    """Events are processed off-thread and persisted."""
+
+    def test_notify_persists_risk_and_insights(self):
+        from risk_worker import notify, wait_idle, get_stored_state
+        _add("u1", "D002")
+        _add("u1", "D003")
+        for _ in range(5):  # burst coalesces
+            notify("u1")
+        wait_idle()
+
+        rows = medguard_db.query("SELECT * FROM user_risk_state WHERE user_id = 'u1'")
+        assert len(rows) == 1
+        state = get_stored_state("u1")
+        assert state["risk"]["risk_level"] == rows[0]["risk_level"] == "red"
+        assert state["insights"]
+
+    def test_profile_age_drives_elderly_checks(self):
+        from risk_worker import notify, wait_idle, get_stored_state
+        _add("u2", "D001")
+        notify("u2")
+        wait_idle()
+        assert not any(f["type"] == "elderly" for f in get_stored_state("u2")["risk"]["flags"])
+
+        medguard_db.execute("INSERT INTO user_profile (user_id, age) VALUES ('u2', 72)")
+        notify("u2")
+        wait_idle()
+        assert any(f["type"] == "elderly" for f in get_stored_state("u2")["risk"]["flags"])
+
+    def test_coalescing_requeues_during_run(self):
+        from risk_worker import RiskWorkerPool
+        pool = RiskWorkerPool(threads=1)
+        pool.running.add("u3")  # pretend a run is in flight
+        pool.submit("u3")
+        pool.submit("u3")
+        assert pool.pending == {"u3"}
+        assert pool.queue.qsize() == 0  # waits for the in-flight run
@@ -0,0 +1,135 @@
+"""
+MEDGUARD — Prefork Launcher Tests
+Tests worker concurrency, crash respawn and SIGHUP reloads of the master.
+"""
+
+import sys
+import os
+import signal
+import socket
+import threading
+import time
+import urllib.request
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+import db as medguard_db
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(os, "fork") or not os.path.exists(f"/proc/{os.getpid()}/task/{os.getpid()}/children"),
+    reason="needs fork() and /proc child lists",
+)
+
+
+@pytest.fixture(autouse=True)
+def setup_test_db(tmp_path):
+    """Create a fresh test database for each test."""
+    test_db = str(tmp_path / "test_medguard.db")
+    medguard_db.DB_PATH = test_db
+    medguard_db.init_db(test_db)
+    yield test_db
+
+
+def _pid_app(environ, start_response):
+    """Answers with the serving worker's pid (after a second on /slow)."""
+    if environ["PATH_INFO"] == "/slow":
+        time.sleep(1.0)
+    body = str(os.getpid()).encode()
+    start_response("200 OK", [("Content-Type", "text/plain"), ("Content-Length", str(len(body)))])
+    return [body]
+
+
+def _get(port, path="/"):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=10) as resp:
+        return int(resp.read())
+
+
+def _children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return {int(p) for p in f.read().split()}
+
+
+def _wait_for(condition, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        value = condition()
+        if value:
+            return value
+        time.sleep(0.1)
+    raise AssertionError("timed out")
+
+
+def _workers_after(master, gone, count):
+    """The master's workers once `count` run and none of `gone` remain."""
+    def replaced():
+        workers = _children(master)
+        return workers if len(workers) == count and not workers & gone else None
+    return _wait_for(replaced)
+
+
+@pytest.fixture
+def start_master(request, monkeypatch):
+    """Fork a master on an ephemeral port; returns (master pid, port)."""
+    import serve
+    monkeypatch.setattr(serve, "RESPAWN_BACKOFF", 0.1)
+
+    def start(workers, threads=2):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(("127.0.0.1", 0))
+        sock.listen(16)
+        port = sock.getsockname()[1]
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                serve.Master(sock, "127.0.0.1", port, workers, wsgi_app=_pid_app, threads=threads).run()
+            except BaseException:
+                code = 1
+            finally:
+                os._exit(code)
+        sock.close()
+
+        def stop():
+            os.kill(pid, signal.SIGTERM)
+            os.waitpid(pid, 0)
+
+        request.addfinalizer(stop)
+        _wait_for(lambda: len(_children(pid)) == workers)
+        _get(port)  # serving
+        return pid, port
+
+    return start
+
+
+class TestPreforkMaster:
+    """The master keeps N workers serving across crashes and reloads."""
+
+    def test_slow_request_does_not_block_worker(self, start_master):
+        _, port = start_master(workers=1)
+        slow = []
+        thread = threading.Thread(target=lambda: slow.append(_get(port, "/slow")))
+        thread.start()
+        time.sleep(0.2)
+        started = time.monotonic()
+        fast = _get(port)
+        assert time.monotonic() - started < 0.8
+        thread.join()
+        assert slow == [fast]  # same worker, two threads
+
+    def test_crashed_worker_is_replaced(self, start_master):
+        master, port = start_master(workers=2)
+        victim = min(_children(master))
+        os.kill(victim, signal.SIGKILL)
+        workers = _workers_after(master, {victim}, 2)
+        assert _get(port) in workers
+
+    def test_sighup_retires_old_workers(self, start_master):
+        master, port = start_master(workers=2)
+        old = _children(master)
+        os.kill(master, signal.SIGHUP)
+        new = _workers_after(master, old, 2)
+        for _ in range(4):
+            assert _get(port) in new
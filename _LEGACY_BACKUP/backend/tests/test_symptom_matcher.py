@@ -0,0 +1,56 @@
+"""
+MEDGUARD — Symptom Matcher Tests
+Tests symptom tokenizing, exact/fuzzy ADR matching and likely-ADR flags.
+"""
+
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+import db as medguard_db
+
+
+@pytest.fixture(autouse=True)
+def setup_test_db(tmp_path):
+    """Create a fresh test database for each test."""
+    test_db = str(tmp_path / "test_medguard.db")
+    medguard_db.DB_PATH = test_db
+    medguard_db.init_db(test_db)
+    yield test_db
+
+
+class TestSymptomMatcher:
+    """Reports map to adr_master and cross-reference drug_adr_map."""
+
+    def test_tokens(self):
+        from symptom_matcher import symptom_tokens
+        assert symptom_tokens("Headache, Nausea and  VERTIGO; nausea") == ["headache", "nausea", "vertigo"]
+        assert symptom_tokens(None) == []
+
+    def test_exact_and_fuzzy(self):
+        from symptom_matcher import match_symptoms
+        matches = {m["symptom"]: m for m in match_symptoms("Emesis, vomitting, skin rashes, headache")}
+        assert (matches["emesis"]["adr_id"], matches["emesis"]["match"]) == ("A002", "exact")
+        assert matches["emesis"]["symptom_layman"] == "Vomiting"
+        assert (matches["vomitting"]["adr_id"], matches["vomitting"]["match"]) == ("A002", "fuzzy")
+        assert matches["skin rashes"]["adr_id"] == "A005"
+        assert matches["headache"]["adr_id"] is None and matches["headache"]["match"] is None
+
+    def test_unrelated_symptoms_stay_unmatched(self):
+        from symptom_matcher import match_symptoms, match_symptom
+        matches = match_symptoms("High blood sugar, back pain, pain")
+        assert [m["adr_id"] for m in matches] == [None, None, None]
+        assert match_symptom("vomitting") is None  # fuzzy: shown, not counted
+        assert match_symptom("vomiting") == "A002"
+
+    def test_likely_adrs_for_users_drugs(self):
+        from symptom_matcher import match_symptoms, flag_likely_adrs
+        matches = match_symptoms("Nausea, Skin rash")
+        flags = flag_likely_adrs(matches, ["D001", "D004", "D001"])
+        assert [(f["drug_id"], f["adr_id"], f["level"]) for f in flags] == [
+            ("D004", "A005", "red"), ("D001", "A001", "green"),
+        ]
+        assert flag_likely_adrs(matches, ["D010"]) == []
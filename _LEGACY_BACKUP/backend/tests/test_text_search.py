@@ -0,0 +1,80 @@
+"""
+MEDGUARD — Knowledge Full-Text Search Tests
+Tests the FTS5 index built during init_db and on snapshot reloads.
+"""
+
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+import db as medguard_db
+from text_search import fts5_available
+
+pytestmark = pytest.mark.skipif(not fts5_available(), reason="SQLite built without FTS5")
+
+
+@pytest.fixture(autouse=True)
+def setup_test_db(tmp_path):
+    """Create a fresh test database for each test."""
+    test_db = str(tmp_path / "test_medguard.db")
+    medguard_db.DB_PATH = test_db
+    medguard_db.init_db(test_db)
+    yield test_db
+
+
+class TestKnowledgeSearch:
+    """Ranked FTS5 search with snippets."""
+
+    def test_medical_term_finds_adr(self):
+        from text_search import search_knowledge
+        result = search_knowledge("melena")
+        assert result["count"] > 0
+        top = result["results"][0]
+        assert top["kind"] == "adr"
+        assert top["ref_id"] == "A006"
+        assert top["drug_id"] == "D003"
+        assert "[Melena]" in top["snippet"]
+
+    def test_prefix_query(self):
+        from text_search import search_knowledge
+        result = search_knowledge("arrhyth")
+        assert any(r["kind"] == "interaction" for r in result["results"])
+
+    def test_brand_finds_drug(self):
+        from text_search import search_knowledge
+        result = search_knowledge("Augmentin", kind="drug")
+        assert [r["drug_id"] for r in result["results"]] == ["D005"]
+
+    def test_lazy_rebuild_when_index_missing(self, setup_test_db):
+        from text_search import search_knowledge, FTS_TABLE
+        medguard_db.execute(f"DROP TABLE {FTS_TABLE}")
+        assert search_knowledge("bleeding")["count"] > 0
+
+    def test_concurrent_first_searches(self):
+        import threading
+        from text_search import search_knowledge, FTS_TABLE
+        medguard_db.execute(f"DROP TABLE {FTS_TABLE}")
+        counts = []
+        threads = [threading.Thread(target=lambda: counts.append(search_knowledge("bleeding")["count"]))
+                   for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(counts) == 4 and len(set(counts)) == 1 and counts[0] > 0
+
+    def test_snapshot_reload_rebuilds_index(self):
+        from knowledge import load_snapshot
+        from text_search import search_knowledge
+        medguard_db.execute("INSERT INTO brand_mapping VALUES ('Zyxoprin', 'D001', 'Test Labs')")
+        assert search_knowledge("Zyxoprin")["count"] == 0
+        load_snapshot()
+        assert [r["drug_id"] for r in search_knowledge("Zyxoprin")["results"]] == ["D001"]
+
+    def test_punctuation_is_safe(self):
+        from text_search import search_knowledge
+        assert search_knowledge('"; DROP TABLE')["count"] == 0
+        assert search_knowledge("***") == {"results": [], "count": 0}
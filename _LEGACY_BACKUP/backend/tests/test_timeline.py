@@ -0,0 +1,169 @@
+"""
+MEDGUARD — Timeline Window Tests
+Tests active-course filtering and archival of completed courses.
+"""
+
+import sys
+import os
+from datetime import date, timedelta
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+import db as medguard_db
+
+
+@pytest.fixture(autouse=True)
+def setup_test_db(tmp_path):
+    """Create a fresh test database for each test."""
+    test_db = str(tmp_path / "test_medguard.db")
+    medguard_db.DB_PATH = test_db
+    medguard_db.init_db(test_db)
+    yield test_db
+
+
+def _day(offset):
+    return (date.today() + timedelta(days=offset)).isoformat()
+
+
+def _add(user_id, drug_id, start, end):
+    return medguard_db.execute(
+        "INSERT INTO user_medicine_timeline (user_id, drug_id, start_date, end_date, confirmed) VALUES (?, ?, ?, ?, 1)",
+        (user_id, drug_id, start, end),
+    )
+
+
+class TestActiveCourses:
+    """start_date <= today <= end_date semantics."""
+
+    def test_active_and_windowed(self):
+        from timeline import active_courses, active_drug_ids, courses_in_window
+        current = _add("u1", "D001", _day(-2), _day(3))
+        _add("u1", "D002", _day(-400), _day(-390))  # long finished
+        _add("u1", "D003", _day(5), _day(10))       # not started yet
+        legacy = _add("u1", "D009", None, None)     # no dates: open-ended
+
+        assert [r["id"] for r in active_courses("u1")] == [current, legacy]
+        assert active_drug_ids("u1") == ["D001", "D009"]
+        window = courses_in_window("u1", _day(-395), _day(-1))
+        assert [r["drug_id"] for r in window] == ["D001", "D002", "D009"]
+
+    def test_risk_state_ignores_finished_courses(self):
+        from risk_state import get_user_risk_state, on_medicine_added
+        from timeline import current_seq
+        _add("u2", "D002", _day(-30), _day(-20))  # Ibuprofen, finished
+        state = get_user_risk_state("u2")
+        assert state.drug_ids() == []
+
+        row_id = _add("u2", "D003", _day(-30), _day(-25))
+        on_medicine_added("u2", row_id, "D003", current_seq("u2"), _day(-30), _day(-25))
+        assert state.drug_ids() == []
+        assert get_user_risk_state("u2") is state
+
+
+class TestArchival:
+    """Completed courses past retention move to the history table."""
+
+    def test_archive_moves_old_courses(self):
+        from timeline import archive_completed_courses
+        old = _add("u1", "D002", _day(-400), _day(-390))
+        recent = _add("u1", "D001", _day(-20), _day(-10))
+
+        assert archive_completed_courses(retention_days=365) == 1
+        hot = medguard_db.query("SELECT id FROM user_medicine_timeline WHERE user_id = 'u1'")
+        cold = medguard_db.query("SELECT id, drug_id, archived_at FROM user_medicine_history")
+        assert [r["id"] for r in hot] == [recent]
+        assert cold == [{"id": old, "drug_id": "D002", "archived_at": date.today().isoformat()}]
+        assert archive_completed_courses(retention_days=365) == 0
+
+
+class TestTimelineSync:
+    """Change-sequence delta sync and keyset pages."""
+
+    def test_changes_since_token(self):
+        from timeline import changes_since
+        first = _add("u1", "D001", _day(-2), _day(3))
+        _add("u2", "D002", _day(-2), _day(3))  # other users don't bump u1
+
+        full = changes_since("u1", 0)
+        assert full["full"] and full["token"] == 1
+        assert [r["id"] for r in full["timeline"]] == [first]
+
+        assert changes_since("u1", full["token"]) == {
+            "timeline": [], "deleted": [], "token": 1, "has_more": False, "full": False,
+        }
+
+        second = _add("u1", "D003", _day(-1), _day(4))
+        medguard_db.execute("UPDATE user_medicine_timeline SET missed_doses = 2 WHERE id = ?", (first,))
+        medguard_db.execute("DELETE FROM user_medicine_timeline WHERE id = ?", (second,))
+        delta = changes_since("u1", 1)
+        assert [r["id"] for r in delta["timeline"]] == [first]
+        assert delta["timeline"][0]["missed_doses"] == 2
+        assert delta["deleted"] == [second]
+        assert delta["token"] == 4 and not delta["full"]
+
+    def test_compacted_tombstones_force_full_resync(self):
+        from timeline import changes_since, compact_tombstones
+        keep = _add("u1", "D001", _day(-2), _day(3))
+        gone = _add("u1", "D002", _day(-2), _day(3))
+        old_token = changes_since("u1", 0)["token"]
+        medguard_db.execute("DELETE FROM user_medicine_timeline WHERE id = ?", (gone,))
+        new_token = changes_since("u1", old_token)["token"]
+
+        assert compact_tombstones(token_days=90) == 0  # still within the window
+        assert compact_tombstones(token_days=90, today=date.today() + timedelta(days=91)) == 1
+        assert medguard_db.query("SELECT * FROM user_timeline_tombstones") == []
+
+        resync = changes_since("u1", old_token)
+        assert resync["full"] and [r["id"] for r in resync["timeline"]] == [keep]
+        assert not changes_since("u1", new_token)["full"]
+
+    def test_delta_pages_and_keyset_cursor(self):
+        from timeline import changes_since, list_courses
+        ids = [_add("u1", "D001", _day(-i), _day(10)) for i in range(5)]
+
+        page = changes_since("u1", 0, limit=2)
+        assert page["has_more"] and page["token"] == 2
+        rest = changes_since("u1", page["token"], limit=10)
+        assert [r["id"] for r in rest["timeline"]] == ids[2:]
+
+        seen, cursor = [], None
+        while True:
+            rows, cursor = list_courses("u1", limit=2, cursor=cursor)
+            seen.extend(r["id"] for r in rows)
+            if cursor is None:
+                break
+        assert seen == ids  # newest start_date first
+
+
+class TestStreamingQuery:
+    """iter_query / iter_pages yield rows batch by batch and match query()."""
+
+    def test_iter_query_and_courses(self):
+        from db import iter_query, query
+        from timeline import iter_courses, list_courses
+        for i in range(7):
+            _add("u1", "D001", _day(-i), _day(10))
+
+        sql = "SELECT id, drug_id FROM user_medicine_timeline ORDER BY id"
+        rows = iter_query(sql, batch_size=3)
+        assert next(rows) == {"id": 1, "drug_id": "D001"}
+        assert [next(rows)] + list(rows) == query(sql)[1:]
+        assert list(iter_query(sql, tuples=True))[0] == (1, "D001")
+
+        assert list(iter_courses("u1")) == [dict(r) for r in list_courses("u1")[0]]
+
+    def test_paged_stream_does_not_block_writers(self, monkeypatch):
+        import timeline
+        from timeline import iter_courses, list_courses
+        monkeypatch.setattr(timeline, "STREAM_PAGE_ROWS", 2)
+        for i in range(5):
+            _add("u1", "D001", _day(-i), _day(10))
+
+        expected = [dict(r) for r in list_courses("u1")[0]]
+
+        rows = iter_courses("u1")
+        first = next(rows)  # a client that stalls mid-download
+        _add("u2", "D002", _day(0), _day(5))  # would wait on an open read
+        assert [first] + list(rows) == expected
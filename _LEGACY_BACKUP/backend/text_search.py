@@ -0,0 +1,174 @@
+"""
+MEDGUARD — Knowledge Full-Text Search
+Optional SQLite FTS5 index over drug, ADR and interaction text.
+
+The index is a derived table: it is rebuilt from the knowledge tables
+during init_db, on every knowledge snapshot (re)load and lazily on first
+search, never written by the app. A rebuild is one IMMEDIATE
+transaction, so readers see the old index or the new one, never a
+missing or half-filled table. If the SQLite build lacks FTS5, searches
+report it instead of falling back to table scans.
+"""
+
+import re
+import sqlite3
+
+from db import get_connection
+
+FTS_TABLE = "knowledge_fts"
+
+# Column order matters for bm25() weights below.
+_FTS_COLUMNS = (
+    "kind UNINDEXED, ref_id UNINDEXED, drug_id UNINDEXED, "
+    "molecule, brand, symptom_layman, medical_term, advice, clinical_effect"
+)
+# kind, ref_id, drug_id, molecule, brand, symptom_layman, medical_term, advice, clinical_effect
+_BM25_WEIGHTS = "0.0, 0.0, 0.0, 10.0, 8.0, 5.0, 5.0, 1.0, 2.0"
+
+_TOKEN = re.compile(r"[A-Za-z0-9]+")
+
+
+def fts5_available():
+    """Whether this SQLite build was compiled with FTS5."""
+    conn = sqlite3.connect(":memory:")
+    try:
+        conn.execute("CREATE VIRTUAL TABLE t USING fts5(x)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+
+
+def rebuild_text_index(conn, if_missing=False):
+    """
+    (Re)build the FTS5 index from the knowledge tables on an open
+    connection, committing any open transaction first. With if_missing,
+    an index another connection built meanwhile is kept as is.
+    Returns True if the index exists afterwards, False if FTS5 is
+    unavailable.
+    """
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")  # one writer rebuilds; readers keep the old index
+    try:
+        if if_missing and _index_exists(conn):
+            conn.commit()
+            return True
+        conn.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        try:
+            conn.execute(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                f"{_FTS_COLUMNS}, tokenize = 'porter unicode61')"
+            )
+        except sqlite3.OperationalError:
+            conn.rollback()
+            return False
+        _fill_index(conn)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return True
+
+
+def refresh_text_index(db_path=None):
+    """Rebuild the index of the current database (knowledge snapshot reload)."""
+    conn = get_connection(db_path)
+    try:
+        return rebuild_text_index(conn)
+    finally:
+        conn.close()
+
+
+def _fill_index(conn):
+
+    # Drugs: molecule + all brand names
+    conn.execute(f"""
+        INSERT INTO {FTS_TABLE} (kind, ref_id, drug_id, molecule, brand)
+        SELECT 'drug', dm.drug_id, dm.drug_id, dm.molecule,
+               GROUP_CONCAT(bm.brand_name, ' ')
+        FROM drug_master dm
+        LEFT JOIN brand_mapping bm ON dm.drug_id = bm.drug_id
+        GROUP BY dm.drug_id
+    """)
+
+    # ADRs: one document per drug–ADR mapping
+    conn.execute(f"""
+        INSERT INTO {FTS_TABLE}
+            (kind, ref_id, drug_id, molecule, symptom_layman, medical_term, advice)
+        SELECT 'adr', dam.adr_id, dam.drug_id, dm.molecule,
+               am.symptom_layman, am.medical_term, dam.advice
+        FROM drug_adr_map dam
+        JOIN adr_master am ON dam.adr_id = am.adr_id
+        JOIN drug_master dm ON dam.drug_id = dm.drug_id
+    """)
+
+    # Interactions: referenced by molecule name, not drug_id
+    conn.execute(f"""
+        INSERT INTO {FTS_TABLE} (kind, ref_id, molecule, clinical_effect)
+        SELECT 'interaction', interaction_id, drug_a || ' ' || drug_b, clinical_effect
+        FROM drug_interaction_master
+    """)
+
+
+def _index_exists(conn):
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (FTS_TABLE,)
+    ).fetchone()
+    return row is not None
+
+
+def _match_expression(text):
+    """Turn free text into a safe FTS5 query; the last token is a prefix."""
+    tokens = _TOKEN.findall(text or "")
+    if not tokens:
+        return None
+    terms = [f'"{t}"' for t in tokens[:-1]]
+    terms.append(f'"{tokens[-1]}"*')
+    return " ".join(terms)
+
+
+def search_knowledge(text, kind=None, limit=20, db_path=None):
+    """
+    Ranked full-text search over drugs, ADRs and interactions.
+
+    Args:
+        text: free text, e.g. "jaundice" or "bleeding risk"
+        kind: optional filter — 'drug', 'adr' or 'interaction'
+        limit: max results
+
+    Returns:
+        dict with results [{kind, ref_id, drug_id, molecule, snippet, rank}]
+        or {"error": ...} if FTS5 is unavailable.
+    """
+    expression = _match_expression(text)
+    if expression is None:
+        return {"results": [], "count": 0}
+
+    conn = get_connection(db_path)
+    try:
+        if not _index_exists(conn) and not rebuild_text_index(conn, if_missing=True):
+            return {"error": "Full-text search requires SQLite FTS5, which is not available."}
+
+        sql = f"""
+            SELECT kind, ref_id, drug_id, molecule,
+                   snippet({FTS_TABLE}, -1, '[', ']', '…', 12) AS snippet,
+                   bm25({FTS_TABLE}, {_BM25_WEIGHTS}) AS rank
+            FROM {FTS_TABLE}
+            WHERE {FTS_TABLE} MATCH ?
+        """
+        params = [expression]
+        if kind:
+            sql += " AND kind = ?"
+            params.append(kind)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+
+        rows = conn.execute(sql, params).fetchall()
+        results = [dict(row) for row in rows]
+        for r in results:
+            r["rank"] = round(r["rank"], 3)
+        return {"results": results, "count": len(results)}
+    finally:
+        conn.close()
@@ -0,0 +1,382 @@
+"""
+MEDGUARD — Medicine Timeline Queries
+Active-course and time-windowed views of user_medicine_timeline.
+
+A course is ACTIVE when start_date <= today <= end_date. Rows without
+dates (older data) count as open-ended. All lookups are shaped for the
+(user_id, end_date, start_date) index, so per-user cost follows the
+current regimen rather than lifetime history. Completed courses older
+than the retention window are moved to user_medicine_history by
+archive_completed_courses():
+
+    python timeline.py --archive [--retention-days 365] [--token-days 90]
+
+Change tracking: triggers bump a per-user sequence on every timeline
+insert/update/delete (deletes leave a tombstone), so clients can sync
+with changes_since(token) and list pages with keyset cursors. Archival
+also compacts tombstones older than SYNC_TOKEN_DAYS; a client whose
+token predates the compacted ones gets a full resync.
+"""
+
+import argparse
+import os
+from datetime import date, timedelta
+from itertools import product
+
+import db
+from db import iter_pages, STREAM_PAGE_ROWS
+from queries import register, run, run_one, run_write, transaction
+
+# Completed courses older than this move to the cold history table.
+RETENTION_DAYS = int(os.environ.get("MEDGUARD_RETENTION_DAYS", "365"))
+
+# Default /timeline and behavior-analysis window: active courses plus
+# those that ended within the last N days (post-course symptom reports).
+RECENT_DAYS = 30
+
+# Delta-sync page size when the client doesn't ask for one.
+SYNC_PAGE_SIZE = 500
+
+# Deletions are kept this long for delta sync; older tokens resync fully.
+SYNC_TOKEN_DAYS = int(os.environ.get("MEDGUARD_SYNC_TOKEN_DAYS", "90"))
+
+# Course overlaps [:since, :until]; NULL dates are open-ended.
+WINDOW_CLAUSE = (
+    "(end_date IS NULL OR end_date >= :since) "
+    "AND (start_date IS NULL OR start_date <= :until)"
+)
+
+
+def today_iso(today=None):
+    return (today or date.today()).isoformat()
+
+
+def days_ago_iso(days, today=None):
+    return ((today or date.today()) - timedelta(days=days)).isoformat()
+
+
+def window_params(since, until):
+    """Bind parameters for WINDOW_CLAUSE (ISO date strings)."""
+    return {"since": since, "until": until}
+
+
+def active_params(today=None):
+    """Bind parameters for WINDOW_CLAUSE selecting courses active today."""
+    t = today_iso(today)
+    return window_params(t, t)
+
+
+def recent_params(days=RECENT_DAYS, today=None):
+    """Bind parameters for active courses + those ended in the last `days`."""
+    return window_params(days_ago_iso(days, today), today_iso(today))
+
+
+def is_active(start_date, end_date, today=None):
+    """Python twin of WINDOW_CLAUSE with active_params()."""
+    t = today_iso(today)
+    return (start_date is None or start_date <= t) and (end_date is None or end_date >= t)
+
+
+_ACTIVE_COURSES = register("timeline.active_courses", f"""
+    SELECT * FROM user_medicine_timeline
+    WHERE user_id = :user_id AND confirmed = 1 AND {WINDOW_CLAUSE}
+    ORDER BY id
+""")
+
+
+def active_courses(user_id, today=None):
+    """Confirmed courses active today, oldest first."""
+    params = active_params(today)
+    params["user_id"] = user_id
+    return run(_ACTIVE_COURSES, params)
+
+
+_ACTIVE_DRUGS = register("timeline.active_drugs", f"""
+    SELECT drug_id FROM user_medicine_timeline
+    WHERE user_id = :user_id AND confirmed = 1 AND {WINDOW_CLAUSE}
+    ORDER BY id
+""")
+
+
+def active_drug_ids(user_id, today=None):
+    """drug_id of each confirmed course active today, oldest first."""
+    params = active_params(today)
+    params["user_id"] = user_id
+    return [r["drug_id"] for r in run(_ACTIVE_DRUGS, params)]
+
+
+_IN_WINDOW = register("timeline.in_window", f"""
+    SELECT * FROM user_medicine_timeline
+    WHERE user_id = :user_id AND {WINDOW_CLAUSE}
+    ORDER BY id
+""")
+
+
+def courses_in_window(user_id, since, until):
+    """Courses overlapping [since, until] (ISO dates), oldest first."""
+    params = window_params(since, until)
+    params["user_id"] = user_id
+    return run(_IN_WINDOW, params)
+
+
+# ──────────────────────────────────────────────
+# Listing + Keyset Pagination
+# ──────────────────────────────────────────────
+
+# Timeline rows as served by GET /timeline; {table} is the hot or cold table.
+_TIMELINE_SELECT = """
+    SELECT umt.*, dm.molecule, dm.drug_class,
+           CASE WHEN lower(dm.drug_class) LIKE '%antibiotic%' THEN 1 ELSE 0 END as is_antibiotic,
+           dm.common_use
+    FROM {table} umt
+    JOIN drug_master dm ON umt.drug_id = dm.drug_id
+    WHERE umt.user_id = :user_id {where}
+"""
+
+
+def format_cursor(row):
+    """Keyset cursor for the row a page ended on: '<start_date>~<id>'."""
+    return f"{row['start_date'] or ''}~{row['id']}"
+
+
+def parse_cursor(cursor):
+    """Inverse of format_cursor(); raises ValueError on malformed input."""
+    start, _, row_id = cursor.rpartition("~")
+    return start, int(row_id)
+
+
+# Listable tables and their registry name prefix
+_LIST_TABLES = {"user_medicine_timeline": "timeline", "user_medicine_history": "history"}
+
+
+def _register_listing(table, windowed, after_cursor, paged):
+    name, where = f"{_LIST_TABLES[table]}.list", ""
+    if windowed:
+        name, where = name + ".window", where + f" AND {WINDOW_CLAUSE}"
+    if after_cursor:
+        name += ".after"
+        where += " AND (COALESCE(umt.start_date, ''), umt.id) < (:c_start, :c_id)"
+    sql = _TIMELINE_SELECT.format(table=table, where=where)
+    sql += " ORDER BY COALESCE(umt.start_date, '') DESC, umt.id DESC"
+    if paged:
+        name, sql = name + ".page", sql + " LIMIT :limit"
+    return register(name, sql)
+
+
+# (table, windowed, after a cursor, paged) -> registered listing
+_LISTINGS = {
+    variant: _register_listing(*variant)
+    for variant in product(_LIST_TABLES, (False, True), (False, True), (False, True))
+}
+
+
+def iter_courses(user_id, window=None, table="user_medicine_timeline"):
+    """Every matching course, newest first, read in keyset pages (see db.iter_pages)."""
+    def page(cursor):
+        return list_courses(user_id, window, table=table, limit=STREAM_PAGE_ROWS, cursor=cursor)
+    return iter_pages(page)
+
+
+def list_courses(user_id, window=None, table="user_medicine_timeline", limit=None, cursor=None):
+    """
+    Timeline rows newest course first; with `window` (WINDOW_CLAUSE
+    parameters, e.g. recent_params()) only courses overlapping it. With
+    `limit`, returns one keyset page: (rows, next_cursor) where
+    next_cursor is None on the last page.
+    """
+    params = dict(window or {}, user_id=user_id)
+    if cursor:
+        params["c_start"], params["c_id"] = parse_cursor(cursor)
+    if limit is not None:
+        params["limit"] = limit + 1
+    rows = run(_LISTINGS[table, window is not None, bool(cursor), limit is not None], params)
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        return rows, format_cursor(rows[-1])
+    return rows, None
+
+
+# ──────────────────────────────────────────────
+# Change Tracking (delta sync)
+# ──────────────────────────────────────────────
+
+# Applied by db.init_db() and, once user_medicine_timeline.change_seq
+# exists, by the startup migration for older DBs.
+CHANGE_TRACKING_DDL = """
+CREATE TABLE IF NOT EXISTS user_change_seq (
+    user_id TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS user_timeline_tombstones (
+    user_id TEXT,
+    timeline_id INTEGER,
+    change_seq INTEGER,
+    deleted_at TEXT
+);
+
+-- Highest compacted tombstone per user: older tokens need a full resync
+CREATE TABLE IF NOT EXISTS user_sync_floor (
+    user_id TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_timeline_user_seq
+    ON user_medicine_timeline (user_id, change_seq);
+CREATE INDEX IF NOT EXISTS idx_tombstones_user_seq
+    ON user_timeline_tombstones (user_id, change_seq);
+
+CREATE TRIGGER IF NOT EXISTS trg_timeline_insert_seq
+AFTER INSERT ON user_medicine_timeline
+BEGIN
+    INSERT INTO user_change_seq (user_id, seq) VALUES (NEW.user_id, 1)
+        ON CONFLICT (user_id) DO UPDATE SET seq = seq + 1;
+    UPDATE user_medicine_timeline
+        SET change_seq = (SELECT seq FROM user_change_seq WHERE user_id = NEW.user_id)
+        WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_timeline_update_seq
+AFTER UPDATE ON user_medicine_timeline
+WHEN NEW.change_seq IS OLD.change_seq
+BEGIN
+    INSERT INTO user_change_seq (user_id, seq) VALUES (NEW.user_id, 1)
+        ON CONFLICT (user_id) DO UPDATE SET seq = seq + 1;
+    UPDATE user_medicine_timeline
+        SET change_seq = (SELECT seq FROM user_change_seq WHERE user_id = NEW.user_id)
+        WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_timeline_delete_seq
+AFTER DELETE ON user_medicine_timeline
+BEGIN
+    INSERT INTO user_change_seq (user_id, seq) VALUES (OLD.user_id, 1)
+        ON CONFLICT (user_id) DO UPDATE SET seq = seq + 1;
+    INSERT INTO user_timeline_tombstones (user_id, timeline_id, change_seq, deleted_at)
+        VALUES (OLD.user_id, OLD.id, (SELECT seq FROM user_change_seq WHERE user_id = OLD.user_id),
+                date('now', 'localtime'));
+END;
+"""
+
+
+def current_seq(user_id):
+    """The user's latest timeline change sequence (0 if never changed)."""
+    row = run_one("timeline.seq", (user_id,))
+    return row["seq"] if row else 0
+
+
+_CHANGES = register("timeline.changes", _TIMELINE_SELECT.format(
+    table="user_medicine_timeline", where="AND umt.change_seq > :after",
+) + " ORDER BY umt.change_seq LIMIT :limit")
+
+
+def changes_since(user_id, since=0, limit=SYNC_PAGE_SIZE):
+    """
+    Timeline delta for a client holding sync token `since`.
+
+    Returns {timeline, deleted, token, has_more, full}. `full` means the
+    client must replace its copy (first sync, a token from a reset DB, or
+    one older than the compacted tombstones); otherwise apply `timeline`
+    as upserts and drop ids in `deleted`. Unchanged timelines cost a
+    single primary-key lookup.
+    """
+    seq = current_seq(user_id)
+    full = since <= 0 or since > seq
+    if not full and since == seq:
+        return {"timeline": [], "deleted": [], "token": seq, "has_more": False, "full": False}
+    if not full:
+        floor = run_one("timeline.sync_floor", (user_id,))
+        full = floor is not None and since < floor["seq"]
+
+    after = -1 if full else since
+    rows = run(_CHANGES, {"user_id": user_id, "after": after, "limit": limit + 1})
+
+    has_more = len(rows) > limit
+    if has_more:
+        rows = rows[:limit]
+        token = rows[-1]["change_seq"]
+    else:
+        token = seq
+
+    deleted = []
+    if not full:
+        deleted = [r["timeline_id"] for r in run("timeline.deleted_since", (user_id, since, token))]
+
+    return {"timeline": rows, "deleted": deleted, "token": token, "has_more": has_more, "full": full}
+
+
+# ──────────────────────────────────────────────
+# Archival
+# ──────────────────────────────────────────────
+
+def _archive_query(db_path=None):
+    """
+    The copy into history, registered per column set: the columns both
+    tables have (older DBs lack symptoms/taken_doses).
+    """
+    hot = [r["name"] for r in run("schema.columns", ("user_medicine_timeline",), db_path)]
+    cold = {r["name"] for r in run("schema.columns", ("user_medicine_history",), db_path)}
+    cols = [c for c in hot if c in cold]
+    return register(f"timeline.archive:{','.join(cols)}", f"""
+        INSERT OR REPLACE INTO user_medicine_history ({", ".join(cols)}, archived_at)
+        SELECT {", ".join(cols)}, ? FROM user_medicine_timeline WHERE end_date < ?
+    """)
+
+
+def archive_completed_courses(retention_days=None, today=None, db_path=None):
+    """
+    Move courses that ended more than `retention_days` ago into
+    user_medicine_history. Returns the number of rows moved.
+    """
+    if retention_days is None:
+        retention_days = RETENTION_DAYS
+    cutoff = days_ago_iso(retention_days, today)
+
+    with transaction(db_path, immediate=True):
+        archive = _archive_query(db_path)
+        last = run_one("tombstones.last", db_path=db_path)["last"]
+        run_write(archive, (today_iso(today), cutoff), db_path)
+        run_write("timeline.archive_delete", (cutoff,), db_path)
+        # This delete's tombstones: each course's own change sequence
+        moved = run("tombstones.after", (last,), db_path)
+
+    if (db_path or db.DB_PATH) == db.DB_PATH:
+        from risk_state import on_medicine_removed
+        for row in moved:
+            on_medicine_removed(row["user_id"], row["timeline_id"], row["change_seq"])
+    return len(moved)
+
+
+def compact_tombstones(token_days=None, today=None, db_path=None):
+    """
+    Drop deletion tombstones older than `token_days` (sync tokens issued
+    before then are no longer served deltas). Each user's highest dropped
+    sequence becomes their sync floor. Returns the number removed.
+    """
+    if token_days is None:
+        token_days = SYNC_TOKEN_DAYS
+    cutoff = days_ago_iso(token_days, today)
+
+    with transaction(db_path, immediate=True):
+        removed = run_one("tombstones.expired", (cutoff,), db_path)["n"]
+        if removed:
+            run_write("tombstones.raise_floor", (cutoff,), db_path)
+            run_write("tombstones.compact", (cutoff,), db_path)
+    return removed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MEDGUARD timeline maintenance")
+    parser.add_argument("--archive", action="store_true", help="move old completed courses to history")
+    parser.add_argument("--retention-days", type=int, default=RETENTION_DAYS)
+    parser.add_argument("--token-days", type=int, default=SYNC_TOKEN_DAYS,
+                        help="keep deletion tombstones (delta-sync tokens) this long")
+    args = parser.parse_args()
+
+    if args.archive:
+        n = archive_completed_courses(args.retention_days)
+        print(f"[MEDGUARD] Archived {n} completed courses older than {args.retention_days} days.")
+        n = compact_tombstones(args.token_days)
+        print(f"[MEDGUARD] Compacted {n} sync tombstones older than {args.token_days} days.")
+    else:
+        parser.print_help()
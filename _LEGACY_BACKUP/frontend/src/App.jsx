@@ -25,6 +25,7 @@ function App() {
     const [safetyLevel, setSafetyLevel] = useState('green')
     const [risks, setRisks] = useState([])
     const [todaysInsight, setTodaysInsight] = useState(null)
+    const [advice, setAdvice] = useState(null)
 
     useEffect(() => {
         checkUserProfile()
@@ -39,8 +40,7 @@ function App() {
                 // Small delay to show splash logo
                 setTimeout(() => {
                     setCurrentScreen('dashboard')
-                    fetchTimeline()
-                    fetchDailyInsight()
+                    fetchDashboard()
                 }, 2000)
             } else {
                 // No user, wait for splash cleanup (handled by SplashScreen component)
@@ -55,8 +55,7 @@ function App() {
         // If profile loaded during splash, go to dashboard
         if (userProfile) {
             setCurrentScreen('dashboard')
-            fetchTimeline()
-            fetchDailyInsight()
+            fetchDashboard()
         } else {
             setCurrentScreen('onboarding')
         }
@@ -84,49 +83,30 @@ function App() {
     }
 
     const handleDeviceConnectComplete = () => {
-        fetchTimeline()
-        fetchDailyInsight()
+        fetchDashboard()
         setCurrentScreen('dashboard')
     }
 
-    const fetchTimeline = async () => {
+    // One request for the whole home screen (timeline, risk, insights, advice)
+    const fetchDashboard = async () => {
         try {
             setLoading(true)
-            const res = await axios.get('/timeline?user_id=default')
-            const timelineData = res.data.timeline || []
-            setTimeline(timelineData)
-
-            if (timelineData.length > 0) {
-                const drugIds = timelineData.map(item => item.drug_id)
-                // Risk Check
-                const riskRes = await axios.post('/risk', {
-                    drug_ids: drugIds,
-                    user_age: userProfile?.age || 70,
-                    report_alcohol: true
-                })
-                setSafetyLevel(riskRes.data.risk_level)
-                setRisks(riskRes.data.flags || [])
-            } else {
-                setSafetyLevel('green')
-                setRisks([])
-            }
-        } catch (error) {
-            console.error("Error fetching timeline:", error)
-        } finally {
-            setLoading(false)
-        }
-    }
+            const mode = seniorMode ? 'senior' : 'adult'
+            const res = await axios.get(`/dashboard?user_id=default&user_age=${userProfile?.age || 70}&mode=${mode}`)
+            setTimeline(res.data.timeline || [])
+            setSafetyLevel(res.data.risk?.risk_level || 'green')
+            setRisks(res.data.risk?.flags || [])
+            setAdvice({ mode, data: res.data.advice })
 
-    const fetchDailyInsight = async () => {
-        try {
-            const res = await axios.get('/analysis/behavior?user_id=default')
             const insights = res.data.insights || []
             // Pick the most important insight (Red > Yellow > Green)
             const priority = { 'red': 3, 'yellow': 2, 'green': 1 }
             const sorted = insights.sort((a, b) => priority[b.level] - priority[a.level])
             setTodaysInsight(sorted[0] || null)
         } catch (error) {
-            console.error("Error fetching insights:", error)
+            console.error("Error fetching dashboard:", error)
+        } finally {
+            setLoading(false)
         }
     }
 
@@ -136,8 +116,7 @@ function App() {
     }
 
     const handleConfirmComplete = () => {
-        fetchTimeline()
-        fetchDailyInsight()
+        fetchDashboard()
         // If we just finished onboarding (no drugs yet), maybe go to device connect?
         // Actually, let's always go to device connect next if we are in the "setup" flow.
         // But we don't track "setup flow" state easily here. 
@@ -247,6 +226,7 @@ function App() {
                     risks={risks}
                     userAge={userProfile?.age || 70} // Passing context
                     userMode={seniorMode ? 'senior' : 'adult'}
+                    advice={advice?.mode === (seniorMode ? 'senior' : 'adult') ? advice.data : null}
                 />
             </Layout>
         )
@@ -29,7 +29,9 @@ const ConfirmMedicines = ({ candidates = [], onConfirmComplete, onBack, seniorMo
             for (const drug of drugsToConfirm) {
                 await axios.post('/ocr/confirm', {
                     drug_id: drug.drug_id,
-                    user_id: 'default'
+                    user_id: 'default',
+                    duration_days: drug.duration_days,
+                    extracted_name: drug.extracted_name
                 });
             }
 
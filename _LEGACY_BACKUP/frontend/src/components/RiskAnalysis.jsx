@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 
-const RiskAnalysis = ({ onBack, seniorMode = false, risks = [], userAge = 40, userMode = 'adult' }) => {
+const RiskAnalysis = ({ onBack, seniorMode = false, risks = [], userAge = 40, userMode = 'adult', advice = null }) => {
     const [aiAdvice, setAiAdvice] = useState(null);
     const [loading, setLoading] = useState(true);
 
@@ -23,12 +23,16 @@ const RiskAnalysis = ({ onBack, seniorMode = false, risks = [], userAge = 40, us
             }
         };
 
-        if (risks.length > 0) {
+        if (advice) {
+            // Already loaded with the dashboard
+            setAiAdvice(advice);
+            setLoading(false);
+        } else if (risks.length > 0) {
             fetchAdvice();
         } else {
             setLoading(false);
         }
-    }, [risks, userAge, userMode]);
+    }, [risks, userAge, userMode, advice]);
 
     return (
         <div className={`flex flex-col h-full ${seniorMode ? 'p-6 bg-white' : 'p-4 bg-transparent'}`}>